@@ -1,7 +1,24 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.shortcuts import redirect, render
+from django.urls import path
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils.html import format_html
-from .models import CustomUser, SKU, Batch, Barcode, TestQuestion, Test, TestAnswer, TestTemplate, TechnicalOutputChoice, BatchSpecTemplate, ServiceCase, Technician, SystemLog # Import ALL Models
+from . import importer, snapshots
+from .forms import TestResultImportForm
+from .paginators import EstimatedCountPaginator
+from .routers import ReportingChangelistMixin
+from .models import CustomUser, SKU, Batch, Barcode, TestQuestion, Test, TestAnswer, TestTemplate, TechnicalOutputChoice, BatchSpecTemplate, ServiceCase, Technician, SystemLog, TestStation # Import ALL Models
+
+class LargeTableAdminMixin:
+    """
+    Changelist settings for the multi-million-row tables: estimated counts
+    and no second COUNT(*) of the whole table when a filter is applied.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -30,6 +47,7 @@ class TestQuestionAdmin(admin.ModelAdmin):
     list_display = ['template', 'question_text', 'created_at']
     # Filter by template
     list_filter = ['template', 'technical_outputs']
+    list_select_related = ['template']
     # Search by question text and template name
     search_fields = ['question_text', 'template__name']
     # Use filter_horizontal for many-to-many field
@@ -44,29 +62,80 @@ class TestAnswerInline(admin.TabularInline):
     max_num = 20
     show_full_result_count = False
 
-class TestAdmin(admin.ModelAdmin):
+class TestAdmin(LargeTableAdminMixin, ReportingChangelistMixin, admin.ModelAdmin):
     list_display = ['barcode', 'sku', 'batch', 'template_used', 'overall_status', 'test_date', 'user', 'view_answers_button']
     list_filter = ['overall_status', 'test_date', 'sku', 'batch', 'template_used']
     search_fields = ['barcode__sequence_number']
+    list_select_related = ['barcode', 'sku', 'batch', 'template_used', 'user']
     inlines = [TestAnswerInline]
+    change_list_template = 'admin/inventory/test/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_results_view), name='inventory_test_import'),
+        ] + super().get_urls()
+
+    def import_results_view(self, request):
+        """Upload a CSV/XLSX of results; very large files are better run through manage.py import_test_results"""
+        if not self.has_add_permission(request):
+            return redirect('admin:inventory_test_changelist')
+        report = None
+        form = TestResultImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = importer.import_results(upload.file, upload.name, request.user,
+                                                 dry_run=form.cleaned_data['dry_run'])
+            except importer.ImportFileError as e:
+                form.add_error('file', str(e))
+            else:
+                level = messages.WARNING if report.error_count else messages.SUCCESS
+                prefix = "Dry run, nothing written. " if form.cleaned_data['dry_run'] else ""
+                self.message_user(request, prefix + report.summary(), level)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import test results',
+            'form': form,
+            'report': report,
+        }
+        return render(request, 'admin/inventory/test/import_results.html', context)
+
+    def get_queryset(self, request):
+        # Count answers in a correlated subquery: it runs for the rows on the
+        # page only, where annotate(Count('answers')) would GROUP BY the join
+        # of every test with every answer before paginating.
+        answers = (TestAnswer.objects.filter(test=OuterRef('pk')).order_by()
+                   .values('test').annotate(count=Count('pk')).values('count'))
+        return super().get_queryset(request).defer('answer_snapshot').annotate(
+            answer_count=Coalesce(Subquery(answers, output_field=IntegerField()), Value(0))
+        )
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Corrected answers or status: refreeze (or drop) the answer snapshot
+        snapshots.sync(form.instance)
 
     def view_answers_button(self, obj):
         """Add a button to view all answers in a separate paginated page"""
         from django.urls import reverse
         url = reverse('admin:inventory_testanswer_changelist') + f'?test__id__exact={obj.id}'
-        return format_html('<a href="{}" class="button" style="background-color: #417690; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px;">View All Answers ({})</a>', url, obj.answers.count())
+        return format_html('<a href="{}" class="button" style="background-color: #417690; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px;">View All Answers ({})</a>', url, obj.answer_count)
     view_answers_button.short_description = 'Test Answers'
 
-class BatchAdmin(admin.ModelAdmin):
+class BatchAdmin(ReportingChangelistMixin, admin.ModelAdmin):
     list_display = ['sku', 'prefix', 'batch_date', 'quantity', 'spec_template', 'created_at'] # Added spec_template
     list_filter = ['sku', 'batch_date', 'spec_template'] # Added spec_template
     search_fields = ['prefix']
+    list_select_related = ['sku', 'spec_template']
     ordering = ['-created_at']
 
-class BarcodeAdmin(admin.ModelAdmin):
-    list_display = ['sequence_number', 'batch']
-    list_filter = ['batch__sku']
+class BarcodeAdmin(LargeTableAdminMixin, ReportingChangelistMixin, admin.ModelAdmin):
+    list_display = ['sequence_number', 'batch', 'lifecycle_state']
+    list_filter = ['lifecycle_state', 'batch__sku']
+    list_select_related = ['batch']
     search_fields = ['sequence_number']
+    readonly_fields = ['lifecycle_state', 'latest_test']
 
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(SKU)
@@ -75,14 +144,44 @@ admin.site.register(Barcode, BarcodeAdmin)
 admin.site.register(TestTemplate)
 admin.site.register(TestQuestion, TestQuestionAdmin)
 admin.site.register(Test, TestAdmin)
+
+
+class QuestionListFilter(admin.RelatedFieldListFilter):
+    """Question filter whose choice labels (which include the template name) load in one query"""
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin) or ()
+        questions = TestQuestion.objects.select_related('template').order_by(*ordering)
+        return [(question.pk, str(question)) for question in questions]
+
+
 # TestAnswer Admin with search and filter capabilities
 @admin.register(TestAnswer)
-class TestAnswerAdmin(admin.ModelAdmin):
+class TestAnswerAdmin(LargeTableAdminMixin, ReportingChangelistMixin, admin.ModelAdmin):
     list_display = ['test', 'question', 'is_passed', 'technical_output', 'remarks_preview']
-    list_filter = ['is_passed', 'test__template_used', 'test__overall_status', 'question']
+    list_filter = ['is_passed', 'test__template_used', 'test__overall_status', ('question', QuestionListFilter)]
     search_fields = ['question__question_text', 'technical_output', 'remarks', 'test__barcode__sequence_number']
     readonly_fields = ['test']
-    list_select_related = ['test', 'question']  # Optimize queries
+    list_select_related = ['test__barcode', 'question__template']  # Optimize queries (both __str__ follow these)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('test__answer_snapshot')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        snapshots.sync(obj.test)
+
+    def delete_model(self, request, obj):
+        test = obj.test
+        super().delete_model(request, obj)
+        snapshots.sync(test)
+
+    def delete_queryset(self, request, queryset):
+        # The "delete selected" action doesn't go through delete_model
+        tests = list(Test.objects.filter(pk__in=queryset.values('test_id')).defer('answer_snapshot'))
+        super().delete_queryset(request, queryset)
+        for test in tests:
+            snapshots.sync(test)
 
     def remarks_preview(self, obj):
         """Show preview of remarks (first 100 chars)"""
@@ -110,14 +209,38 @@ class TechnicianAdmin(admin.ModelAdmin):
     ordering = ['name']
 
 
+@admin.register(TestStation)
+class TestStationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'key_prefix', 'is_active', 'last_seen_at', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'key_prefix']
+    list_select_related = ['user']
+    readonly_fields = ['key_prefix', 'last_seen_at', 'created_at']
+    actions = ['rotate_keys']
+
+    def save_model(self, request, obj, form, change):
+        key = None if change else obj.issue_key()
+        super().save_model(request, obj, form, change)
+        if key:
+            self.message_user(request, f"API key for {obj.name}: {key} (shown once, copy it now)", messages.WARNING)
+
+    @admin.action(description="Issue new API keys (the old keys stop working)")
+    def rotate_keys(self, request, queryset):
+        for station in queryset:
+            key = station.issue_key()
+            station.save(update_fields=['key_prefix', 'key_hash'])
+            self.message_user(request, f"API key for {station.name}: {key} (shown once, copy it now)", messages.WARNING)
+
+
 # 💡 Service Case Admin
 @admin.register(ServiceCase)
-class ServiceCaseAdmin(admin.ModelAdmin):
+class ServiceCaseAdmin(ReportingChangelistMixin, admin.ModelAdmin):
     list_display = ['case_id', 'barcode', 'status', 'service_date', 'technician', 'created_at']
     list_filter = ['status', 'service_date', 'technician', 'created_at']
-    search_fields = ['case_id', 'barcode__sequence_number', 'technician__name', 'issue_description']
+    search_fields = ['case_id', 'barcode__sequence_number', 'technician', 'issue_description']
     readonly_fields = ['case_id', 'created_at', 'updated_at']
     date_hierarchy = 'service_date'
+    list_select_related = ['barcode']
     ordering = ['-created_at']
 
     fieldsets = (
@@ -139,12 +262,14 @@ class ServiceCaseAdmin(admin.ModelAdmin):
 
 # 💡 System Log Admin
 @admin.register(SystemLog)
-class SystemLogAdmin(admin.ModelAdmin):
+class SystemLogAdmin(LargeTableAdminMixin, ReportingChangelistMixin, admin.ModelAdmin):
     list_display = ['timestamp', 'event_type_badge', 'level_badge', 'title', 'user', 'barcode_link', 'test_link', 'service_case_link']
     list_filter = ['event_type', 'level', 'timestamp', 'user']
     search_fields = ['title', 'description', 'barcode__sequence_number', 'test__barcode__sequence_number', 'service_case__case_id', 'user__username']
     readonly_fields = ['timestamp', 'event_type', 'level', 'title', 'description', 'details', 'user', 'barcode', 'test', 'service_case', 'batch', 'ip_address', 'user_agent']
-    date_hierarchy = 'timestamp'
+    # No date_hierarchy: listing its years is a SELECT DISTINCT over every log
+    # row. The timestamp list_filter (today, past 7 days, ...) costs nothing.
+    list_select_related = ['user', 'barcode', 'test', 'service_case']
     ordering = ['-timestamp']
 
     fieldsets = (
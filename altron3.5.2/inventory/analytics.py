@@ -0,0 +1,335 @@
+"""
+Quality analytics over test answers.
+
+Three metrics for the finalized (passed or failed) tests of a date range:
+
+    analytics.pareto(start, end)                  # failing questions, most failures first
+    analytics.pass_rates('batch', start, end)     # per question, template, batch or tester
+    analytics.co_failures(start, end)             # how often failing questions fail together
+
+Counts are aggregated in SQL. Co-failures can't be: the answers of the most
+failing questions are streamed with a server-side cursor into one bitmask
+per failed test, equal masks are counted, and the matrix is built from the
+distinct masks, so memory grows with the number of failed tests rather than
+with answers. NumPy does that in bulk when it is installed (imported on
+first use); otherwise the same algorithm runs in plain Python.
+
+Results are plain dicts, cached per metric, parameters and date range under
+the 'analytics' namespace (see inventory/cache.py), and ranges that include
+today also under 'analytics:open'. A range that ended before today is cached
+for much longer, since it only changes when a test that is or was final
+changes. Saving or deleting such a test or one of its answers invalidates
+'analytics:open' when the test is dated today, as loaded and as saved, so
+closed ranges stay cached while the line is running; any other change
+invalidates 'analytics'. The bulk writers, which send no signals, call
+invalidate() themselves: ingest scoped the same way, the importer and
+synthetic data broadly. Drafts come and go without touching the cache.
+Results are always computed on the primary, so a lagging replica can't be
+cached for a day.
+
+Configure with settings.QUALITY_ANALYTICS, see DEFAULTS.
+"""
+import datetime
+import importlib.util
+from collections import Counter
+from itertools import accumulate, chain
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import cache
+from .models import Test, TestAnswer
+from .snapshots import FINAL_STATUSES
+
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
+DEFAULTS = {
+    'DEFAULT_DAYS': 30,
+    'MAX_DAYS': 366,
+    'CACHE_TIMEOUT': 600,
+    # Ranges that ended before today
+    'CLOSED_CACHE_TIMEOUT': 24 * 60 * 60,
+    # Most failing questions in a co-failure matrix; masks are 64-bit
+    'CO_FAILURE_QUESTIONS': 20,
+    'CHUNK_SIZE': 20000,
+    'USE_NUMPY': True,
+}
+
+NAMESPACE = 'analytics'
+OPEN_NAMESPACE = 'analytics:open'
+MAX_CO_FAILURE_QUESTIONS = 63
+
+# group -> (model, id field, label field) for pass_rates
+GROUPS = {
+    'question': (TestAnswer, 'question_id', 'question__question_text'),
+    'template': (Test, 'template_used_id', 'template_used__name'),
+    'batch': (Test, 'batch_id', 'batch__prefix'),
+    'tester': (Test, 'user_id', 'user__username'),
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'QUALITY_ANALYTICS', {}))
+    return config
+
+
+def invalidate(today_only=False):
+    """Drop cached results; with `today_only`, only those of ranges that include today"""
+    namespace = OPEN_NAMESPACE if today_only else NAMESPACE
+    cache.invalidate(namespace)
+    if transaction.get_connection().in_atomic_block:
+        # A reader between now and commit would cache the old rows again
+        transaction.on_commit(lambda: cache.invalidate(namespace))
+
+
+def dated_today(test_date):
+    return test_date is not None and timezone.localdate(test_date) == timezone.localdate()
+
+
+def date_range(start=None, end=None):
+    """
+    (start, end) dates from ISO strings or dates, both inclusive; the last
+    DEFAULT_DAYS days when omitted. Raises ValueError for a bad range.
+    """
+    config = get_config()
+    start, end = _parse(start), _parse(end)
+    end = end or timezone.localdate()
+    start = start or end - datetime.timedelta(days=config['DEFAULT_DAYS'] - 1)
+    if start > end:
+        raise ValueError("'start' is after 'end'")
+    if (end - start).days >= config['MAX_DAYS']:
+        raise ValueError(f"Ranges are limited to {config['MAX_DAYS']} days")
+    return start, end
+
+
+def _parse(value):
+    if not isinstance(value, str):
+        return value
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"{value!r} is not a YYYY-MM-DD date")
+    return parsed
+
+
+def _tests(start, end):
+    # Bounds on test_date itself rather than __date, which can't use its index
+    tz = timezone.get_current_timezone()
+    return Test.objects.filter(
+        test_date__gte=datetime.datetime.combine(start, datetime.time.min, tzinfo=tz),
+        test_date__lt=datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz),
+        overall_status__in=FINAL_STATUSES,
+    )
+
+
+def _answers(start, end):
+    return TestAnswer.objects.filter(test__in=_tests(start, end).values('pk'))
+
+
+def _cached(metric, start, end, params, compute):
+    config = get_config()
+    closed = end < timezone.localdate()
+    key = ':'.join([metric, start.isoformat(), end.isoformat(), *(str(value) for value in params)])
+    if closed:
+        return cache.cached(NAMESPACE, key, compute, timeout=config['CLOSED_CACHE_TIMEOUT'])
+    return cache.cached((NAMESPACE, OPEN_NAMESPACE), key, compute, timeout=config['CACHE_TIMEOUT'])
+
+
+def _use_numpy():
+    return NUMPY_AVAILABLE and get_config()['USE_NUMPY']
+
+
+# Metrics
+
+def _failures_by_question(start, end, template=None):
+    answers = _answers(start, end).filter(is_passed=False)
+    if template is not None:
+        answers = answers.filter(question__template_id=template)
+    return list(
+        answers.order_by().values('question_id')
+        .annotate(text=F('question__question_text'), failures=Count('pk'))
+        .order_by('-failures', 'question_id')
+    )
+
+
+def pareto(start, end, limit=20, template=None):
+    """Failing questions, most failures first, with their share and cumulative share of all failures"""
+    def compute():
+        rows = _failures_by_question(start, end, template)
+        total = sum(row['failures'] for row in rows)
+        for row, cumulative in zip(rows, accumulate(row['failures'] for row in rows)):
+            row['share'] = round(row['failures'] / total, 4)
+            row['cumulative_share'] = round(cumulative / total, 4)
+        return {'start': start.isoformat(), 'end': end.isoformat(), 'failures': total, 'questions': rows[:limit]}
+    return _cached('pareto', start, end, (limit, template), compute)
+
+
+def pass_rates(by, start, end):
+    """Finalized tests (answers, per question) and how many passed, per `by` group, worst first"""
+    if by not in GROUPS:
+        raise ValueError(f"'by' must be one of {', '.join(GROUPS)}")
+
+    def compute():
+        model, id_field, label_field = GROUPS[by]
+        if model is TestAnswer:
+            rows = _answers(start, end).order_by().values(id_field).annotate(
+                label=F(label_field), total=Count('pk'), passed=Count('pk', filter=Q(is_passed=True)),
+            )
+        else:
+            rows = _tests(start, end).order_by().values(id_field).annotate(
+                label=F(label_field), total=Count('pk'), passed=Count('pk', filter=Q(overall_status='passed')),
+            )
+        groups = [
+            {'id': row[id_field], 'label': row['label'], 'total': row['total'], 'passed': row['passed'],
+             'failed': row['total'] - row['passed'], 'pass_rate': round(row['passed'] / row['total'], 4)}
+            for row in rows
+        ]
+        groups.sort(key=lambda group: (group['pass_rate'], -group['total']))
+        return {'start': start.isoformat(), 'end': end.isoformat(), 'by': by, 'groups': groups}
+    return _cached(f'pass_rates:{by}', start, end, (), compute)
+
+
+def co_failures(start, end, size=None, template=None):
+    """
+    For the `size` most failing questions, matrix[i][j] is the number of
+    tests in which both question i and question j failed; the diagonal is
+    each question's failed tests.
+    """
+    size = min(size or get_config()['CO_FAILURE_QUESTIONS'], MAX_CO_FAILURE_QUESTIONS)
+
+    def compute():
+        questions = _failures_by_question(start, end, template)[:size]
+        bits = {row['question_id']: bit for bit, row in enumerate(questions)}
+        pairs = (_answers(start, end).filter(is_passed=False, question_id__in=list(bits)).order_by()
+                 .values_list('test_id', 'question_id').iterator(chunk_size=get_config()['CHUNK_SIZE']))
+        if _use_numpy():
+            masks, counts, matrix = _co_failures_numpy(pairs, bits)
+        else:
+            masks, counts, matrix = _co_failures_python(pairs, bits)
+        return {
+            'start': start.isoformat(), 'end': end.isoformat(),
+            'questions': [{'question_id': row['question_id'], 'text': row['text']} for row in questions],
+            'failed_tests': sum(counts),
+            'combinations': len(masks),
+            'matrix': matrix,
+        }
+    return _cached('co_failures', start, end, (size, template), compute)
+
+
+METRICS = ('pareto', 'pass_rates', 'co_failures')
+
+
+def report(metric, start=None, end=None, by='question', limit=20, size=None, template=None):
+    """One metric by name, for the JSON endpoint and `manage.py quality_report`; raises ValueError"""
+    start, end = date_range(start, end)
+    if metric == 'pareto':
+        return pareto(start, end, limit=limit, template=template)
+    if metric == 'pass_rates':
+        return pass_rates(by, start, end)
+    if metric == 'co_failures':
+        return co_failures(start, end, size=size, template=template)
+    raise ValueError(f"Unknown metric {metric!r}, expected one of {', '.join(METRICS)}")
+
+
+def _co_failures_python(pairs, bits):
+    masks = {}
+    for test_id, question_id in pairs:
+        masks[test_id] = masks.get(test_id, 0) | (1 << bits[question_id])
+    combinations = Counter(masks.values())
+    size = len(bits)
+    matrix = [[0] * size for _ in range(size)]
+    for mask, count in combinations.items():
+        members = [bit for bit in range(size) if mask >> bit & 1]
+        for i in members:
+            for j in members:
+                matrix[i][j] += count
+    return list(combinations), list(combinations.values()), matrix
+
+
+def _co_failures_numpy(pairs, bits):
+    import numpy as np
+
+    size = len(bits)
+    flat = np.fromiter(chain.from_iterable(pairs), dtype=np.int64)
+    if not flat.size:
+        return [], [], [[0] * size for _ in range(size)]
+    tests, question_ids = flat[0::2], flat[1::2]
+
+    known = np.array(list(bits), dtype=np.int64)  # in bit order
+    order = np.argsort(known)
+    positions = order[np.searchsorted(known, question_ids, sorter=order)]
+    values = np.left_shift(np.uint64(1), positions.astype(np.uint64))
+    # One mask per test: OR together the bits of each run of equal test ids
+    by_test = np.argsort(tests)
+    tests = tests[by_test]
+    starts = np.flatnonzero(np.concatenate(([True], tests[1:] != tests[:-1])))
+    masks = np.bitwise_or.reduceat(values[by_test], starts)
+
+    combinations, counts = np.unique(masks, return_counts=True)
+    members = ((combinations[:, None] >> np.arange(size, dtype=np.uint64)) & np.uint64(1)).astype(np.float64)
+    # Float matrix products go through BLAS; the counts stay exact far beyond any test count
+    matrix = np.rint((members * counts[:, None]).T @ members).astype(np.int64)
+    return combinations.tolist(), counts.tolist(), matrix.tolist()
+
+
+# Signals
+
+def _only_today(instance):
+    """Whether a test is dated today, both as loaded and as it is now"""
+    if instance._state.adding:
+        return True  # test_date is auto_now_add
+    loaded = getattr(instance, '_loaded_values', None)
+    # An instance that wasn't loaded may be overwriting a test of any date
+    if loaded is None or not dated_today(loaded.get('test_date')):
+        return False
+    return dated_today(instance.test_date)
+
+
+def _test_pre_save(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', None)
+    # An instance that wasn't loaded may be overwriting a final test
+    instance._analytics_was_final = (
+        instance._state.adding is False and (loaded is None or loaded.get('overall_status') in FINAL_STATUSES)
+    )
+    instance._analytics_today_only = _only_today(instance)
+
+
+def _test_saved(sender, instance, **kwargs):
+    if instance.overall_status in FINAL_STATUSES or instance._analytics_was_final:
+        invalidate(today_only=instance._analytics_today_only)
+
+
+def _test_deleted(sender, instance, **kwargs):
+    if instance.overall_status in FINAL_STATUSES:
+        invalidate(today_only=_only_today(instance))
+
+
+def _answer_changed(sender, instance, origin=None, **kwargs):
+    if instance.test_id is None:
+        return
+    # Answers deleted along with their test are covered by the test's signal
+    if isinstance(origin, Test) or getattr(origin, 'model', None) is Test:
+        return
+    if TestAnswer._meta.get_field('test').is_cached(instance):
+        status, test_date = instance.test.overall_status, instance.test.test_date
+    else:
+        status, test_date = Test.objects.filter(pk=instance.test_id).values_list(
+            'overall_status', 'test_date').first() or (None, None)
+    if status in FINAL_STATUSES:
+        invalidate(today_only=dated_today(test_date))
+
+
+pre_save.connect(_test_pre_save, sender=Test, dispatch_uid='analytics_test_pre_save')
+post_save.connect(_test_saved, sender=Test, dispatch_uid='analytics_test_save')
+post_delete.connect(_test_deleted, sender=Test, dispatch_uid='analytics_test_delete')
+post_save.connect(_answer_changed, sender=TestAnswer, dispatch_uid='analytics_answer_save')
+post_delete.connect(_answer_changed, sender=TestAnswer, dispatch_uid='analytics_answer_delete')
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "inventory"
+
+    def ready(self):
+        # Connects the reference-data invalidation, barcode lifecycle, batch
+        # rollup, timeline and analytics cache signals
+        from . import analytics, lifecycle, refdata, rollups, timeline  # noqa: F401
@@ -0,0 +1,103 @@
+"""
+Namespaced caching with global invalidation.
+
+Every cached value belongs to a namespace, and every namespace has a
+generation number stored in the shared cache. Keys embed the generation, so
+bumping it invalidates everything in the namespace at once, in every worker
+process, without having to know or delete the individual keys:
+
+    counts = cache.cached('dashboard', 'counts', compute_counts, timeout=60)
+
+    cache.invalidate('dashboard')  # e.g. from a post_save handler
+
+A value that depends on several namespaces takes a tuple of them and is
+invalidated by a bump of any one.
+
+Stale entries are never read again and age out through their timeout or LRU
+eviction. Callbacks registered with on_invalidate run in the invalidating
+process, for in-process copies that the shared generation can't reach.
+"""
+import logging
+import time
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'default'
+DEFAULT_TIMEOUT = 300
+
+_MISSING = object()
+_callbacks = {}  # namespace -> [callback]
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(namespace):
+    return f'gen:{namespace}'
+
+
+def generation(namespace):
+    """Current generation of `namespace`"""
+    key = _generation_key(namespace)
+    value = _cache().get(key)
+    if value is None:
+        # Seed from the clock rather than 1: if the counter is ever evicted
+        # the new generation must not collide with one already used.
+        _cache().add(key, time.time_ns(), timeout=None)
+        value = _cache().get(key)
+    return value
+
+
+def generations(namespaces):
+    """Current generations of several namespaces, in one cache round trip"""
+    keys = [_generation_key(namespace) for namespace in namespaces]
+    found = _cache().get_many(keys)
+    return tuple(found[key] if key in found else generation(namespace) for key, namespace in zip(keys, namespaces))
+
+
+def make_key(namespace, key):
+    if isinstance(namespace, str):
+        return f'{namespace}:{generation(namespace)}:{key}'
+    versions = '.'.join(str(value) for value in generations(namespace))
+    return f'{"+".join(namespace)}:{versions}:{key}'
+
+
+def get(namespace, key, default=None):
+    return _cache().get(make_key(namespace, key), default)
+
+
+def set(namespace, key, value, timeout=DEFAULT_TIMEOUT):
+    _cache().set(make_key(namespace, key), value, timeout)
+
+
+def cached(namespace, key, compute, timeout=DEFAULT_TIMEOUT):
+    """Return the cached value for `key`, calling `compute()` to fill a miss"""
+    full_key = make_key(namespace, key)
+    value = _cache().get(full_key, _MISSING)
+    if value is _MISSING:
+        value = compute()
+        _cache().set(full_key, value, timeout)
+    return value
+
+
+def invalidate(*namespaces):
+    """Drop everything cached under `namespaces`, in every process"""
+    for namespace in namespaces:
+        key = _generation_key(namespace)
+        try:
+            _cache().incr(key)
+        except ValueError:
+            _cache().set(key, time.time_ns(), timeout=None)
+        for callback in _callbacks.get(namespace, ()):
+            try:
+                callback(namespace)
+            except Exception:
+                logger.exception("Cache invalidation callback for %r failed", namespace)
+
+
+def on_invalidate(namespace, callback):
+    """Call `callback(namespace)` whenever this process invalidates `namespace`"""
+    _callbacks.setdefault(namespace, []).append(callback)
@@ -0,0 +1,195 @@
+"""
+SQLite-file cache backend shared by every process on the host.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'inventory.cache_backends.SQLiteCache',
+            'LOCATION': '/var/lib/altron/cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 10},
+        },
+    }
+
+Unlike LocMemCache, entries written by one gunicorn worker are visible to
+the others, and unlike DatabaseCache the cache lives in its own file, so
+cache writes never wait on the application database's write lock.
+
+Eviction is least-recently-used: each entry records when it was last read
+(refreshed at most every TOUCH_INTERVAL seconds, so hot reads stay cheap),
+and when the cache grows past MAX_ENTRIES the 1/CULL_FREQUENCY least
+recently used entries are dropped, after expired ones.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed);
+CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires);
+"""
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._touch_interval = float(options.get('TOUCH_INTERVAL', 10))
+        self._local = threading.local()
+        self._schema_ready = False
+
+    # Connections are per thread, and re-opened after a fork
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self._path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if not self._schema_ready:
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _expiry(self, timeout):
+        return self.get_backend_timeout(timeout)  # absolute time, or None for "never"
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _row(self, key):
+        now = time.time()
+        row = self._connection().execute(
+            'SELECT value, expires, accessed FROM cache_entry WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            self._connection().execute('DELETE FROM cache_entry WHERE key = ? AND expires <= ?', (key, now))
+            return None
+        if now - accessed > self._touch_interval:
+            self._connection().execute('UPDATE cache_entry SET accessed = ? WHERE key = ?', (now, key))
+        return value
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self._row(key)
+        return default if value is None else pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        # One query instead of one per key
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(key_map))
+        rows = self._connection().execute(
+            f'SELECT key, value, expires FROM cache_entry WHERE key IN ({placeholders})', list(key_map)
+        ).fetchall()
+        return {
+            key_map[key]: pickle.loads(value)
+            for key, value, expires in rows
+            if expires is None or expires > now
+        }
+
+    def _store(self, mode, key, value, timeout):
+        now = time.time()
+        expires = self._expiry(timeout)
+        conn = self._connection()
+        if mode == 'add':
+            # Replace only an expired entry; a live one wins
+            cursor = conn.execute(
+                'INSERT INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed WHERE cache_entry.expires IS NOT NULL AND cache_entry.expires <= ?',
+                (key, self._dumps(value), expires, now, now),
+            )
+        else:
+            cursor = conn.execute(
+                'INSERT OR REPLACE INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, self._dumps(value), expires, now),
+            )
+        self._cull()
+        return cursor.rowcount > 0
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._store('add', key, value, timeout)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._store('set', key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._connection().execute(
+            'UPDATE cache_entry SET expires = ?, accessed = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expiry(timeout), now, key, now),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute('DELETE FROM cache_entry WHERE key = ?', (key,)).rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        # Read-modify-write under a write lock, so concurrent increments from
+        # different processes don't lose updates
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            value = self._row(key)
+            if value is None:
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(value) + delta
+            conn.execute('UPDATE cache_entry SET value = ? WHERE key = ?', (self._dumps(new_value), key))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return new_value
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entry')
+
+    def close(self, **kwargs):
+        # Connections are reused across requests; nothing to do per request
+        pass
+
+    def _cull(self):
+        conn = self._connection()
+        count = conn.execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        conn.execute('DELETE FROM cache_entry WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        count = conn.execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+        if count > self._max_entries:
+            evict = max(count - self._max_entries, count // self._cull_frequency if self._cull_frequency else count)
+            conn.execute(
+                'DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_entry ORDER BY accessed LIMIT ?)',
+                (evict,),
+            )
@@ -0,0 +1,184 @@
+"""
+Database-specific helpers: the SQLite write lane and PostgreSQL COPY inserts.
+
+Write lane
+----------
+
+SQLite allows one writer at a time. The connection profile in settings
+(WAL, busy timeout, BEGIN IMMEDIATE) makes a blocked writer wait for the lock
+instead of failing, but threads of one server process still poll against each
+other inside SQLite's busy handler. The write lane makes them queue on a lock
+instead, so they are served in arrival order:
+
+    @serialize_writes
+    def auto_save_test(request): ...
+
+    with write_lane():
+        SystemLog.objects.bulk_create(batch)
+
+Configure it with settings.SQLITE_WRITE_LANE = {'ENABLED': True, 'TIMEOUT': 30}.
+A writer that waits longer than TIMEOUT seconds proceeds anyway and relies on
+the busy timeout. The lane is a no-op on other database backends. It only
+orders writers within one process; across worker processes the busy timeout
+does the queueing.
+
+Bulk inserts
+------------
+bulk_insert(Model, objs) loads rows with COPY on PostgreSQL, which is several
+times faster than multi-row INSERTs for large batches. It falls back to
+bulk_create elsewhere and for small batches.
+
+Row estimates
+-------------
+estimated_count(Model) reads the planner's row estimate (pg_class.reltuples on
+PostgreSQL, the primary key range on SQLite) instead of running COUNT(*),
+which has to scan every row of a multi-million-row table.
+"""
+import functools
+import io
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models
+
+from . import perf
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TIMEOUT': 30,
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Re-entrant: a view holding the lane may call code that takes it again
+_lane = threading.RLock()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SQLITE_WRITE_LANE', {}))
+    return config
+
+
+def lane_enabled(using=DEFAULT_DB_ALIAS):
+    return get_config()['ENABLED'] and connections[using].vendor == 'sqlite'
+
+
+@contextmanager
+def write_lane(using=DEFAULT_DB_ALIAS):
+    """Hold the process-wide write lane for the duration of the block"""
+    if not lane_enabled(using):
+        yield
+        return
+    with perf.track('write_lane'):
+        acquired = _lane.acquire(timeout=get_config()['TIMEOUT'])
+    if not acquired:
+        logger.warning("Waited %ss for the SQLite write lane; writing without it", get_config()['TIMEOUT'])
+    try:
+        yield
+    finally:
+        if acquired:
+            _lane.release()
+
+
+def serialize_writes(view):
+    """Run the view inside the write lane for non-safe HTTP methods"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return view(request, *args, **kwargs)
+        with write_lane():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def sqlite_status(using=DEFAULT_DB_ALIAS):
+    """Effective connection settings, for benchmark and load-test reports"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return {'vendor': connection.vendor}
+    with connection.cursor() as cursor:
+        status = {'vendor': 'sqlite'}
+        for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+            cursor.execute(f'PRAGMA {pragma}')
+            row = cursor.fetchone()  # mmap_size returns no row where mmap is unsupported
+            status[pragma] = row[0] if row else None
+    status['transaction_mode'] = connection.transaction_mode
+    status['write_lane'] = lane_enabled(using)
+    return status
+
+
+# Below this many rows a multi-row INSERT is as fast as COPY
+COPY_THRESHOLD = 500
+
+
+def _copy_text(field, obj, connection):
+    """One field of `obj` in COPY's text format"""
+    value = field.pre_save(obj, add=True)
+    if value is None:
+        return r'\N'
+    if isinstance(field, models.JSONField):
+        text = json.dumps(value, cls=field.encoder)
+    elif isinstance(value, bool):
+        text = 't' if value else 'f'
+    else:
+        value = field.get_db_prep_save(value, connection)
+        text = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def bulk_insert(model, objs, using=DEFAULT_DB_ALIAS, batch_size=None):
+    """
+    Insert `objs` as fast as the backend allows. Unlike bulk_create, primary
+    keys are not set on the objects when COPY is used, so only use this where
+    the caller doesn't need them.
+    """
+    objs = list(objs)
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or len(objs) < COPY_THRESHOLD:
+        return model.objects.using(using).bulk_create(objs, batch_size=batch_size)
+
+    fields = [field for field in model._meta.concrete_fields if not isinstance(field, models.AutoField)]
+    buffer = io.StringIO()
+    for obj in objs:
+        buffer.write('\t'.join(_copy_text(field, obj, connection) for field in fields))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    sql = f'COPY {table} ({columns}) FROM STDIN'
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    return objs
+
+
+def estimated_count(model, using=DEFAULT_DB_ALIAS):
+    """Approximate row count of `model`'s table, or None if the backend can't tell"""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        # -1 until the table has been vacuumed or analyzed
+        return row[0] if row and row[0] >= 0 else None
+    if connection.vendor == 'sqlite':
+        # Integer primary keys are the rowid: MIN/MAX are index lookups. Gaps
+        # left by deleted rows make this an overestimate.
+        bounds = model._default_manager.using(using).aggregate(first=models.Min('pk'), last=models.Max('pk'))
+        if bounds['first'] is None:
+            return 0
+        if isinstance(bounds['first'], int):
+            return bounds['last'] - bounds['first'] + 1
+    return None
+
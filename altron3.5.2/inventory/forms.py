@@ -4,6 +4,7 @@ from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from .models import CustomUser, SKU, Batch, Barcode, Test, TestQuestion, TestAnswer, TestTemplate, TechnicalOutputChoice, BatchSpecTemplate, Technician 
+from . import refdata
 
 # Define all possible spec field mappings (Internal Name: Human Readable Label)
 SPEC_FIELD_MAP = {
@@ -56,6 +57,10 @@ class BatchCreateForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
+        # Reference dropdowns come from the cache; validation still checks the queryset
+        self.fields['sku'].choices = refdata.model_choices(SKU, self.fields['sku'].empty_label)
+        self.fields['spec_template'].choices = refdata.model_choices(BatchSpecTemplate, self.fields['spec_template'].empty_label)
+
         # 1. Ensure prefix is correctly initialized from instance if editing
         if self.instance.pk:
             self.fields['prefix'].initial = self.instance.prefix
@@ -69,11 +74,7 @@ class BatchCreateForm(forms.ModelForm):
         
         required_fields = []
         if template_id:
-            try:
-                template = BatchSpecTemplate.objects.get(pk=template_id)
-                required_fields = template.fields_json 
-            except BatchSpecTemplate.DoesNotExist:
-                pass
+            required_fields = refdata.spec_template_fields(template_id) or []
         
         # 3. Add dynamic spec fields
         for field_name in SPEC_FIELD_MAP.keys():
@@ -153,6 +154,10 @@ class TestForm(forms.Form):
         
         super().__init__(*args, **kwargs)
 
+        # Reference dropdowns come from the cache; validation still checks the queryset
+        self.fields['sku'].choices = refdata.model_choices(SKU, self.fields['sku'].empty_label)
+        self.fields['template'].choices = refdata.model_choices(TestTemplate, self.fields['template'].empty_label)
+
         # Filter Batch choices based on selected SKU
         if selected_sku_id:
             self.fields['batch'].queryset = Batch.objects.filter(sku_id=selected_sku_id)
@@ -167,10 +172,7 @@ class TestForm(forms.Form):
         
         
         # FINAL FIX: Use a comprehension to guarantee clean (value, label) tuples
-        dynamic_outputs_list = [
-            (choice.value, choice.value)
-            for choice in TechnicalOutputChoice.objects.filter(is_active=True).order_by('order', 'value')
-        ]
+        dynamic_outputs_list = [(value, value) for value in refdata.output_choices()]
         
         TECHNICAL_OUTPUT_CHOICES = [
             ('', '--- Select Output ---'),
@@ -181,51 +183,46 @@ class TestForm(forms.Form):
         # Dynamically add TestQuestion fields if a Template is selected
         current_template_id = selected_template_id or (self.data.get('template') if 'template' in self.data else None)
 
-        if current_template_id:
-            try:
-                template_instance = TestTemplate.objects.get(pk=current_template_id)
-                questions = TestQuestion.objects.filter(template=template_instance).order_by('id')
-                for question in questions:
-                    self.fields[f'question_{question.id}_status'] = forms.ChoiceField(
-                        choices=[('fail', 'Fail'), ('pass', 'Pass')],
-                        label=question.question_text,
-                        widget=forms.Select(attrs={
-                            'class': 'w-full px-4 py-2.5 border-2 border-gray-200 rounded-lg focus:border-purple-500 focus:ring-2 focus:ring-purple-100 transition-all duration-200 text-gray-900 bg-white'
-                        })
-                    )
+        questions = refdata.template_questions(current_template_id) if current_template_id else None
+        for question in questions or []:
+            self.fields[f'question_{question.id}_status'] = forms.ChoiceField(
+                choices=[('fail', 'Fail'), ('pass', 'Pass')],
+                label=question.question_text,
+                widget=forms.Select(attrs={
+                    'class': 'w-full px-4 py-2.5 border-2 border-gray-200 rounded-lg focus:border-purple-500 focus:ring-2 focus:ring-purple-100 transition-all duration-200 text-gray-900 bg-white'
+                })
+            )
 
-                    # Get question-specific technical outputs
-                    question_outputs = question.technical_outputs.filter(is_active=True).order_by('order', 'value')
+            # Get question-specific technical outputs
+            question_outputs = question.outputs
 
-                    # If question has mapped outputs, use those; otherwise use all outputs
-                    if question_outputs.exists():
-                        output_choices = [('', '--- Select Output ---')] + [
-                            (output.value, output.value) for output in question_outputs
-                        ]
-                    else:
-                        # Fallback to all outputs if no mapping exists
-                        output_choices = TECHNICAL_OUTPUT_CHOICES
+            # If question has mapped outputs, use those; otherwise use all outputs
+            if question_outputs:
+                output_choices = [('', '--- Select Output ---')] + [
+                    (output, output) for output in question_outputs
+                ]
+            else:
+                # Fallback to all outputs if no mapping exists
+                output_choices = TECHNICAL_OUTPUT_CHOICES
 
-                    # NEW TECHNICAL OUTPUT FIELD - USES QUESTION-SPECIFIC CHOICES
-                    self.fields[f'question_{question.id}_output'] = forms.ChoiceField(
-                        choices=output_choices,
-                        required=False,
-                        label='',
-                        widget=forms.Select(attrs={
-                            'class': 'w-full px-4 py-2.5 border-2 border-gray-200 rounded-lg focus:border-purple-500 focus:ring-2 focus:ring-purple-100 transition-all duration-200 text-gray-900 bg-white'
-                        })
-                    )
-                    self.fields[f'question_{question.id}_remarks'] = forms.CharField(
-                        required=False,
-                        label='',
-                        widget=forms.Textarea(attrs={
-                            'rows': 3,
-                            'class': 'w-full px-4 py-2.5 border-2 border-gray-200 rounded-lg focus:border-purple-500 focus:ring-2 focus:ring-purple-100 transition-all duration-200 text-gray-900 placeholder-gray-400 resize-none',
-                            'placeholder': 'Add remarks here...'
-                        })
-                    )
-            except TestTemplate.DoesNotExist:
-                pass
+            # NEW TECHNICAL OUTPUT FIELD - USES QUESTION-SPECIFIC CHOICES
+            self.fields[f'question_{question.id}_output'] = forms.ChoiceField(
+                choices=output_choices,
+                required=False,
+                label='',
+                widget=forms.Select(attrs={
+                    'class': 'w-full px-4 py-2.5 border-2 border-gray-200 rounded-lg focus:border-purple-500 focus:ring-2 focus:ring-purple-100 transition-all duration-200 text-gray-900 bg-white'
+                })
+            )
+            self.fields[f'question_{question.id}_remarks'] = forms.CharField(
+                required=False,
+                label='',
+                widget=forms.Textarea(attrs={
+                    'rows': 3,
+                    'class': 'w-full px-4 py-2.5 border-2 border-gray-200 rounded-lg focus:border-purple-500 focus:ring-2 focus:ring-purple-100 transition-all duration-200 text-gray-900 placeholder-gray-400 resize-none',
+                    'placeholder': 'Add remarks here...'
+                })
+            )
         
         # Ensure initial values are set correctly for dropdowns if they exist in initial data
         if self.initial.get('sku'):
@@ -259,4 +256,16 @@ class ServiceCaseForm(forms.ModelForm):
             'actions_taken': forms.Textarea(attrs={'rows': 4, 'class': 'w-full px-4 py-3 border-2 border-gray-200 rounded-xl focus:border-purple-500 focus:ring-4 focus:ring-purple-100 transition-all duration-200 text-gray-900 bg-white resize-none', 'placeholder': 'Describe actions taken...'}),
             'remarks': forms.Textarea(attrs={'rows': 3, 'class': 'w-full px-4 py-3 border-2 border-gray-200 rounded-xl focus:border-purple-500 focus:ring-4 focus:ring-purple-100 transition-all duration-200 text-gray-900 bg-white resize-none', 'placeholder': 'Additional remarks (optional)...'}),
             'attachments': forms.FileInput(attrs={'class': 'w-full px-4 py-3 border-2 border-gray-200 rounded-xl focus:border-purple-500 focus:ring-4 focus:ring-purple-100 transition-all duration-200 text-gray-900 bg-white'}),
-        }
\ No newline at end of file
+        }
+
+class TestResultImportForm(forms.Form):
+    """Admin upload for inventory/importer.py"""
+    file = forms.FileField(help_text="CSV or XLSX, one row per answer: serial, template, question, passed "
+                                     "and optionally output, remarks, status, tested_at, tester, key")
+    dry_run = forms.BooleanField(required=False, help_text="Only validate the file")
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Upload a .csv or .xlsx file.")
+        return upload
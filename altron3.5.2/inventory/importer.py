@@ -0,0 +1,395 @@
+"""
+Streaming import of test results from CSV or XLSX files.
+
+For results of stations that were offline and for legacy spreadsheets. One
+row per answer, the rows of one test next to each other:
+
+    serial,template,question,passed,output,remarks,status,tested_at,tester,key
+    ABA001,LI-UPS Final,Output voltage,pass,230V,,,2024-03-01 10:15,alice,
+    ABA001,LI-UPS Final,Backup time,fail,,Short by 2 min,,2024-03-01 10:15,alice,
+
+serial, template (name or id), question (text or id) and passed (pass/fail,
+yes/no, true/false, 1/0) are required. Consecutive rows with the same serial,
+template, tested_at, tester and key make up one test, whose status, tested_at,
+tester and key come from its first row. status defaults to passed when every
+answer passed, tested_at to the time of the import and tester to the
+importing user. A key is stored as the test's ingest_key and tests whose key
+was imported before are skipped, so an interrupted import can simply be run
+again; a key repeated within one file rejects the later test.
+
+The file is read one row at a time (openpyxl's read-only mode for XLSX) and
+written CHUNK_ROWS rows at a time, each chunk in its own transaction with a
+fixed number of bulk queries, so memory stays flat however long the file is.
+A row that fails validation rejects only its own test; the error is reported
+with the row number and the import carries on.
+"""
+import csv
+import importlib.util
+import io
+import os
+from datetime import date, datetime, time
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import analytics, db, lifecycle, outputs, refdata, rollups, snapshots, timeline
+from .models import Barcode, Batch, CustomUser, Test, TestAnswer, TestTemplate
+
+# openpyxl (and the Pillow it pulls in) is only imported when an XLSX file is read
+XLSX_SUPPORTED = importlib.util.find_spec('openpyxl') is not None
+
+REQUIRED_COLUMNS = ('serial', 'template', 'question', 'passed')
+TEST_COLUMNS = ('serial', 'template', 'tested_at', 'tester', 'key')
+CHUNK_ROWS = 5000
+# Errors beyond this many are counted but not kept
+MAX_ERRORS = 1000
+
+TRUE_VALUES = {'pass', 'passed', 'p', 'yes', 'y', 'true', 't', '1', 'ok'}
+FALSE_VALUES = {'fail', 'failed', 'f', 'no', 'n', 'false', '0'}
+STATUSES = {value for value, _ in Test.STATUS_CHOICES}
+KEY_MAX_LENGTH = Test._meta.get_field('ingest_key').max_length
+OUTPUT_MAX_LENGTH = TestAnswer._meta.get_field('technical_output').max_length
+
+
+class ImportFileError(Exception):
+    """The file can't be imported at all (unreadable, unsupported, missing columns)"""
+
+
+class _RowError(Exception):
+    def __init__(self, row_number, message):
+        super().__init__(message)
+        self.row_number = row_number
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.tests = 0
+        self.answers = 0
+        self.skipped = 0  # tests whose key was already imported
+        self.rejected = 0  # tests with at least one invalid row
+        self.error_count = 0
+        self.errors = []  # (row number, message), the first MAX_ERRORS
+
+    def error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((row_number, message))
+
+    def summary(self):
+        return (f"{self.rows} rows: {self.tests} tests with {self.answers} answers imported, "
+                f"{self.skipped} already imported, {self.rejected} rejected ({self.error_count} row errors)")
+
+
+# Reading
+
+def _cell(value):
+    if value is None:
+        return ''
+    return value.strip() if isinstance(value, str) else value
+
+
+def _rows(header, records, first_row_number):
+    columns = [str(name or '').strip().lower() for name in header]
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}")
+    for row_number, record in enumerate(records, start=first_row_number):
+        row = {column: _cell(value) for column, value in zip(columns, record) if column}
+        if any(value != '' for value in row.values()):
+            yield row_number, row
+
+
+def read_rows(file, name):
+    """
+    Yield (row number, {column: value}) for every non-empty data row of the
+    CSV or XLSX `file` (a path or binary file object). Row numbers count the
+    header as row 1, like a spreadsheet.
+    """
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.xlsx':
+        if not XLSX_SUPPORTED:
+            raise ImportFileError("XLSX import needs openpyxl (pip install openpyxl); save the sheet as CSV instead")
+        import openpyxl
+
+        try:
+            workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        except Exception as e:
+            raise ImportFileError(f"Not a readable XLSX file: {e}")
+        try:
+            records = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(records, None)
+            if header is None:
+                raise ImportFileError("The sheet is empty")
+            yield from _rows(header, records, 2)
+        finally:
+            workbook.close()
+    elif extension == '.csv':
+        opened = open(file, 'rb') if isinstance(file, (str, os.PathLike)) else None
+        # utf-8-sig drops the byte order mark Excel writes into CSV exports
+        text = io.TextIOWrapper(opened or file, encoding='utf-8-sig', newline='')
+        try:
+            reader = csv.reader(text)
+            header = next(reader, None)
+            if header is None:
+                raise ImportFileError("The file is empty")
+            yield from _rows(header, reader, 2)
+        except UnicodeDecodeError:
+            raise ImportFileError("CSV files must be UTF-8 encoded")
+        finally:
+            if opened:
+                text.close()
+            else:
+                text.detach()  # the caller's file stays open
+    else:
+        raise ImportFileError("Only .csv and .xlsx files can be imported")
+
+
+def read_tests(rows):
+    """Group consecutive rows into tests: yields lists of (row number, row)"""
+    current, identity = [], None
+    for row_number, row in rows:
+        row_identity = tuple(row.get(column, '') for column in TEST_COLUMNS)
+        if current and row_identity != identity:
+            yield current
+            current = []
+        current.append((row_number, row))
+        identity = row_identity
+    if current:
+        yield current
+
+
+# Validation
+
+def _passed(value):
+    if isinstance(value, bool):
+        return value
+    text = _text(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"'passed' must be pass or fail, not {value!r}")
+
+
+def _tested_at(value):
+    if value == '':
+        return None
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, date):
+        moment = datetime.combine(value, time())
+    else:
+        moment = parse_datetime(str(value))
+        if moment is None:
+            day = parse_date(str(value))
+            if day is None:
+                raise ValueError(f"'tested_at' is not a date or date and time: {value!r}")
+            moment = datetime.combine(day, time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _text(value):
+    """A cell as text, without the ".0" spreadsheets add to whole numbers"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _reference(value):
+    """Spreadsheet ids arrive as floats or strings; names stay strings"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+class _Resolver:
+    """Lookups shared by every chunk of one import"""
+
+    def __init__(self, default_user):
+        self.default_user = default_user
+        self.users = {}
+        self.keys = set()  # keys of the tests read so far
+        templates = refdata.all_objects(TestTemplate)
+        self.templates = {template.pk: template for template in templates}
+        self.templates.update({template.name: template for template in templates})
+        self.questions = {}
+
+    def template(self, value):
+        value = _reference(value)
+        template = self.templates.get(value)
+        if template is None and isinstance(value, int):
+            template = self.templates.get(str(value))  # a template named "12"
+        return template
+
+    def question(self, template, value):
+        if template.pk not in self.questions:
+            questions = refdata.template_questions(template.pk) or []
+            lookup = {question.id: question for question in questions}
+            lookup.update({question.question_text: question for question in questions})
+            self.questions[template.pk] = lookup
+        lookup = self.questions[template.pk]
+        value = _reference(value)
+        return lookup.get(value) or (lookup.get(str(value)) if isinstance(value, int) else None)
+
+    def load_users(self, usernames):
+        missing = [username for username in usernames if username not in self.users]
+        if missing:
+            self.users.update(
+                (user.username, user) for user in CustomUser.objects.filter(username__in=missing).only('pk', 'username')
+            )
+
+    def user(self, username):
+        return self.users.get(username) if username else self.default_user
+
+
+def _clean_test(rows, barcodes, resolver):
+    """A valid test from its rows, or raises _RowError naming the bad row"""
+    row_number, first = rows[0]
+    barcode = barcodes.get(_text(first['serial']))
+    if barcode is None:
+        raise _RowError(row_number, f"Unknown serial {first['serial']!r}")
+    template = resolver.template(first['template'])
+    if template is None:
+        raise _RowError(row_number, f"Unknown template {first['template']!r}")
+    tester = resolver.user(_text(first.get('tester', '')))
+    if tester is None:
+        raise _RowError(row_number, f"Unknown tester {first['tester']!r}")
+    key = _text(first.get('key', '')) or None
+    if key and len(key) > KEY_MAX_LENGTH:
+        raise _RowError(row_number, f"'key' is longer than {KEY_MAX_LENGTH} characters")
+    status = str(first.get('status', '')).lower() or None
+    if status is not None and status not in STATUSES:
+        raise _RowError(row_number, f"'status' must be one of {', '.join(sorted(STATUSES))}")
+    try:
+        tested_at = _tested_at(first.get('tested_at', ''))
+    except ValueError as e:
+        raise _RowError(row_number, str(e))
+
+    answers, texts, seen = [], [], set()
+    for row_number, row in rows:
+        question = resolver.question(template, row['question'])
+        if question is None:
+            raise _RowError(row_number, f"Unknown question {row['question']!r} for template {template.name}")
+        if question.id in seen:
+            raise _RowError(row_number, f"Question {row['question']!r} answered twice in one test")
+        seen.add(question.id)
+        try:
+            passed = _passed(row['passed'])
+        except ValueError as e:
+            raise _RowError(row_number, str(e))
+        output = _text(row.get('output', '')) or None
+        if output and len(output) > OUTPUT_MAX_LENGTH:
+            raise _RowError(row_number, f"'output' is longer than {OUTPUT_MAX_LENGTH} characters")
+        answers.append((question.id, passed, output, _text(row.get('remarks', ''))))
+        texts.append(question.question_text)
+
+    if status is None:
+        status = 'passed' if all(passed for _, passed, _, _ in answers) else 'failed'
+    snapshot = None
+    if status in snapshots.FINAL_STATUSES:
+        snapshot = snapshots.pack((answer[0], text) + answer[1:] for answer, text in zip(answers, texts))
+    return {'barcode': barcode, 'template': template, 'user': tester, 'key': key, 'status': status,
+            'tested_at': tested_at, 'answers': answers, 'snapshot': snapshot}
+
+
+# Writing
+
+def _import_chunk(chunk, resolver, report, dry_run):
+    serials = {_text(rows[0][1]['serial']) for rows in chunk}
+    barcodes = {
+        barcode.sequence_number: barcode
+        for barcode in Barcode.objects.filter(sequence_number__in=serials).only('pk', 'sequence_number', 'batch_id', 'sku_id')
+    }
+    resolver.load_users({_text(rows[0][1].get('tester', '')) for rows in chunk} - {''})
+
+    cleaned = []
+    for rows in chunk:
+        try:
+            item = _clean_test(rows, barcodes, resolver)
+            if item['key'] in resolver.keys:
+                raise _RowError(rows[0][0], f"Key {item['key']!r} is used by an earlier test in this file")
+        except _RowError as e:
+            report.error(e.row_number, str(e))
+            report.rejected += 1
+            continue
+        if item['key']:
+            resolver.keys.add(item['key'])
+        cleaned.append(item)
+
+    keys = [item['key'] for item in cleaned if item['key']]
+    if keys:
+        done = set(Test.objects.filter(station=None, ingest_key__in=keys).values_list('ingest_key', flat=True))
+        report.skipped += sum(1 for item in cleaned if item['key'] in done)
+        cleaned = [item for item in cleaned if item['key'] not in done]
+    if dry_run or not cleaned:
+        report.tests += len(cleaned)
+        report.answers += sum(len(item['answers']) for item in cleaned)
+        return
+
+    # Other writers get the lane between chunks
+    with db.write_lane(), transaction.atomic():
+        tests = Test.objects.bulk_create([
+            Test(barcode=item['barcode'], batch_id=item['barcode'].batch_id, sku_id=item['barcode'].sku_id,
+                 user=item['user'], template_used=item['template'], overall_status=item['status'],
+                 ingest_key=item['key'], answer_snapshot=item['snapshot'])
+            for item in cleaned
+        ], batch_size=500)
+        # test_date is auto_now_add, so historical dates are applied afterwards
+        dated = []
+        for test, item in zip(tests, cleaned):
+            if item['tested_at']:
+                test.test_date = test.updated_at = item['tested_at']
+                dated.append(test)
+        if dated:
+            Test.objects.bulk_update(dated, ['test_date', 'updated_at'], batch_size=500)
+        db.bulk_insert(TestAnswer, (
+            TestAnswer(test_id=test.pk, question_id=question_id, is_passed=passed,
+                       technical_output=output, remarks=remarks, **outputs.fields(output))
+            for test, item in zip(tests, cleaned) for question_id, passed, output, remarks in item['answers']
+        ), batch_size=2000)
+
+        # Bulk writes send no signals. Refreshed per chunk so an interrupted
+        # import leaves consistent rollups behind.
+        barcode_ids = {item['barcode'].pk for item in cleaned}
+        lifecycle.rebuild(Barcode.objects.filter(pk__in=barcode_ids))
+        rollups.rebuild(Batch.objects.filter(pk__in={item['barcode'].batch_id for item in cleaned}))
+        timeline.invalidate(*barcode_ids)
+    report.tests += len(tests)
+    report.answers += sum(len(item['answers']) for item in cleaned)
+
+
+def import_results(file, name, user, chunk_rows=CHUNK_ROWS, dry_run=False, progress=None):
+    """
+    Import the test results in `file` (CSV or XLSX, told apart by `name`),
+    recording tests without a tester column as `user`. With dry_run the file
+    is only validated. Returns an ImportReport; raises ImportFileError when the
+    file can't be read at all.
+    """
+    report = ImportReport()
+    resolver = _Resolver(user)
+    chunk, chunk_size = [], 0
+
+    def flush():
+        _import_chunk(chunk, resolver, report, dry_run)
+        if progress:
+            progress(report)
+
+    for rows in read_tests(read_rows(file, name)):
+        report.rows += len(rows)
+        chunk.append(rows)
+        chunk_size += len(rows)
+        if chunk_size >= chunk_rows:
+            flush()
+            chunk, chunk_size = [], 0
+    if chunk:
+        flush()
+    if report.tests and not dry_run:
+        # Bulk writes send none of the signals that invalidate analytics
+        analytics.invalidate()
+    return report
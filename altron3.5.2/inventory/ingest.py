@@ -0,0 +1,278 @@
+"""
+Result ingestion for automated test stations.
+
+A rig registered as a TestStation POSTs JSON to /api/ingest/tests/ with
+`Authorization: Bearer <station key>`:
+
+    {"results": [
+        {"key": "rig7-000123", "serial": "ABA001", "template": "LI-UPS Final",
+         "status": "passed",
+         "answers": [{"question": 41, "passed": true, "output": "230V", "remarks": ""}]}
+    ]}
+
+`key` is the rig's idempotency key, unique per station. Posting a result
+again under the same key updates that test (unit, template, status and
+answers) instead of creating a second one, so a rig can retry a request
+whose response it never saw. `template` is a template name or id and
+`question` a question id or its exact text. `status` may be omitted: the
+result then passed if every answer passed.
+
+A request is validated in full before anything is written; one bad result
+rejects the request with a per-result error list. It is then written in one
+transaction with a fixed number of bulk queries whatever its size: serials
+and existing keys are each resolved with one query and questions come from
+the reference-data cache. Bulk writes send no model signals, so the barcode
+lifecycle, batch rollups, unit timelines and analytics are refreshed here,
+and answer snapshots of finalized tests are built from the posted answers.
+
+Configure with settings.TEST_INGEST = {'MAX_RESULTS': 500, 'TOUCH_INTERVAL': 60}.
+"""
+import hmac
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import analytics, db, lifecycle, outputs, refdata, rollups, snapshots, timeline
+from .models import Barcode, Batch, SystemLog, Test, TestAnswer, TestStation, TestTemplate
+
+DEFAULTS = {
+    'MAX_RESULTS': 500,
+    # last_seen_at is written at most this often (seconds) per station
+    'TOUCH_INTERVAL': 60,
+}
+
+STATUSES = {value for value, _ in Test.STATUS_CHOICES}
+KEY_MAX_LENGTH = Test._meta.get_field('ingest_key').max_length
+OUTPUT_MAX_LENGTH = TestAnswer._meta.get_field('technical_output').max_length
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'TEST_INGEST', {}))
+    return config
+
+
+class IngestError(Exception):
+    """The request was rejected; `errors` lists what is wrong with which result"""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid result(s)")
+        self.errors = errors
+
+
+def authenticate(key):
+    """The active station `key` belongs to, or None"""
+    prefix, dot, _ = key.partition('.')
+    if not dot:
+        return None
+    station = TestStation.objects.select_related('user').filter(key_prefix=prefix, is_active=True).first()
+    if station is None or not hmac.compare_digest(station.key_hash, TestStation.hash_key(key)):
+        return None
+    now = timezone.now()
+    if station.last_seen_at is None or (now - station.last_seen_at).total_seconds() >= get_config()['TOUCH_INTERVAL']:
+        TestStation.objects.filter(pk=station.pk).update(last_seen_at=now)
+        station.last_seen_at = now
+    return station
+
+
+# Validation
+
+def _lookup_template(value, templates):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return templates['pk'].get(value)
+    if isinstance(value, str):
+        return templates['name'].get(value)
+    return None
+
+
+def _clean_answers(answers, questions):
+    by_id = {question.id: question for question in questions}
+    by_text = {question.question_text: question for question in questions}
+    cleaned, seen = [], set()
+    for position, answer in enumerate(answers):
+        if not isinstance(answer, dict) or not isinstance(answer.get('passed'), bool):
+            raise ValueError(f"answers[{position}] needs a boolean 'passed'")
+        ref = answer.get('question')
+        if isinstance(ref, bool):
+            question = None
+        elif isinstance(ref, int):
+            question = by_id.get(ref)
+        else:
+            question = by_text.get(ref) if isinstance(ref, str) else None
+        if question is None:
+            raise ValueError(f"answers[{position}]: unknown question {ref!r} for this template")
+        if question.id in seen:
+            raise ValueError(f"answers[{position}]: question {ref!r} answered twice")
+        seen.add(question.id)
+        output = answer.get('output')
+        remarks = answer.get('remarks') or ''
+        if output is not None and (not isinstance(output, str) or len(output) > OUTPUT_MAX_LENGTH):
+            raise ValueError(f"answers[{position}]: 'output' must be a string of at most {OUTPUT_MAX_LENGTH} characters")
+        if not isinstance(remarks, str):
+            raise ValueError(f"answers[{position}]: 'remarks' must be a string")
+        cleaned.append((question.id, answer['passed'], output or None, remarks))
+    return cleaned
+
+
+def validate(results):
+    """
+    Check every result and resolve its serial, template and questions.
+    Returns one dict per result; raises IngestError listing every problem.
+    """
+    if not isinstance(results, list) or not results:
+        raise IngestError([{'index': None, 'error': "'results' must be a non-empty list"}])
+    limit = get_config()['MAX_RESULTS']
+    if len(results) > limit:
+        raise IngestError([{'index': None, 'error': f"At most {limit} results per request"}])
+
+    serials = {
+        result['serial'] for result in results if isinstance(result, dict) and isinstance(result.get('serial'), str)
+    }
+    barcodes = {
+        barcode.sequence_number: barcode
+        for barcode in Barcode.objects.filter(sequence_number__in=serials).only('pk', 'sequence_number', 'batch_id', 'sku_id')
+    }
+    all_templates = refdata.all_objects(TestTemplate)
+    templates = {
+        'pk': {template.pk: template for template in all_templates},
+        'name': {template.name: template for template in all_templates},
+    }
+
+    cleaned, errors, keys = [], [], set()
+    for index, result in enumerate(results):
+        try:
+            if not isinstance(result, dict):
+                raise ValueError("Each result must be an object")
+            key = result.get('key')
+            if not isinstance(key, str) or not key or len(key) > KEY_MAX_LENGTH:
+                raise ValueError(f"'key' must be a non-empty string of at most {KEY_MAX_LENGTH} characters")
+            if key in keys:
+                raise ValueError(f"Duplicate key {key!r} in this request")
+            keys.add(key)
+            serial = result.get('serial')
+            barcode = barcodes.get(serial) if isinstance(serial, str) else None
+            if barcode is None:
+                raise ValueError(f"Unknown serial {result.get('serial')!r}")
+            template = _lookup_template(result.get('template'), templates)
+            if template is None:
+                raise ValueError(f"Unknown template {result.get('template')!r}")
+            answers = result.get('answers', [])
+            if not isinstance(answers, list):
+                raise ValueError("'answers' must be a list")
+            answers = _clean_answers(answers, refdata.template_questions(template.pk) or [])
+            status = result.get('status')
+            if status is None:
+                status = 'passed' if all(passed for _, passed, _, _ in answers) else 'failed'
+            elif status not in STATUSES:
+                raise ValueError(f"'status' must be one of {', '.join(sorted(STATUSES))}")
+        except ValueError as e:
+            errors.append({'index': index, 'key': result.get('key') if isinstance(result, dict) else None,
+                           'error': str(e)})
+            continue
+        cleaned.append({'key': key, 'barcode': barcode, 'template': template, 'status': status, 'answers': answers})
+    if errors:
+        raise IngestError(errors)
+    return cleaned
+
+
+# Writing
+
+def ingest(results, station, request=None):
+    """
+    Validate and store `results` for `station`. Returns a summary with the
+    stored test of every result; raises IngestError without writing anything.
+    """
+    cleaned = validate(results)
+    now = timezone.now()
+    touched_barcodes, touched_batches = set(), set()
+
+    with transaction.atomic():
+        existing = {
+            test.ingest_key: test
+            for test in Test.objects.select_for_update().filter(
+                station=station, ingest_key__in=[item['key'] for item in cleaned],
+            ).only('pk', 'ingest_key', 'barcode_id', 'batch_id', 'test_date')
+        }
+        new, updated = [], []
+        for item in cleaned:
+            barcode = item['barcode']
+            test = existing.get(item['key'])
+            if test is None:
+                test = Test(station=station, ingest_key=item['key'], user_id=station.user_id)
+                new.append(test)
+            else:
+                touched_barcodes.add(test.barcode_id)
+                touched_batches.add(test.batch_id)
+                test.updated_at = now
+                updated.append(test)
+            test.barcode = barcode
+            test.batch_id = barcode.batch_id
+            test.sku_id = barcode.sku_id
+            test.template_used = item['template']
+            test.overall_status = item['status']
+            test.answer_snapshot = _snapshot(item)
+            item['test'] = test
+            touched_barcodes.add(barcode.pk)
+            touched_batches.add(barcode.batch_id)
+
+        Test.objects.bulk_create(new, batch_size=500)
+        if updated:
+            Test.objects.bulk_update(updated, ['barcode', 'batch', 'sku', 'template_used', 'overall_status',
+                                               'answer_snapshot', 'updated_at'], batch_size=500)
+            TestAnswer.objects.filter(test__in=updated).delete()
+        db.bulk_insert(TestAnswer, (
+            TestAnswer(test_id=item['test'].pk, question_id=question_id, is_passed=passed,
+                       technical_output=output, remarks=remarks, **outputs.fields(output))
+            for item in cleaned for question_id, passed, output, remarks in item['answers']
+        ), batch_size=2000)
+
+        lifecycle.rebuild(Barcode.objects.filter(pk__in=touched_barcodes))
+        rollups.rebuild(Batch.objects.filter(pk__in=touched_batches))
+        timeline.invalidate(*touched_barcodes)
+        # New tests are dated now; closed ranges only change if an older one was re-posted
+        analytics.invalidate(today_only=all(analytics.dated_today(test.test_date) for test in updated))
+
+    _log_results(cleaned, station, request)
+    return {
+        'created': len(new),
+        'updated': len(updated),
+        'tests': [
+            {'key': item['key'], 'id': item['test'].pk, 'serial': item['barcode'].sequence_number,
+             'status': item['status']}
+            for item in cleaned
+        ],
+    }
+
+
+def _snapshot(item):
+    if item['status'] not in snapshots.FINAL_STATUSES:
+        return None
+    texts = {question.id: question.question_text for question in refdata.template_questions(item['template'].pk)}
+    return snapshots.pack(
+        (question_id, texts[question_id], passed, output, remarks)
+        for question_id, passed, output, remarks in item['answers']
+    )
+
+
+def _log_results(cleaned, station, request):
+    # Same events as a test entered through the form; only logged once the
+    # tests are committed, since buffered entries are written by another thread
+    for item in cleaned:
+        test, serial = item['test'], item['barcode'].sequence_number
+        if test.overall_status not in ('passed', 'failed'):
+            continue
+        failed = test.overall_status == 'failed'
+        SystemLog.log_event(
+            event_type='test_failed' if failed else 'test_passed',
+            title=f'Test {"Failed" if failed else "Passed"} for {serial}',
+            description=f'Test {test.overall_status} for {serial}, posted by station {station.name}',
+            level='warning' if failed else 'info',
+            user=station.user,
+            barcode=item['barcode'],
+            test=test,
+            request=request,
+            details={'station': station.name, 'key': item['key'], 'template': item['template'].name},
+        )
@@ -0,0 +1,150 @@
+"""
+Barcode lifecycle state.
+
+Every Barcode carries `latest_test` (its most recent test, drafts included)
+and `lifecycle_state`, so "what state is this unit in" and "untested units in
+batch X" are single indexed reads instead of a Test/ServiceCase scan:
+
+    untested    no test yet
+    draft       latest test is a draft or still pending
+    passed      latest test passed
+    failed      latest test failed
+    in_service  a service case is open, in progress or on hold
+    serviced    a service case was completed after the latest test
+
+post_save and post_delete on Test and ServiceCase recompute the barcode's
+row inside the same transaction as the change. bulk_create(), bulk_update()
+and QuerySet.update() send no signals; code that writes tests or service
+cases that way must call rebuild() for the barcodes it touched.
+`manage.py repair_barcode_lifecycle` rebuilds every barcode.
+"""
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import SKU, Barcode, Batch, ServiceCase, Test
+
+UNTESTED = 'untested'
+DRAFT = 'draft'
+PASSED = 'passed'
+FAILED = 'failed'
+IN_SERVICE = 'in_service'
+SERVICED = 'serviced'
+
+# Test.overall_status -> lifecycle state; a pending test isn't final yet
+TEST_STATES = {'draft': DRAFT, 'pending': DRAFT, 'passed': PASSED, 'failed': FAILED}
+ACTIVE_CASE_STATUSES = ('open', 'in_progress', 'on_hold')
+
+LATEST_TEST_ORDER = ('-test_date', '-pk')
+
+
+def derive_state(test_status, test_date, active_cases, completed_at):
+    """Lifecycle state from the latest test and the barcode's service cases"""
+    if active_cases:
+        return IN_SERVICE
+    if completed_at is not None and (test_date is None or completed_at >= test_date):
+        return SERVICED
+    if test_status is None:
+        return UNTESTED
+    return TEST_STATES.get(test_status, DRAFT)
+
+
+def _case_summary():
+    return {
+        'active': Count('pk', filter=Q(status__in=ACTIVE_CASE_STATUSES)),
+        'completed_at': Max('updated_at', filter=Q(status='completed')),
+    }
+
+
+def refresh(*barcode_ids):
+    """Recompute latest_test and lifecycle_state of the given barcodes"""
+    for barcode_id in {barcode_id for barcode_id in barcode_ids if barcode_id is not None}:
+        with transaction.atomic():
+            # Serializes concurrent refreshes of one unit on PostgreSQL
+            if not Barcode.objects.select_for_update().filter(pk=barcode_id).exists():
+                continue
+            latest = (Test.objects.filter(barcode_id=barcode_id).order_by(*LATEST_TEST_ORDER)
+                      .values('pk', 'overall_status', 'test_date').first())
+            cases = ServiceCase.objects.filter(barcode_id=barcode_id).aggregate(**_case_summary())
+            state = derive_state(
+                latest and latest['overall_status'], latest and latest['test_date'],
+                cases['active'], cases['completed_at'],
+            )
+            Barcode.objects.filter(pk=barcode_id).update(
+                latest_test_id=latest and latest['pk'], lifecycle_state=state,
+            )
+
+
+def rebuild(barcodes=None, batch_size=2000, apps=django_apps):
+    """
+    Recompute every barcode in `barcodes` (default: all) in chunks, with one
+    query per table per chunk. Returns how many rows changed. Migrations pass
+    their historical `apps`.
+    """
+    Barcode_ = apps.get_model('inventory', 'Barcode')
+    Test_ = apps.get_model('inventory', 'Test')
+    ServiceCase_ = apps.get_model('inventory', 'ServiceCase')
+    if barcodes is None:
+        barcodes = Barcode_.objects.all()
+
+    ids = list(barcodes.order_by('pk').values_list('pk', flat=True))
+    changed = 0
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        latest = {}
+        tests = (Test_.objects.filter(barcode_id__in=chunk).order_by('barcode_id', *LATEST_TEST_ORDER)
+                 .values_list('barcode_id', 'pk', 'overall_status', 'test_date'))
+        for barcode_id, pk, status, test_date in tests:
+            latest.setdefault(barcode_id, (pk, status, test_date))
+        cases = {
+            row['barcode_id']: row
+            for row in ServiceCase_.objects.filter(barcode_id__in=chunk).order_by()
+            .values('barcode_id').annotate(**_case_summary())
+        }
+
+        updates = []
+        for barcode in Barcode_.objects.filter(pk__in=chunk).only('pk', 'latest_test', 'lifecycle_state'):
+            test_id, status, test_date = latest.get(barcode.pk, (None, None, None))
+            summary = cases.get(barcode.pk, {'active': 0, 'completed_at': None})
+            state = derive_state(status, test_date, summary['active'], summary['completed_at'])
+            if (barcode.latest_test_id, barcode.lifecycle_state) != (test_id, state):
+                barcode.latest_test_id, barcode.lifecycle_state = test_id, state
+                updates.append(barcode)
+        with transaction.atomic():
+            Barcode_.objects.bulk_update(updates, ['latest_test', 'lifecycle_state'], batch_size=500)
+        changed += len(updates)
+    return changed
+
+
+# Signals
+
+def _test_saved(sender, instance, **kwargs):
+    # A test moved to another unit may have been the old unit's latest
+    moved_from = Barcode.objects.filter(latest_test=instance).exclude(pk=instance.barcode_id)
+    refresh(instance.barcode_id, *moved_from.values_list('pk', flat=True))
+
+
+def _case_pre_save(sender, instance, **kwargs):
+    instance._lifecycle_previous_barcode_id = (
+        ServiceCase.objects.filter(pk=instance.pk).values_list('barcode_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+def _case_saved(sender, instance, **kwargs):
+    refresh(instance.barcode_id, getattr(instance, '_lifecycle_previous_barcode_id', None))
+
+
+def _deleted(sender, instance, origin=None, **kwargs):
+    # Deleting a SKU, batch or barcode takes the barcodes with it
+    if isinstance(origin, (SKU, Batch, Barcode)) or getattr(origin, 'model', None) in (SKU, Batch, Barcode):
+        return
+    refresh(instance.barcode_id)
+
+
+post_save.connect(_test_saved, sender=Test, dispatch_uid='lifecycle_test_save')
+post_delete.connect(_deleted, sender=Test, dispatch_uid='lifecycle_test_delete')
+pre_save.connect(_case_pre_save, sender=ServiceCase, dispatch_uid='lifecycle_case_pre_save')
+post_save.connect(_case_saved, sender=ServiceCase, dispatch_uid='lifecycle_case_save')
+post_delete.connect(_deleted, sender=ServiceCase, dispatch_uid='lifecycle_case_delete')
@@ -0,0 +1,381 @@
+"""
+Concurrent load simulation of the shop floor.
+
+Each simulated worker logs in as a synthetic user and repeats one flow:
+
+    tester   new_test page, the SKU -> batch -> template cascade, a series of
+             auto_save_test calls while questions are answered, final submit
+    service  service list, serial search, creating a service case
+    labels   label print page and barcode images for a batch
+
+Requests go either through the WSGI app in-process (Django test client) or
+over HTTP to a running server. Every request is timed and classified as ok,
+error, or locked ("database is locked", the SQLite symptom of too many
+concurrent writers). The simulation writes real rows, so point it at a
+database filled by generate_synthetic_data rather than production.
+"""
+import http.cookiejar
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import date
+
+from django.db import connections
+from django.db.models import Prefetch
+from django.test import Client
+from django.urls import reverse
+
+from . import log_buffer
+from .models import Barcode, CustomUser, TechnicalOutputChoice, TestQuestion
+from .perf import percentile
+from .synthetic import ADMIN_USERNAME
+
+LOCKED_MARKER = 'database is locked'
+
+ROLES = ('tester', 'service', 'labels')
+
+ISSUES = ['No output', 'Battery not charging', 'Fan noise', 'Overload trip']
+
+
+class Response:
+    def __init__(self, status, text='', error=None):
+        self.status = status
+        self.text = text
+        self.error = error
+
+    @property
+    def outcome(self):
+        if LOCKED_MARKER in (self.error or '') or LOCKED_MARKER in self.text:
+            return 'locked'
+        if self.error or self.status == 0 or self.status >= 400:
+            return 'error'
+        return 'ok'
+
+
+def _is_text(content_type):
+    return content_type.startswith(('text/', 'application/json'))
+
+
+class ClientTransport:
+    """Requests through the WSGI app in-process, via the Django test client"""
+
+    def __init__(self, user):
+        # Exceptions become 500 responses (with exc_info) instead of propagating
+        self.client = Client(SERVER_NAME='localhost', raise_request_exception=False)
+        self.client.force_login(user)
+
+    def request(self, method, path, data=None, ajax=False):
+        headers = {'X-Requested-With': 'XMLHttpRequest'} if ajax else None
+        response = getattr(self.client, method)(path, data or {}, headers=headers)
+        exc_info = getattr(response, 'exc_info', None)
+        error = f'{exc_info[0].__name__}: {exc_info[1]}' if exc_info else None
+        text = response.content.decode('utf-8', 'replace') if _is_text(response.get('Content-Type', '')) else ''
+        return Response(response.status_code, text, error)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """Requests over HTTP against a running server, with a logged-in session"""
+
+    def __init__(self, base_url, username, password, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+        self.request('get', reverse('login'))
+        response = self.request('post', reverse('login'), {'username': username, 'password': password})
+        if response.status != 302:
+            raise RuntimeError(f"Login as {username} failed (HTTP {response.status})")
+
+    def _csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def request(self, method, path, data=None, ajax=False):
+        url = self.base_url + path
+        headers = {'Referer': self.base_url + '/'}
+        if ajax:
+            headers['X-Requested-With'] = 'XMLHttpRequest'
+        body = None
+        if method == 'get':
+            if data:
+                url += '?' + urllib.parse.urlencode(data)
+        else:
+            token = self._csrf_token()
+            headers['X-CSRFToken'] = token
+            body = urllib.parse.urlencode({**(data or {}), 'csrfmiddlewaretoken': token}).encode()
+        request = urllib.request.Request(url, data=body, headers=headers, method=method.upper())
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                status, content_type, content = response.status, response.headers.get('Content-Type', ''), response.read()
+        except urllib.error.HTTPError as exc:
+            status, content_type, content = exc.code, exc.headers.get('Content-Type', ''), exc.read()
+        text = content.decode('utf-8', 'replace') if _is_text(content_type) else ''
+        return Response(status, text)
+
+
+def build_pool(size=500, seed=None):
+    """
+    Units the simulated workers pick from: barcodes whose SKU has a default
+    test template, with that template's questions and output choices.
+    """
+    rng = random.Random(seed)
+    ids = list(Barcode.objects.filter(sku__default_test_template__isnull=False).values_list('id', flat=True))
+    if not ids:
+        return None
+    barcodes = Barcode.objects.filter(id__in=rng.sample(ids, min(size, len(ids)))).select_related('sku')
+    units = [
+        {'sku': b.sku_id, 'batch': b.batch_id, 'barcode': b.id, 'serial': b.sequence_number,
+         'template': b.sku.default_test_template_id}
+        for b in barcodes
+    ]
+
+    questions = defaultdict(list)
+    active = TechnicalOutputChoice.objects.filter(is_active=True)
+    for question in (TestQuestion.objects.filter(template_id__in={unit['template'] for unit in units})
+                     .prefetch_related(Prefetch('technical_outputs', queryset=active, to_attr='active_outputs'))
+                     .order_by('id')):
+        questions[question.template_id].append((question.id, [output.value for output in question.active_outputs]))
+    return {'units': units, 'questions': dict(questions)}
+
+
+class Worker:
+    def __init__(self, role, transport_factory, pool, think_time=0.0, autosaves=4, seed=None):
+        self.role = role
+        self.transport_factory = transport_factory
+        self.pool = pool
+        self.think_time = think_time
+        self.autosaves = autosaves
+        self.rng = random.Random(seed)
+        self.samples = []  # (action, milliseconds, outcome)
+        self.failures = {}  # action -> first error message seen
+
+    def call(self, action, method, path, data=None, ajax=False):
+        started = time.perf_counter()
+        try:
+            response = self.transport.request(method, path, data, ajax=ajax)
+        except Exception as exc:
+            response = Response(0, error=f'{type(exc).__name__}: {exc}')
+        elapsed = (time.perf_counter() - started) * 1000
+        outcome = response.outcome
+        self.samples.append((action, elapsed, outcome))
+        if outcome != 'ok':
+            self._flow_ok = False
+            self.failures.setdefault(action, response.error or f'HTTP {response.status}')
+        if self.think_time:
+            time.sleep(self.rng.uniform(0, 2 * self.think_time))
+        return response
+
+    def run(self, deadline=None, flows=None):
+        self.transport = self.transport_factory()
+        done = 0
+        while (deadline is None or time.monotonic() < deadline) and (flows is None or done < flows):
+            self._flow_ok = True
+            started = time.perf_counter()
+            getattr(self, f'{self.role}_flow')(self.rng.choice(self.pool['units']))
+            self.samples.append((f'flow.{self.role}', (time.perf_counter() - started) * 1000,
+                                 'ok' if self._flow_ok else 'error'))
+            done += 1
+        return self.samples
+
+    def _answers(self, questions):
+        answers = {}
+        for question_id, outputs in questions:
+            answers[f'question_{question_id}_status'] = 'pass' if self.rng.random() < 0.97 else 'fail'
+            answers[f'question_{question_id}_output'] = self.rng.choice(outputs) if outputs else ''
+            answers[f'question_{question_id}_remarks'] = ''
+        return answers
+
+    def tester_flow(self, unit):
+        url = reverse('new_test')
+        self.call('new_test', 'get', url)
+
+        # The form cascade posts the partial selection back to new_test
+        data = {'sku': unit['sku']}
+        self.call('new_test.cascade', 'post', url, data, ajax=True)
+        data['batch'] = unit['batch']
+        self.call('new_test.cascade', 'post', url, data, ajax=True)
+        data.update(barcode=unit['barcode'], template=unit['template'])
+        self.call('new_test.cascade', 'post', url, data, ajax=True)
+
+        # Autosave fires as the tester works down the form
+        questions = self.pool['questions'].get(unit['template'], [])
+        answers, test_id = {}, None
+        step = max(1, -(-len(questions) // self.autosaves))
+        for start in range(0, len(questions), step):
+            answers.update(self._answers(questions[start:start + step]))
+            payload = {**data, **answers, 'overall_status': 'draft'}
+            if test_id:
+                payload['test_id'] = test_id
+            response = self.call('auto_save_test', 'post', reverse('auto_save_test'), payload)
+            if test_id is None and response.outcome == 'ok':
+                try:
+                    test_id = json.loads(response.text).get('test_id')
+                except ValueError:
+                    pass
+
+        failed = any(value == 'fail' for key, value in answers.items() if key.endswith('_status'))
+        payload = {**data, **answers, 'overall_status': 'failed' if failed else 'passed'}
+        if test_id:
+            payload['test_id'] = test_id
+        self.call('new_test.submit', 'post', url, payload)
+
+    def service_flow(self, unit):
+        self.call('service_list', 'get', reverse('service_list'))
+        self.call('service_list.search', 'get', reverse('service_list'), {'serial_number': unit['serial']})
+        self.call('create_service_case', 'post', reverse('create_service_case_barcode', args=[unit['barcode']]), {
+            'barcode_id': unit['barcode'],
+            'service_date': date.today().isoformat(),
+            'issue_description': self.rng.choice(ISSUES),
+            'actions_taken': 'Inspected',
+            'status': 'open',
+        })
+
+    def labels_flow(self, unit):
+        self.call('print_barcodes', 'get', reverse('print_barcodes', args=[unit['batch']]))
+        for _ in range(3):
+            serial = self.rng.choice(self.pool['units'])['serial']
+            self.call('barcode_image', 'get', reverse('barcode_image', args=[serial]))
+
+
+def assign_roles(workers, mix):
+    """Spread `workers` over roles in proportion to `mix` (role -> weight), largest remainder first"""
+    total = sum(mix.values())
+    shares = {role: workers * weight / total for role, weight in mix.items()}
+    counts = {role: int(share) for role, share in shares.items()}
+    for role in sorted(shares, key=lambda r: shares[r] - counts[r], reverse=True)[:workers - sum(counts.values())]:
+        counts[role] += 1
+    return [role for role, count in counts.items() for _ in range(count)]
+
+
+def simulation_users(role_list, password=None):
+    """One user per worker: testers round-robin over synthetic testers, service desk as synthetic_service"""
+    testers = list(CustomUser.objects.filter(username__startswith='synthetic_tester', role='tester').order_by('id'))
+    service = CustomUser.objects.filter(username='synthetic_service').first()
+    admin = CustomUser.objects.filter(username=ADMIN_USERNAME).first()
+    if not testers or service is None or admin is None:
+        return None
+    if password:
+        for user in [*testers, service, admin]:
+            user.set_password(password)
+            user.save(update_fields=['password'])
+
+    users, tester_index = [], 0
+    for role in role_list:
+        if role == 'service':
+            users.append(service)
+        else:
+            users.append(testers[tester_index % len(testers)])
+            tester_index += 1
+    return users
+
+
+def _thread_main(worker, deadline, flows):
+    try:
+        worker.run(deadline=deadline, flows=flows)
+    finally:
+        # Each thread opened its own connection through the test client
+        connections.close_all()
+
+
+def run_threads(workers, duration=None, flows=None, ramp_up=0.0):
+    deadline = time.monotonic() + duration if duration else None
+    threads = []
+    for index, worker in enumerate(workers):
+        thread = threading.Thread(target=_thread_main, args=(worker, deadline, flows), daemon=True)
+        threads.append(thread)
+        thread.start()
+        if ramp_up and index < len(workers) - 1:
+            time.sleep(ramp_up / len(workers))
+    for thread in threads:
+        thread.join()
+    log_buffer.flush()
+    return [sample for worker in workers for sample in worker.samples], _merge_failures(workers)
+
+
+def _process_main(worker, deadline, flows, results):
+    try:
+        worker.run(deadline=deadline, flows=flows)
+    finally:
+        # Forked children exit without running atexit hooks
+        log_buffer.flush()
+        results.put((worker.samples, worker.failures))
+
+
+def run_processes(workers, duration=None, flows=None, ramp_up=0.0):
+    import multiprocessing
+
+    context = multiprocessing.get_context('fork')
+    # Children must open their own connections rather than share the parent's
+    connections.close_all()
+    results = context.Queue()
+    deadline = time.monotonic() + duration if duration else None
+    processes = []
+    for index, worker in enumerate(workers):
+        process = context.Process(target=_process_main, args=(worker, deadline, flows, results))
+        processes.append(process)
+        process.start()
+        if ramp_up and index < len(workers) - 1:
+            time.sleep(ramp_up / len(workers))
+
+    samples, failures = [], {}
+    for _ in processes:
+        worker_samples, worker_failures = results.get()
+        samples.extend(worker_samples)
+        for action, message in worker_failures.items():
+            failures.setdefault(action, message)
+    for process in processes:
+        process.join()
+    return samples, failures
+
+
+def _merge_failures(workers):
+    failures = {}
+    for worker in workers:
+        for action, message in worker.failures.items():
+            failures.setdefault(action, message)
+    return failures
+
+
+def summarize(samples, elapsed):
+    by_action = defaultdict(list)
+    outcomes = defaultdict(lambda: defaultdict(int))
+    for action, ms, outcome in samples:
+        by_action[action].append(ms)
+        outcomes[action][outcome] += 1
+
+    requests = [sample for sample in samples if not sample[0].startswith('flow.')]
+    locked = sum(1 for sample in requests if sample[2] == 'locked')
+    errors = sum(1 for sample in requests if sample[2] == 'error')
+    summary = {
+        'elapsed_s': round(elapsed, 2),
+        'requests': len(requests),
+        'throughput_rps': round(len(requests) / elapsed, 2) if elapsed else 0.0,
+        'flows': len(samples) - len(requests),
+        'errors': errors,
+        'locked': locked,
+        'error_rate': round(errors / len(requests), 4) if requests else 0.0,
+        'locked_rate': round(locked / len(requests), 4) if requests else 0.0,
+        'actions': {},
+    }
+    for action in sorted(by_action):
+        timings = sorted(by_action[action])
+        summary['actions'][action] = {
+            'count': len(timings),
+            'errors': outcomes[action]['error'],
+            'locked': outcomes[action]['locked'],
+            'p50_ms': round(percentile(timings, 50), 1),
+            'p90_ms': round(percentile(timings, 90), 1),
+            'p95_ms': round(percentile(timings, 95), 1),
+            'p99_ms': round(percentile(timings, 99), 1),
+            'max_ms': round(timings[-1], 1),
+        }
+    return summary
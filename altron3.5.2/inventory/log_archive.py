@@ -0,0 +1,146 @@
+"""
+SystemLog retention: move old entries into monthly gzip'd JSONL archives.
+
+Archives live in settings.SYSTEM_LOG_RETENTION['ARCHIVE_DIR'] as
+`systemlog-YYYY-MM.jsonl.gz`, one JSON object per line. Each archiving run
+appends a new gzip member to the month's file, which gzip readers treat as one
+continuous stream. Rows are deleted from the live table only after their
+chunk has been written and flushed to disk.
+"""
+import gzip
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import SystemLog
+
+DEFAULTS = {
+    'DAYS': 90,
+    'CHUNK_SIZE': 1000,
+    'ARCHIVE_DIR': Path(settings.BASE_DIR) / 'log_archive',
+}
+
+# Columns written to the archive. Related objects are stored both by id and by
+# a human-readable key, because the ids may point at deleted rows later on.
+ARCHIVE_FIELDS = [
+    'id', 'timestamp', 'event_type', 'level', 'title', 'description', 'details',
+    'ip_address', 'user_agent',
+    'user_id', 'user__username',
+    'barcode_id', 'barcode__sequence_number',
+    'test_id',
+    'service_case_id', 'service_case__case_id',
+    'batch_id', 'batch__prefix',
+]
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SYSTEM_LOG_RETENTION', {}))
+    config['ARCHIVE_DIR'] = Path(config['ARCHIVE_DIR'])
+    return config
+
+
+def archive_path(archive_dir, year, month):
+    return Path(archive_dir) / f'systemlog-{year:04d}-{month:02d}.jsonl.gz'
+
+
+def _write_chunk(rows, archive_dir):
+    by_month = {}
+    for row in rows:
+        ts = row['timestamp']
+        by_month.setdefault((ts.year, ts.month), []).append(row)
+
+    for (year, month), month_rows in by_month.items():
+        path = archive_path(archive_dir, year, month)
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                for row in month_rows:
+                    gz.write(json.dumps(row, cls=DjangoJSONEncoder).encode('utf-8'))
+                    gz.write(b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+def archive_logs(days=None, chunk_size=None, archive_dir=None, dry_run=False):
+    """
+    Archive and delete SystemLog rows older than `days`, `chunk_size` rows at a
+    time so no single transaction holds the table for long.
+
+    Returns the number of rows archived (or that would be, with dry_run).
+    """
+    config = get_config()
+    days = config['DAYS'] if days is None else days
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+    archive_dir = Path(archive_dir or config['ARCHIVE_DIR'])
+    cutoff = timezone.now() - timedelta(days=days)
+
+    old_logs = SystemLog.objects.filter(timestamp__lt=cutoff)
+    if dry_run:
+        return old_logs.count()
+
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    archived = 0
+    while True:
+        rows = list(old_logs.order_by('id').values(*ARCHIVE_FIELDS)[:chunk_size])
+        if not rows:
+            break
+        _write_chunk(rows, archive_dir)
+        with transaction.atomic():
+            SystemLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        archived += len(rows)
+    return archived
+
+
+def _archive_month(path):
+    """(year, month) encoded in an archive file name"""
+    year, month = path.name[len('systemlog-'):-len('.jsonl.gz')].split('-')
+    return int(year), int(month)
+
+
+def iter_archived_logs(start=None, end=None, event_type=None, level=None, serial=None,
+                       case_id=None, search=None, archive_dir=None):
+    """
+    Yield archived log entries (as dicts, month by month) matching the filters.
+
+    Only the monthly files overlapping [start, end] are opened. An entry
+    archived twice (a run interrupted between write and delete) is yielded once.
+    """
+    archive_dir = Path(archive_dir or get_config()['ARCHIVE_DIR'])
+    files = sorted(archive_dir.glob('systemlog-*.jsonl.gz'))
+    if start:
+        files = [path for path in files if _archive_month(path) >= (start.year, start.month)]
+    if end:
+        files = [path for path in files if _archive_month(path) <= (end.year, end.month)]
+
+    search = search.lower() if search else None
+    seen = set()
+    for path in files:
+        with gzip.open(path, 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                entry = json.loads(line)
+                if entry['id'] in seen:
+                    continue
+                entry['timestamp'] = parse_datetime(entry['timestamp'])
+                if start and entry['timestamp'] < start:
+                    continue
+                if end and entry['timestamp'] > end:
+                    continue
+                if event_type and entry['event_type'] != event_type:
+                    continue
+                if level and entry['level'] != level:
+                    continue
+                if serial and entry['barcode__sequence_number'] != serial:
+                    continue
+                if case_id and entry['service_case__case_id'] != case_id:
+                    continue
+                if search and search not in f"{entry['title']} {entry['description']}".lower():
+                    continue
+                seen.add(entry['id'])
+                yield entry
@@ -0,0 +1,231 @@
+"""
+Buffered, asynchronous sink for SystemLog entries.
+
+SystemLog.log_event() hands entries to this module instead of saving them on
+the request path. A daemon thread drains the queue and writes entries with
+bulk_create, so a request pays for a queue put rather than a write
+transaction. Configure it with settings.SYSTEM_LOG_BUFFER:
+
+    SYSTEM_LOG_BUFFER = {
+        'ENABLED': True,
+        'MAX_QUEUE_SIZE': 10000,   # bound on buffered entries
+        'BATCH_SIZE': 200,         # max rows per bulk_create
+        'FLUSH_INTERVAL': 1.0,     # seconds to wait for a batch to fill
+        'SYNC_LEVELS': ['error', 'critical'],
+        'SAMPLE_RATES': {'test_passed': 0.1},  # info-level events only
+    }
+
+Levels listed in SYNC_LEVELS are always saved synchronously. When the queue is
+full, entries fall back to a synchronous save so nothing is dropped silently.
+A batch is written at most FLUSH_INTERVAL after its first entry, however
+steadily entries keep arriving. At exit the worker writes the batch it is
+collecting before the rest of the queue is flushed.
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+    'SYNC_LEVELS': ['error', 'critical'],
+    'SAMPLE_RATES': {},
+}
+
+# Queued by shutdown() to make the worker write what it holds and stop
+_STOP = object()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SYSTEM_LOG_BUFFER', {}))
+    return config
+
+
+class BufferedLogWriter:
+    """Bounded queue of unsaved SystemLog instances drained by a daemon thread"""
+
+    def __init__(self, max_queue_size, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, entry):
+        """Queue `entry` once the surrounding transaction (if any) commits"""
+        # Deferring to on_commit keeps rolled-back events out of the log and
+        # guarantees the related rows exist by the time the worker inserts.
+        transaction.on_commit(lambda: self._put(entry))
+
+    def _put(self, entry):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            logger.warning("SystemLog buffer full, writing entry synchronously")
+            entry.save()
+
+    def _ensure_started(self):
+        # Re-create the worker after a fork (e.g. gunicorn --preload), where
+        # the parent's thread does not exist in the child.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='systemlog-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = [first], False
+            # One deadline for the whole batch, so a trickle can't hold it back
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stop = True
+                    break
+                batch.append(entry)
+            self._write(batch)
+            if stop:
+                return
+
+    def _drain(self, limit):
+        items = []
+        while len(items) < limit:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP:
+                items.append(entry)
+        return items
+
+    def _write(self, batch):
+        from .db import write_lane
+        from .models import SystemLog
+
+        try:
+            with write_lane():
+                SystemLog.objects.bulk_create(batch)
+        except Exception:
+            # One bad row (e.g. a related test deleted before the flush) must
+            # not take the rest of the batch with it.
+            logger.exception("Bulk SystemLog write failed, retrying %d entries individually", len(batch))
+            for entry in batch:
+                try:
+                    with write_lane():
+                        entry.save()
+                except Exception:
+                    logger.exception("Dropping SystemLog entry %r", entry.title)
+        finally:
+            close_old_connections()
+        self._invalidate_timelines(batch)
+
+    def _invalidate_timelines(self, batch):
+        # bulk_create sends no post_save, which is what normally drops the
+        # cached timelines of the units these entries belong to
+        from . import timeline
+
+        try:
+            timeline.invalidate(*timeline.log_barcode_ids(batch))
+        except Exception:
+            logger.exception("Timeline cache invalidation after a SystemLog write failed")
+
+    def flush(self):
+        """Write everything currently queued from the calling thread"""
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+    def shutdown(self, timeout=5.0):
+        """Let the worker write the batch it is collecting, then flush the queue from this thread"""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning("SystemLog writer did not stop within %ss; its current batch may be lost", timeout)
+        self.flush()
+
+    def pending(self):
+        return self._queue.qsize()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                config = get_config()
+                _writer = BufferedLogWriter(
+                    max_queue_size=config['MAX_QUEUE_SIZE'],
+                    batch_size=config['BATCH_SIZE'],
+                    flush_interval=config['FLUSH_INTERVAL'],
+                )
+    return _writer
+
+
+def is_buffered(level):
+    """Whether entries of `level` go through the buffer rather than a direct save"""
+    config = get_config()
+    return config['ENABLED'] and level not in config['SYNC_LEVELS']
+
+
+def sample_rate(event_type, level):
+    """Fraction of events kept; only info-level events are ever sampled"""
+    if level != 'info':
+        return 1.0
+    return float(get_config()['SAMPLE_RATES'].get(event_type, 1.0))
+
+
+def is_sampled_out(rate):
+    return rate < 1.0 and random.random() >= rate
+
+
+def flush():
+    if _writer is not None:
+        _writer.flush()
+
+
+def shutdown():
+    if _writer is not None:
+        _writer.shutdown()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from inventory.log_archive import archive_logs, get_config
+
+
+class Command(BaseCommand):
+    help = "Move SystemLog entries older than the retention window into compressed monthly archives"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Retention window in days (default: SYSTEM_LOG_RETENTION['DAYS'])")
+        parser.add_argument('--chunk-size', type=int, help="Rows archived and deleted per transaction")
+        parser.add_argument('--archive-dir', help="Directory for systemlog-YYYY-MM.jsonl.gz files")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows would be archived")
+
+    def handle(self, *args, **options):
+        config = get_config()
+        days = options['days'] if options['days'] is not None else config['DAYS']
+        count = archive_logs(
+            days=days,
+            chunk_size=options['chunk_size'],
+            archive_dir=options['archive_dir'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f"{count} log entries older than {days} days would be archived")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Archived {count} log entries older than {days} days"))
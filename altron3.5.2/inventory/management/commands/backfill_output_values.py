@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from inventory.models import TestAnswer
+from inventory.outputs import backfill
+
+
+class Command(BaseCommand):
+    help = ("Parse TestAnswer.technical_output into output_value/output_unit, for answers written "
+            "before those columns existed or by direct SQL")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Re-parse every answer, not only those without a parsed value")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Answers updated per transaction")
+
+    def handle(self, *args, **options):
+        answers = TestAnswer.objects.all()
+        if not options['all']:
+            answers = answers.filter(output_value__isnull=True)
+        updated = backfill(answers, batch_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Parsed the technical output of {updated} answers"))
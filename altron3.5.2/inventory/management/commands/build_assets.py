@@ -0,0 +1,36 @@
+import os
+import shutil
+import subprocess
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+SOURCE = os.path.join('assets', 'css', 'app.css')
+OUTPUT = os.path.join('static', 'css', 'app.css')
+
+
+class Command(BaseCommand):
+    help = ("Build the purged, minified Tailwind bundle (static/css/app.css) from assets/css/app.css, "
+            "optionally followed by collectstatic")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collectstatic', action='store_true',
+                            help="Run collectstatic afterwards (hashed names plus .gz/.br variants)")
+
+    def handle(self, *args, **options):
+        # The standalone CLI comes from requirements-build.txt (tailwindcss-bin)
+        binary = os.environ.get('TAILWINDCSS_BIN') or shutil.which('tailwindcss')
+        if not binary:
+            raise CommandError("tailwindcss not found. pip install -r requirements-build.txt, "
+                               "or point TAILWINDCSS_BIN at the standalone CLI.")
+
+        result = subprocess.run([binary, '--input', SOURCE, '--output', OUTPUT, '--minify'],
+                                cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"Tailwind build failed:\n{result.stderr}")
+        size = os.path.getsize(os.path.join(settings.BASE_DIR, OUTPUT))
+        self.stdout.write(self.style.SUCCESS(f"Built {OUTPUT} ({size / 1024:.1f} KiB)"))
+
+        if options['collectstatic']:
+            call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.startup import measure
+
+
+class Command(BaseCommand):
+    help = ("Measure worker start-up import time and fail if it is over settings.IMPORT_BUDGET "
+            "or a lazily loaded module (WeasyPrint, python-barcode) is imported at start-up")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Cold starts to take the median of")
+        parser.add_argument('--top', type=int, default=10, help="Slowest top-level imports to list")
+        parser.add_argument('--json', action='store_true', help="Print the measurement as JSON")
+
+    def handle(self, *args, **options):
+        result = measure(runs=options['runs'])
+        result['slowest'] = result['slowest'][:options['top']]
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            self.stdout.write(f"Start-up imports: median {result['median_ms']} ms "
+                              f"(budget {result['budget_ms']} ms) over {options['runs']} runs")
+            for name, ms in result['slowest']:
+                self.stdout.write(f"  {ms:8.1f} ms  {name}")
+
+        problems = []
+        if result['lazy_modules_loaded']:
+            problems.append(f"imported at start-up: {', '.join(result['lazy_modules_loaded'])}")
+        if result['median_ms'] > result['budget_ms']:
+            problems.append(f"{result['median_ms']} ms is over the {result['budget_ms']} ms budget")
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS("Within the import budget"))
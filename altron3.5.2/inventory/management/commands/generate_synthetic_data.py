@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import synthetic
+
+
+class Command(BaseCommand):
+    help = "Generate a production-shaped synthetic dataset (SKUs prefixed SYN) for scaling and benchmark runs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skus', type=int, default=5)
+        parser.add_argument('--batches-per-sku', type=int, default=4)
+        parser.add_argument('--barcodes-per-batch', type=int, default=250, help="Mean batch size")
+        parser.add_argument('--questions', type=int, default=15, help="Questions per test template")
+        parser.add_argument('--testers', type=int, default=8)
+        parser.add_argument('--days', type=int, default=180, help="Spread activity over this many past days")
+        parser.add_argument('--seed', type=int, help="Random seed, for reproducible datasets")
+        parser.add_argument('--no-logs', action='store_true', help="Skip SystemLog events")
+        parser.add_argument('--clear', action='store_true', help="Delete previously generated synthetic data and exit")
+        parser.add_argument('--force', action='store_true', help="Allow running with DEBUG off")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG is off; this looks like a production database. Pass --force to continue.")
+
+        if options['clear']:
+            deleted = synthetic.clear()
+            for label, count in sorted(deleted.items()):
+                self.stdout.write(f"{label}: {count}")
+            self.stdout.write(self.style.SUCCESS("Synthetic data removed"))
+            return
+
+        started = time.perf_counter()
+        counts = synthetic.generate(
+            skus=options['skus'],
+            batches_per_sku=options['batches_per_sku'],
+            barcodes_per_batch=options['barcodes_per_batch'],
+            questions_per_template=options['questions'],
+            testers=options['testers'],
+            days=options['days'],
+            seed=options['seed'],
+            log_events=not options['no_logs'],
+            progress=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        summary = ', '.join(f"{count} {label.replace('_', ' ')}" for label, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {summary} in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,51 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import importer
+from inventory.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ("Import test results from a CSV or XLSX file, one row per answer (see inventory/importer.py "
+            "for the columns). Invalid rows are reported and skipped; the rest of the file is imported.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="A .csv or .xlsx file")
+        parser.add_argument('--user', required=True, help="Username recorded as tester where the file has no tester column")
+        parser.add_argument('--chunk-rows', type=int, default=importer.CHUNK_ROWS, help="Rows written per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Validate the file without writing anything")
+        parser.add_argument('--errors', metavar='PATH', help="Write the row errors to this CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['user'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}")
+
+        started = time.perf_counter()
+
+        def progress(report):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {report.rows} rows, {report.tests} tests ({time.perf_counter() - started:.0f}s)")
+
+        try:
+            report = importer.import_results(options['path'], options['path'], user, chunk_rows=options['chunk_rows'],
+                                             dry_run=options['dry_run'], progress=progress)
+        except (importer.ImportFileError, OSError) as e:
+            raise CommandError(str(e))
+
+        for row_number, message in report.errors[:20]:
+            self.stderr.write(f"Row {row_number}: {message}")
+        if report.error_count > 20:
+            self.stderr.write(f"... and {report.error_count - 20} more")
+        if options['errors'] and report.errors:
+            with open(options['errors'], 'w', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(['row', 'error'])
+                writer.writerows(report.errors)
+
+        prefix = "Dry run, nothing written. " if options['dry_run'] else ""
+        style = self.style.WARNING if report.error_count else self.style.SUCCESS
+        self.stdout.write(style(f"{prefix}{report.summary()} in {time.perf_counter() - started:.1f}s"))
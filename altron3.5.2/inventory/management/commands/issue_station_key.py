@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import CustomUser, TestStation
+
+
+class Command(BaseCommand):
+    help = ("Register an automated test station for the ingestion API, or rotate the key of an existing one. "
+            "Prints the new key; only its hash is stored.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="Station name, e.g. 'Burn-in rig 7'")
+        parser.add_argument('--user', help="Username tests from this station are recorded as (required for a new station)")
+
+    def handle(self, *args, **options):
+        station = TestStation.objects.filter(name=options['name']).first()
+        if options['user']:
+            try:
+                user = CustomUser.objects.get(username=options['user'])
+            except CustomUser.DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}")
+        elif station is None:
+            raise CommandError("--user is required when registering a new station")
+        else:
+            user = station.user
+
+        created = station is None
+        if created:
+            station = TestStation(name=options['name'])
+        station.user = user
+        key = station.issue_key()
+        station.save()
+        action = "Registered" if created else "Rotated the key of"
+        self.stdout.write(self.style.SUCCESS(f"{action} station {station.name} (tests recorded as {user.username})"))
+        self.stdout.write(key)
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import analytics
+
+
+class Command(BaseCommand):
+    help = ("Print a quality metric (failure Pareto, pass rates or co-failure matrix) "
+            "for a date range as JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument('metric', choices=analytics.METRICS)
+        parser.add_argument('--start', help="First day, YYYY-MM-DD (default: DEFAULT_DAYS before --end)")
+        parser.add_argument('--end', help="Last day, YYYY-MM-DD (default: today)")
+        parser.add_argument('--by', choices=list(analytics.GROUPS), default='question', help="Grouping for pass_rates")
+        parser.add_argument('--template', type=int, help="Only questions of this template id (pareto, co_failures)")
+        parser.add_argument('--limit', type=int, default=20, help="Questions listed by pareto")
+        parser.add_argument('--size', type=int, help="Questions in the co_failures matrix")
+        parser.add_argument('--fresh', action='store_true', help="Recompute instead of using cached results")
+
+    def handle(self, *args, **options):
+        if options['fresh']:
+            analytics.invalidate()
+        try:
+            data = analytics.report(
+                options['metric'], start=options['start'], end=options['end'], by=options['by'],
+                limit=options['limit'], size=options['size'], template=options['template'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(json.dumps(data, indent=2))
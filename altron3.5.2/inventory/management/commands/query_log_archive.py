@@ -0,0 +1,63 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from inventory.log_archive import iter_archived_logs
+
+
+def _parse_bound(value, end_of_day=False):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value}")
+        parsed = datetime.datetime.combine(day, datetime.time.max if end_of_day else datetime.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Search archived SystemLog entries (read-only)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="Start date or datetime (inclusive)")
+        parser.add_argument('--to', dest='end', help="End date or datetime (inclusive)")
+        parser.add_argument('--event-type')
+        parser.add_argument('--level')
+        parser.add_argument('--serial', help="Barcode sequence number")
+        parser.add_argument('--case-id', help="Service case ID")
+        parser.add_argument('--search', help="Case-insensitive text match on title and description")
+        parser.add_argument('--archive-dir')
+        parser.add_argument('--limit', type=int, default=0, help="Stop after this many entries (0 = no limit)")
+        parser.add_argument('--json', action='store_true', help="Print entries as JSON lines")
+
+    def handle(self, *args, **options):
+        entries = iter_archived_logs(
+            start=_parse_bound(options['start']),
+            end=_parse_bound(options['end'], end_of_day=True),
+            event_type=options['event_type'],
+            level=options['level'],
+            serial=options['serial'],
+            case_id=options['case_id'],
+            search=options['search'],
+            archive_dir=options['archive_dir'],
+        )
+        shown = 0
+        for entry in entries:
+            if options['json']:
+                self.stdout.write(json.dumps(entry, cls=DjangoJSONEncoder))
+            else:
+                self.stdout.write(
+                    f"{entry['timestamp']:%Y-%m-%d %H:%M:%S} [{entry['level'].upper()}] "
+                    f"{entry['event_type']} - {entry['title']}"
+                )
+            shown += 1
+            if options['limit'] and shown >= options['limit']:
+                break
@@ -0,0 +1,58 @@
+import os
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from inventory.routers import get_config
+
+
+class Command(BaseCommand):
+    help = "Copy the SQLite primary into the reporting replica snapshot (REPORTING_REPLICA_SQLITE)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int,
+                            help="Keep running and refresh every INTERVAL seconds (otherwise refresh once)")
+
+    def handle(self, *args, **options):
+        config = get_config()
+        alias = config['ALIAS']
+        if alias not in connections.databases:
+            raise CommandError(f"No '{alias}' database configured. Set REPORTING_REPLICA_SQLITE to a snapshot path.")
+        source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if target.vendor != 'sqlite':
+            raise CommandError(f"The '{alias}' database is {target.vendor}; replication keeps it current, "
+                               f"there is no snapshot to refresh.")
+        if source.vendor != 'sqlite':
+            raise CommandError("Snapshots can only be taken of a SQLite primary.")
+
+        while True:
+            started = time.monotonic()
+            self.refresh(str(source.settings_dict['NAME']), str(target.settings_dict['NAME']))
+            self.stdout.write(self.style.SUCCESS(
+                f"Reporting snapshot refreshed in {time.monotonic() - started:.1f}s; "
+                f"web workers start using it within {config['CHECK_INTERVAL']}s"
+            ))
+            if not options['interval']:
+                break
+            time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
+
+    def refresh(self, source_path, target_path):
+        temp_path = f'{target_path}.tmp'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        # The backup API copies a consistent view of the database; in WAL
+        # mode it doesn't block writers while it runs.
+        source = sqlite3.connect(source_path, timeout=20)
+        target = sqlite3.connect(temp_path)
+        try:
+            source.backup(target)
+            # A single-file snapshot: no -wal/-shm files to go stale beside it
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
+            source.close()
+        # Readers with the old snapshot open keep reading it until they reconnect.
+        # Each web worker sees the new mtime at its next CHECK_INTERVAL health check.
+        os.replace(temp_path, target_path)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from inventory.lifecycle import rebuild
+from inventory.models import Barcode
+
+
+class Command(BaseCommand):
+    help = ("Recompute Barcode.latest_test and lifecycle_state from tests and service cases, "
+            "e.g. after bulk imports or direct SQL that bypassed the model signals")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, action='append', dest='batches',
+                            help="Only barcodes of this batch id (repeatable)")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Barcodes recomputed per query round")
+
+    def handle(self, *args, **options):
+        barcodes = Barcode.objects.all()
+        if options['batches']:
+            barcodes = barcodes.filter(batch_id__in=options['batches'])
+        changed = rebuild(barcodes, batch_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Repaired {changed} of {barcodes.count()} barcodes"))
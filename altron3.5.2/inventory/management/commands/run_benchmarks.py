@@ -0,0 +1,248 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import date
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.db import sqlite_status
+from inventory.models import SKU, Barcode, Batch, CustomUser, ServiceCase, Test, TestAnswer, TestQuestion
+from inventory.perf import percentile
+from inventory.synthetic import ADMIN_USERNAME
+
+
+class Rollback(Exception):
+    """Raised inside a benchmark's transaction to discard what the request wrote"""
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=settings.BASE_DIR).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                                    text=True, cwd=settings.BASE_DIR).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit, 'dirty': dirty}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the app's key paths (batch creation, autosave, test_results, service_list, barcode image, "
+        "PDF rendering, dashboard) through the Django test client and write the results as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed runs before each benchmark")
+        parser.add_argument('--only', nargs='+', metavar='NAME', help="Run only these benchmarks")
+        parser.add_argument('--username', default=ADMIN_USERNAME, help="Admin-role user the requests run as")
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+        parser.add_argument('--compare', help="Earlier JSON report to print median changes against")
+
+    def handle(self, *args, **options):
+        user = CustomUser.objects.filter(username=options['username'], role='admin').first()
+        if user is None:
+            raise CommandError(f"No admin-role user '{options['username']}'. Run generate_synthetic_data first "
+                               f"or pass --username.")
+
+        benchmarks = self.benchmarks()
+        names = options['only'] or list(benchmarks)
+        unknown = set(names) - set(benchmarks)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}. "
+                               f"Available: {', '.join(benchmarks)}")
+
+        client = Client(SERVER_NAME='localhost')
+        client.force_login(user)
+
+        results = {}
+        # The monitor would log every slow benchmark request as a performance_issue
+        with override_settings(PERFORMANCE_BUDGETS={'ENABLED': False}):
+            for name in names:
+                setup = benchmarks[name]
+                request = setup()
+                if request is None:
+                    results[name] = {'skipped': 'no suitable data; run generate_synthetic_data'}
+                    self.stderr.write(f"{name}: skipped")
+                    continue
+                results[name] = self.run(client, request, options['iterations'], options['warmup'])
+                self.stderr.write(f"{name}: median {results[name]['median_ms']} ms, "
+                                  f"{results[name]['queries']} queries, status {results[name]['status']}")
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'git': git_revision(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': sqlite_status(),
+                'debug': settings.DEBUG,
+            },
+            'dataset': {
+                'skus': SKU.objects.count(),
+                'batches': Batch.objects.count(),
+                'barcodes': Barcode.objects.count(),
+                'tests': Test.objects.count(),
+                'answers': TestAnswer.objects.count(),
+                'service_cases': ServiceCase.objects.count(),
+            },
+            'iterations': options['iterations'],
+            'results': results,
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def run(self, client, request, iterations, warmup):
+        method, path, data, mutates = request
+        send = getattr(client, method)
+
+        def once():
+            if not mutates:
+                return send(path, data)
+            # Writes are rolled back so repeated runs measure the same database
+            try:
+                with transaction.atomic():
+                    response = send(path, data)
+                    raise Rollback(response)
+            except Rollback as rollback:
+                return rollback.args[0]
+
+        for _ in range(warmup):
+            once()
+
+        timings, query_counts, statuses = [], [], set()
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = once()
+                timings.append((time.perf_counter() - started) * 1000)
+            # Transaction bookkeeping (including the rollback wrapper's) isn't counted as queries
+            query_counts.append(sum(
+                1 for query in captured.captured_queries
+                if not query['sql'].startswith(('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK'))
+            ))
+            statuses.add(response.status_code)
+
+        timings.sort()
+        return {
+            'path': path,
+            'method': method.upper(),
+            'status': sorted(statuses)[0] if len(statuses) == 1 else sorted(statuses),
+            'queries': int(statistics.median(query_counts)),
+            'min_ms': round(timings[0], 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'max_ms': round(timings[-1], 2),
+        }
+
+    def compare(self, path, results):
+        with open(path) as fh:
+            previous = json.load(fh)['results']
+        self.stderr.write(f"\nMedian vs {path}:")
+        for name, result in results.items():
+            before = previous.get(name, {}).get('median_ms')
+            after = result.get('median_ms')
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            self.stderr.write(f"  {name:<22} {before:>9.2f} -> {after:>9.2f} ms ({change:+.1f}%)")
+
+    def benchmarks(self):
+        """name -> callable returning (method, path, data, mutates), or None when the data is missing"""
+        def latest_test():
+            return (Test.objects.filter(overall_status__in=['passed', 'failed'], barcode__isnull=False)
+                    .select_related('batch', 'barcode', 'template_used').order_by('-id').first())
+
+        def latest_batch():
+            return Batch.objects.select_related('spec_template').exclude(spec_template=None).order_by('-id').first()
+
+        def dashboard():
+            return 'get', reverse('dashboard'), {}, False
+
+        def batch_creation():
+            batch = latest_batch()
+            if batch is None:
+                return None
+            data = {
+                'sku': batch.sku_id, 'spec_template': batch.spec_template_id,
+                'batch_date': date.today().isoformat(), 'quantity': 100,
+            }
+            for field in batch.spec_template.fields_json:
+                data[field] = getattr(batch, field, None) or 'N/A'
+            return 'post', reverse('create_batch'), data, True
+
+        def autosave():
+            test = latest_test()
+            if test is None or test.template_used_id is None:
+                return None
+            data = {
+                'sku': test.sku_id, 'batch': test.batch_id, 'barcode': test.barcode_id,
+                'template': test.template_used_id, 'overall_status': 'draft',
+            }
+            for question in TestQuestion.objects.filter(template_id=test.template_used_id):
+                data[f'question_{question.id}_status'] = 'pass'
+                data[f'question_{question.id}_output'] = ''
+                data[f'question_{question.id}_remarks'] = ''
+            return 'post', reverse('auto_save_test'), data, True
+
+        def test_results():
+            return 'get', reverse('test_results'), {}, False
+
+        def test_results_filtered():
+            test = latest_test()
+            if test is None:
+                return None
+            return 'get', reverse('test_results'), {'batch': test.batch_id, 'overall_status': 'failed'}, False
+
+        def service_list():
+            return 'get', reverse('service_list'), {}, False
+
+        def barcode_image():
+            barcode = Barcode.objects.order_by('-id').first()
+            if barcode is None:
+                return None
+            return 'get', reverse('barcode_image', args=[barcode.sequence_number]), {}, False
+
+        def test_report_pdf():
+            test = latest_test()
+            if test is None:
+                return None
+            return 'get', reverse('print_test_report', args=[test.id]), {}, False
+
+        def barcode_labels_pdf():
+            batch = latest_batch()
+            if batch is None:
+                return None
+            return 'get', reverse('print_barcodes_pdf', args=[batch.id]), {}, False
+
+        return {
+            'dashboard': dashboard,
+            'batch_creation': batch_creation,
+            'autosave': autosave,
+            'test_results': test_results,
+            'test_results_filtered': test_results_filtered,
+            'service_list': service_list,
+            'barcode_image': barcode_image,
+            'test_report_pdf': test_report_pdf,
+            'barcode_labels_pdf': barcode_labels_pdf,
+        }
@@ -0,0 +1,128 @@
+import json
+import logging
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import loadsim
+from inventory.db import sqlite_status
+
+
+def parse_mix(value):
+    """'tester=8,service=1,labels=1' -> {'tester': 8, 'service': 1, 'labels': 1}"""
+    mix = {}
+    for part in value.split(','):
+        role, _, weight = part.partition('=')
+        role = role.strip()
+        if role not in loadsim.ROLES:
+            raise CommandError(f"Unknown role '{role}' in --mix (choose from {', '.join(loadsim.ROLES)})")
+        try:
+            mix[role] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight '{weight}' for role '{role}' in --mix")
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate concurrent testers, service desk and label printing, and report throughput, latency "
+        "percentiles and 'database is locked' rates. Writes real rows: use a generate_synthetic_data database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent simulated users")
+        parser.add_argument('--mode', choices=['thread', 'process'], default='thread',
+                            help="Run workers as threads or as forked processes (separate DB connections per "
+                                 "process, like a multi-worker WSGI server)")
+        parser.add_argument('--mix', default='tester=8,service=1,labels=1', help="Role weights, e.g. tester=8,service=1")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to run (0 to use --flows only)")
+        parser.add_argument('--flows', type=int, help="Stop each worker after this many flows")
+        parser.add_argument('--ramp-up', type=float, default=0, help="Seconds over which workers are started")
+        parser.add_argument('--think-time', type=float, default=0,
+                            help="Mean pause between a worker's requests, in seconds")
+        parser.add_argument('--autosaves', type=int, default=4, help="auto_save_test calls per tester flow")
+        parser.add_argument('--url', help="Base URL of a running server; default drives the WSGI app in-process")
+        parser.add_argument('--password', help="With --url: password to set on the synthetic users and log in with")
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+        parser.add_argument('--force', action='store_true', help="Allow running with DEBUG off")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG is off; this looks like a production database. Pass --force to continue.")
+        if options['url'] and not options['password']:
+            raise CommandError("--url needs --password so the simulated users can log in")
+        if not options['duration'] and not options['flows']:
+            raise CommandError("Give a --duration or a number of --flows")
+        if options['mode'] == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError("--mode process needs fork(); on this platform use threads, or --url against a "
+                               "multi-worker server")
+
+        pool = loadsim.build_pool(seed=options['seed'])
+        if pool is None:
+            raise CommandError("No barcodes with a default test template. Run generate_synthetic_data first.")
+
+        roles = loadsim.assign_roles(options['workers'], parse_mix(options['mix']))
+        users = loadsim.simulation_users(roles, password=options['password'] if options['url'] else None)
+        if users is None:
+            raise CommandError("Synthetic users not found. Run generate_synthetic_data first.")
+
+        workers = []
+        for index, (role, user) in enumerate(zip(roles, users)):
+            if options['url']:
+                factory = (lambda username=user.username:
+                           loadsim.HttpTransport(options['url'], username, options['password']))
+            else:
+                factory = lambda user=user: loadsim.ClientTransport(user)
+            seed = None if options['seed'] is None else options['seed'] + index
+            workers.append(loadsim.Worker(role, factory, pool, think_time=options['think_time'],
+                                          autosaves=options['autosaves'], seed=seed))
+
+        self.stderr.write(f"Starting {len(workers)} {options['mode']} workers "
+                          f"({', '.join(f'{roles.count(r)} {r}' for r in loadsim.ROLES if r in roles)}) "
+                          f"against {options['url'] or 'the in-process WSGI app'}")
+
+        run = loadsim.run_processes if options['mode'] == 'process' else loadsim.run_threads
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        # Failed requests are counted below; don't also print a traceback for each
+        request_logger.setLevel(logging.CRITICAL)
+        started = time.monotonic()
+        try:
+            samples, failures = run(workers, duration=options['duration'] or None, flows=options['flows'],
+                                    ramp_up=options['ramp_up'])
+        finally:
+            request_logger.setLevel(previous_level)
+        summary = loadsim.summarize(samples, time.monotonic() - started)
+        summary['workers'] = {'count': len(workers), 'mode': options['mode'], 'roles': roles}
+        summary['database'] = sqlite_status()
+        summary['first_errors'] = failures
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        self.print_summary(summary)
+
+    def print_summary(self, summary):
+        self.stdout.write(
+            f"\n{summary['requests']} requests, {summary['flows']} flows in {summary['elapsed_s']}s "
+            f"= {summary['throughput_rps']} req/s"
+        )
+        self.stdout.write(f"database: {', '.join(f'{k}={v}' for k, v in summary['database'].items())}")
+        self.stdout.write(f"errors: {summary['errors']} ({summary['error_rate']:.2%})   "
+                          f"database is locked: {summary['locked']} ({summary['locked_rate']:.2%})\n")
+        header = f"{'action':<22}{'count':>7}{'err':>6}{'lock':>6}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for action, row in summary['actions'].items():
+            self.stdout.write(
+                f"{action:<22}{row['count']:>7}{row['errors']:>6}{row['locked']:>6}"
+                f"{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}"
+            )
+        self.stdout.write("(latencies in ms)")
+        if summary['first_errors']:
+            self.stdout.write("\nFirst error per action:")
+            for action, message in summary['first_errors'].items():
+                self.stdout.write(f"  {action}: {message[:200]}")
@@ -0,0 +1,336 @@
+import mimetypes
+import os
+import re
+import zlib
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import perf
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+PERFORMANCE_DEFAULTS = {
+    'ENABLED': True,
+    'DEFAULT': {'wall_ms': 1500, 'queries': 60, 'db_ms': 500},
+    'VIEWS': {},
+    'TOP_QUERIES': 5,
+}
+
+
+def get_performance_config():
+    config = dict(PERFORMANCE_DEFAULTS)
+    config.update(getattr(settings, 'PERFORMANCE_BUDGETS', {}))
+    return config
+
+
+class PerformanceMonitorMiddleware:
+    """
+    Measure wall time, query count, DB time and tracked render timers per view,
+    and record a `performance_issue` SystemLog entry when a budget is exceeded.
+
+    Budgets come from settings.PERFORMANCE_BUDGETS; per-view entries (keyed by
+    URL name) override the defaults, and any `perf.track()` timer can be
+    budgeted as `<name>_ms`, e.g. {'print_test_report': {'weasyprint_ms': 2000}}.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_performance_config()
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        metrics, token = perf.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            perf.stop(token)
+
+        self.check_budgets(request, metrics, config)
+        return response
+
+    def check_budgets(self, request, metrics, config):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.url_name if match and match.url_name else request.path
+
+        budget = dict(config['DEFAULT'])
+        budget.update(config['VIEWS'].get(view_name, {}))
+
+        measured = {
+            'wall_ms': round(metrics.wall_ms, 1),
+            'queries': len(metrics.queries),
+            'db_ms': round(metrics.db_ms, 1),
+        }
+        measured.update(metrics.timer_ms())
+
+        exceeded = {
+            key: {'measured': measured[key], 'budget': limit}
+            for key, limit in budget.items()
+            if key in measured and measured[key] > limit
+        }
+        if not exceeded:
+            return
+
+        from .models import SystemLog
+
+        user = getattr(request, 'user', None)
+        SystemLog.log_event(
+            event_type='performance_issue',
+            title=f'Performance budget exceeded: {view_name}',
+            description=', '.join(
+                f"{key} {values['measured']} > {values['budget']}" for key, values in exceeded.items()
+            ),
+            level='warning',
+            user=user if user is not None and user.is_authenticated else None,
+            request=request,
+            details={
+                'view': view_name,
+                'path': request.path,
+                'method': request.method,
+                'measured': measured,
+                'exceeded': exceeded,
+                'top_queries': metrics.top_fingerprints(config['TOP_QUERIES']),
+            },
+        )
+
+
+_CODING_RE = re.compile(r'^\s*([^;\s]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def accepts_encoding(request, coding):
+    """Whether the Accept-Encoding header allows `coding` (honouring q=0)"""
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        match = _CODING_RE.match(part)
+        if match and match.group(1).lower() in (coding, '*'):
+            try:
+                return float(match.group(2) or 1) > 0
+            except ValueError:
+                return False
+    return False
+
+
+# Precompressed variants written by inventory.storage, best first
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+
+class StaticAssetMiddleware:
+    """
+    Serve collected static files from STATIC_ROOT without a separate web server.
+
+    The precompressed `.br`/`.gz` variant the client accepts is sent as is.
+    Manifest-hashed names never change content, so they are cached for a year
+    as immutable; unhashed names revalidate against Last-Modified. Requests for
+    files that aren't in STATIC_ROOT fall through to the rest of the stack
+    (runserver's own static handler in development).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else f'/{settings.STATIC_URL}'
+        self.root = settings.STATIC_ROOT
+        self._hashed_names = None
+
+    def __call__(self, request):
+        if self.root and request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def hashed_names(self):
+        if self._hashed_names is None:
+            self._hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        return self._hashed_names
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        served, encoding = path, None
+        for coding, suffix in STATIC_ENCODINGS:
+            if os.path.isfile(path + suffix) and accepts_encoding(request, coding):
+                served, encoding = path + suffix, coding
+                break
+
+        mtime = os.stat(served).st_mtime
+        if not was_modified_since(request.headers.get('If-Modified-Since'), mtime):
+            response = HttpResponseNotModified()
+        else:
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            response = FileResponse(open(served, 'rb'), content_type=content_type)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(mtime)
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if name in self.hashed_names() else REVALIDATE_CACHE_CONTROL
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+COMPRESSION_DEFAULTS = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,        # bytes; smaller bodies aren't worth the CPU
+    'BROTLI_QUALITY': 5,     # on-the-fly quality: most of the ratio of 11 at a fraction of the cost
+    'GZIP_LEVEL': 6,
+    'FLUSH_BYTES': 64 * 1024,  # streaming: flush the encoder after this much input
+    # PDFs, PNGs and XLSX are already compressed and aren't listed
+    'CONTENT_TYPES': ['text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'],
+}
+
+
+def get_compression_config():
+    config = dict(COMPRESSION_DEFAULTS)
+    config.update(getattr(settings, 'RESPONSE_COMPRESSION', {}))
+    return config
+
+
+class _GzipEncoder:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def process(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def process(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress text responses (HTML, JSON, CSV, JS) with Brotli or gzip,
+    whichever the client prefers to accept.
+
+    Regular responses under MIN_SIZE, or that don't come out smaller, are sent
+    as is. Streaming responses are compressed chunk by chunk as they are
+    produced, flushing every FLUSH_BYTES of input, so an export never sits in
+    memory whole. Responses that already carry a Content-Encoding (the
+    precompressed static files) or ask for `no-transform` are left alone.
+    Tune it with settings.RESPONSE_COMPRESSION.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        config = get_compression_config()
+        if not config['ENABLED'] or not self.compressible(response, config):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.negotiate(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.compress_async_stream(
+                    response.streaming_content, self.encoder(encoding, config), config['FLUSH_BYTES'])
+            else:
+                response.streaming_content = self.compress_stream(
+                    response.streaming_content, self.encoder(encoding, config), config['FLUSH_BYTES'])
+            del response['Content-Length']
+        else:
+            encoder = self.encoder(encoding, config)
+            compressed = encoder.process(response.content) + encoder.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The encoded body differs byte for byte; a strong ETag would be wrong
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def compressible(self, response, config):
+        if response.has_header('Content-Encoding') or 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        if response.status_code in (204, 206, 304):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(tuple(config['CONTENT_TYPES'])):
+            return False
+        if response.streaming:
+            # FileResponse knows its length; a generator doesn't
+            length = response.get('Content-Length')
+            return length is None or int(length) >= config['MIN_SIZE']
+        return len(response.content) >= config['MIN_SIZE']
+
+    def negotiate(self, request):
+        if brotli is not None and accepts_encoding(request, 'br'):
+            return 'br'
+        if accepts_encoding(request, 'gzip'):
+            return 'gzip'
+        return None
+
+    def encoder(self, encoding, config):
+        if encoding == 'br':
+            return _BrotliEncoder(config['BROTLI_QUALITY'])
+        return _GzipEncoder(config['GZIP_LEVEL'])
+
+    @staticmethod
+    def compress_stream(chunks, encoder, flush_bytes):
+        pending = 0
+        for chunk in chunks:
+            data = encoder.process(chunk)
+            pending += len(chunk)
+            if pending >= flush_bytes:
+                data += encoder.flush()
+                pending = 0
+            if data:
+                yield data
+        yield encoder.finish()
+
+    @staticmethod
+    async def compress_async_stream(chunks, encoder, flush_bytes):
+        pending = 0
+        async for chunk in chunks:
+            data = encoder.process(chunk)
+            pending += len(chunk)
+            if pending >= flush_bytes:
+                data += encoder.flush()
+                pending = 0
+            if data:
+                yield data
+        yield encoder.finish()
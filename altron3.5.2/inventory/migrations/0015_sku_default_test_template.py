@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-19 04:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_batch_attachment_alter_servicecase_technician'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sku',
+            name='default_test_template',
+            field=models.ForeignKey(blank=True, help_text='Test template preloaded when a serial of this SKU is scanned', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='default_for_skus', to='inventory.testtemplate'),
+        ),
+        migrations.AlterField(
+            model_name='test',
+            name='barcode',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='inventory.barcode'),
+        ),
+        migrations.AlterField(
+            model_name='test',
+            name='overall_status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('pending', 'Pending'), ('passed', 'Passed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-19 04:11
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """Start each year's counter after the highest case ID already issued"""
+    ServiceCase = apps.get_model('inventory', 'ServiceCase')
+    ServiceCaseSequence = apps.get_model('inventory', 'ServiceCaseSequence')
+
+    highest = {}
+    for case_id in ServiceCase.objects.filter(case_id__startswith='SVC-').values_list('case_id', flat=True).iterator():
+        parts = case_id.split('-')
+        if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+            continue
+        year, number = int(parts[1]), int(parts[2])
+        highest[year] = max(highest.get(year, 0), number)
+
+    ServiceCaseSequence.objects.bulk_create(
+        [ServiceCaseSequence(year=year, last_value=value) for year, value in highest.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_sku_default_test_template'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceCaseSequence',
+            fields=[
+                ('year', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Service Case Sequence',
+                'verbose_name_plural': 'Service Case Sequences',
+            },
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
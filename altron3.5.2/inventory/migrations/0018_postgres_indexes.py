@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-19 04:31
+
+from django.db import migrations, models
+
+# Trigram indexes serve the `__icontains` serial and issue searches, which
+# Django compiles to UPPER(column::text) LIKE UPPER('%...%'); the indexed
+# expression has to match that exactly.
+TRIGRAM_INDEXES = [
+    ('inventory_barcode_seq_trgm_idx', 'inventory_barcode', 'sequence_number'),
+    ('inventory_servicecase_issue_trgm_idx', 'inventory_servicecase', 'issue_description'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_systemlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(condition=models.Q(('overall_status', 'draft')), fields=['user', '-updated_at'], name='inventory_test_draft_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2 on 2026-10-19 05:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+# Frozen copy of inventory.lifecycle as of this migration
+TEST_STATES = {'draft': 'draft', 'pending': 'draft', 'passed': 'passed', 'failed': 'failed'}
+ACTIVE_CASE_STATUSES = ('open', 'in_progress', 'on_hold')
+
+
+def derive_state(test_status, test_date, active_cases, completed_at):
+    if active_cases:
+        return 'in_service'
+    if completed_at is not None and (test_date is None or completed_at >= test_date):
+        return 'serviced'
+    if test_status is None:
+        return 'untested'
+    return TEST_STATES.get(test_status, 'draft')
+
+
+def backfill_lifecycle(apps, schema_editor, batch_size=2000):
+    Barcode = apps.get_model('inventory', 'Barcode')
+    Test = apps.get_model('inventory', 'Test')
+    ServiceCase = apps.get_model('inventory', 'ServiceCase')
+
+    ids = list(Barcode.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        latest = {}
+        tests = (Test.objects.filter(barcode_id__in=chunk).order_by('barcode_id', '-test_date', '-pk')
+                 .values_list('barcode_id', 'pk', 'overall_status', 'test_date'))
+        for barcode_id, pk, status, test_date in tests:
+            latest.setdefault(barcode_id, (pk, status, test_date))
+        cases = {
+            row['barcode_id']: row
+            for row in ServiceCase.objects.filter(barcode_id__in=chunk).order_by().values('barcode_id').annotate(
+                active=Count('pk', filter=Q(status__in=ACTIVE_CASE_STATUSES)),
+                completed_at=Max('updated_at', filter=Q(status='completed')),
+            )
+        }
+
+        updates = []
+        for barcode in Barcode.objects.filter(pk__in=chunk).only('pk'):
+            test_id, status, test_date = latest.get(barcode.pk, (None, None, None))
+            summary = cases.get(barcode.pk, {'active': 0, 'completed_at': None})
+            barcode.latest_test_id = test_id
+            barcode.lifecycle_state = derive_state(status, test_date, summary['active'], summary['completed_at'])
+            updates.append(barcode)
+        Barcode.objects.bulk_update(updates, ['latest_test', 'lifecycle_state'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_postgres_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barcode',
+            name='latest_test',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.test'),
+        ),
+        migrations.AddField(
+            model_name='barcode',
+            name='lifecycle_state',
+            field=models.CharField(choices=[('untested', 'Untested'), ('draft', 'Draft'), ('passed', 'Passed'), ('failed', 'Failed'), ('in_service', 'In Service'), ('serviced', 'Serviced')], default='untested', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='barcode',
+            index=models.Index(fields=['batch', 'lifecycle_state'], name='inventory_b_batch_i_9bb1d5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='barcode',
+            index=models.Index(fields=['lifecycle_state'], name='inventory_b_lifecyc_6f4848_idx'),
+        ),
+        migrations.RunPython(backfill_lifecycle, migrations.RunPython.noop),
+    ]
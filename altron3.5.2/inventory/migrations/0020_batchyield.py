@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-19 05:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    from inventory.rollups import rebuild
+    rebuild(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_barcode_lifecycle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchYield',
+            fields=[
+                ('batch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='yield_rollup', serialize=False, to='inventory.batch')),
+                ('tests', models.PositiveIntegerField(default=0)),
+                ('draft_tests', models.PositiveIntegerField(default=0)),
+                ('pending_tests', models.PositiveIntegerField(default=0)),
+                ('passed_tests', models.PositiveIntegerField(default=0)),
+                ('failed_tests', models.PositiveIntegerField(default=0)),
+                ('units_tested', models.PositiveIntegerField(default=0, help_text='Distinct barcodes with at least one test')),
+                ('testers', models.PositiveIntegerField(default=0, help_text='Distinct users who tested in this batch')),
+                ('tester_ids', models.JSONField(default=list)),
+                ('first_test_at', models.DateTimeField(blank=True, null=True)),
+                ('last_test_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Batch Yield',
+                'verbose_name_plural': 'Batch Yields',
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-19 05:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_batchyield'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='ingest_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.CreateModel(
+            name='TestStation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('key_prefix', models.CharField(editable=False, max_length=16, unique=True)),
+                ('key_hash', models.CharField(editable=False, max_length=64)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('user', models.ForeignKey(help_text='Tests posted by this station are recorded as this user', on_delete=django.db.models.deletion.PROTECT, related_name='test_stations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Test Station',
+                'verbose_name_plural': 'Test Stations',
+            },
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='station',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tests', to='inventory.teststation'),
+        ),
+        migrations.AddConstraint(
+            model_name='test',
+            constraint=models.UniqueConstraint(fields=('station', 'ingest_key'), name='inventory_test_ingest_key_uniq'),
+        ),
+    ]
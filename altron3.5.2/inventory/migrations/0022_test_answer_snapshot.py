@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-19 05:24
+
+from django.db import migrations, models
+
+
+def backfill_snapshots(apps, schema_editor):
+    from inventory.snapshots import rebuild
+    rebuild(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_test_station'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='answer_snapshot',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0022_test_answer_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testanswer',
+            name='output_unit',
+            field=models.CharField(blank=True, default='', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='testanswer',
+            name='output_value',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='testanswer',
+            index=models.Index(fields=['question', 'output_unit', 'output_value'], name='inventory_t_questio_30abe1_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 05:47
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def clear_repeated_keys(apps, schema_editor):
+    # Files that repeated a key imported every copy; the first test keeps it
+    Test = apps.get_model('inventory', 'Test')
+    repeated = (Test.objects.filter(station__isnull=True, ingest_key__isnull=False).order_by()
+                .values('ingest_key').annotate(count=Count('pk'), first=Min('pk')).filter(count__gt=1))
+    for row in repeated:
+        Test.objects.filter(station__isnull=True, ingest_key=row['ingest_key']).exclude(pk=row['first']).update(ingest_key=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0023_test_answer_output_value'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_repeated_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='test',
+            constraint=models.UniqueConstraint(condition=models.Q(('station__isnull', True)), fields=('ingest_key',), name='inventory_test_import_key_uniq'),
+        ),
+    ]
@@ -1,7 +1,11 @@
+import hashlib
+import secrets
 import string
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
+from . import outputs
+from .db import bulk_insert
 # from .utils import generate_barcode # Assuming this is not strictly needed for model definition
 
 class CustomUser(AbstractUser):
@@ -19,6 +23,8 @@ class CustomUser(AbstractUser):
 class SKU(models.Model):
     code = models.CharField(max_length=10, unique=True)
     description = models.TextField(blank=True)
+    # Template preloaded when a serial of this SKU is scanned in rapid test entry
+    default_test_template = models.ForeignKey('TestTemplate', on_delete=models.SET_NULL, null=True, blank=True, related_name='default_for_skus', help_text="Test template preloaded when a serial of this SKU is scanned")
 
     def __str__(self):
         return self.code
@@ -130,20 +136,33 @@ class Batch(models.Model):
                 )
                 next_suffix = increment_suffix(next_suffix)
 
-            Barcode.objects.bulk_create(barcodes)
+            bulk_insert(Barcode, barcodes)
 
 
 class Barcode(models.Model):
+    LIFECYCLE_CHOICES = (
+        ('untested', 'Untested'),
+        ('draft', 'Draft'),
+        ('passed', 'Passed'),
+        ('failed', 'Failed'),
+        ('in_service', 'In Service'),
+        ('serviced', 'Serviced'),
+    )
     batch = models.ForeignKey(Batch, on_delete=models.CASCADE)
     sku = models.ForeignKey(SKU, on_delete=models.CASCADE)
     sequence_number = models.CharField(max_length=30, unique=True)
     #barcode_image = models.ImageField(upload_to='barcodes/', blank=True, null=True)
+    # Maintained by inventory/lifecycle.py from the unit's tests and service cases
+    latest_test = models.ForeignKey('Test', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+    lifecycle_state = models.CharField(max_length=20, choices=LIFECYCLE_CHOICES, default='untested', editable=False)
 
     class Meta:
         indexes = [
             models.Index(fields=['sequence_number']),
             models.Index(fields=['batch']),
             models.Index(fields=['sku']),
+            models.Index(fields=['batch', 'lifecycle_state']),
+            models.Index(fields=['lifecycle_state']),
         ]
 
     def __str__(self):
@@ -169,6 +188,35 @@ class TestQuestion(models.Model):
         # Updated string representation to reflect the change
         return f"Template: {self.template.name} - {self.question_text}"
 
+class TestStation(models.Model):
+    """An automated test rig allowed to post results to the ingestion API (inventory/ingest.py)"""
+    name = models.CharField(max_length=100, unique=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.PROTECT, related_name='test_stations', help_text="Tests posted by this station are recorded as this user")
+    # The key itself is shown once when issued; only its hash is stored
+    key_prefix = models.CharField(max_length=16, unique=True, editable=False)
+    key_hash = models.CharField(max_length=64, editable=False)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        verbose_name = "Test Station"
+        verbose_name_plural = "Test Stations"
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def issue_key(self):
+        """Replace the station's API key and return the new one. Call save() afterwards."""
+        self.key_prefix = secrets.token_hex(4)
+        key = f'{self.key_prefix}.{secrets.token_urlsafe(32)}'
+        self.key_hash = self.hash_key(key)
+        return key
+
 class Test(models.Model):
     STATUS_CHOICES = (
         ('draft', 'Draft'),
@@ -184,30 +232,131 @@ class Test(models.Model):
     overall_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     test_date = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Results posted through the ingestion API: the posting rig and its idempotency key
+    station = models.ForeignKey(TestStation, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='tests')
+    ingest_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
+    # Frozen answers of a finalized test, see inventory/snapshots.py
+    answer_snapshot = models.JSONField(null=True, blank=True, editable=False)
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['station', 'ingest_key'], name='inventory_test_ingest_key_uniq'),
+            # station is NULL for imported tests, which the constraint above doesn't cover
+            models.UniqueConstraint(fields=['ingest_key'], condition=models.Q(station__isnull=True),
+                                    name='inventory_test_import_key_uniq'),
+        ]
         indexes = [
             models.Index(fields=['barcode']),
             models.Index(fields=['overall_status']),
             models.Index(fields=['test_date']),
             models.Index(fields=['sku', 'batch']),
             models.Index(fields=['-test_date']),  # For ordering
+            # Open drafts are a small slice of all tests; index just those for the resume list
+            models.Index(
+                fields=['user', '-updated_at'], condition=models.Q(overall_status='draft'),
+                name='inventory_test_draft_idx',
+            ),
         ]
 
     def __str__(self):
         barcode_str = self.barcode.sequence_number if self.barcode else 'No Barcode'
         return f"Test {self.id} - {barcode_str} ({self.overall_status})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What was loaded, so the BatchYield rollup can tell what a save changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+class TestAnswerQuerySet(models.QuerySet):
+    def with_output(self, unit, **bounds):
+        """
+        Answers whose parsed technical output is in `unit` and within `bounds`
+        (lt, lte, gt, gte), e.g. with_output('W', lt=1500)
+        """
+        lookups = {}
+        for name, value in bounds.items():
+            if name not in ('lt', 'lte', 'gt', 'gte'):
+                raise TypeError(f"Unknown bound {name!r}, expected lt, lte, gt or gte")
+            lookups[f'output_value__{name}'] = value
+        return self.filter(output_unit=unit.upper(), output_value__isnull=False, **lookups)
+
+    def output_stats(self):
+        """Count, min, max and mean of the parsed outputs per question and unit"""
+        return (self.filter(output_value__isnull=False).order_by()
+                .values('question_id', 'output_unit')
+                .annotate(count=models.Count('pk'), min=models.Min('output_value'),
+                          max=models.Max('output_value'), mean=models.Avg('output_value'))
+                .order_by('question_id', 'output_unit'))
+
+
 class TestAnswer(models.Model):
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='answers')
     question = models.ForeignKey(TestQuestion, on_delete=models.CASCADE)
     is_passed = models.BooleanField(default=False)
     technical_output = models.CharField(max_length=50, blank=True, null=True)
     remarks = models.TextField(blank=True)
+    # technical_output parsed on write, see inventory/outputs.py
+    output_value = models.FloatField(null=True, blank=True, editable=False)
+    output_unit = models.CharField(max_length=outputs.UNIT_MAX_LENGTH, blank=True, default='', editable=False)
+
+    objects = TestAnswerQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Range filters and min/max per question; outputs of different questions aren't comparable
+            models.Index(fields=['question', 'output_unit', 'output_value']),
+        ]
 
     def __str__(self):
         return f"{self.test} - {self.question} ({'Passed' if self.is_passed else 'Failed'})"
 
+    def save(self, *args, **kwargs):
+        self.output_value, self.output_unit = outputs.parse(self.technical_output)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'technical_output' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'output_value', 'output_unit'}
+        super().save(*args, **kwargs)
+
+class BatchYield(models.Model):
+    """Per-batch test rollup, maintained from Test writes by inventory/rollups.py"""
+    batch = models.OneToOneField(Batch, on_delete=models.CASCADE, primary_key=True, related_name='yield_rollup')
+    tests = models.PositiveIntegerField(default=0)
+    draft_tests = models.PositiveIntegerField(default=0)
+    pending_tests = models.PositiveIntegerField(default=0)
+    passed_tests = models.PositiveIntegerField(default=0)
+    failed_tests = models.PositiveIntegerField(default=0)
+    units_tested = models.PositiveIntegerField(default=0, help_text="Distinct barcodes with at least one test")
+    testers = models.PositiveIntegerField(default=0, help_text="Distinct users who tested in this batch")
+    tester_ids = models.JSONField(default=list)
+    first_test_at = models.DateTimeField(null=True, blank=True)
+    last_test_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Batch Yield"
+        verbose_name_plural = "Batch Yields"
+
+    def __str__(self):
+        return f"{self.batch}: {self.passed_tests} passed, {self.failed_tests} failed"
+
+    @property
+    def untested(self):
+        return max(self.batch.quantity - self.units_tested, 0)
+
+    @property
+    def pass_rate(self):
+        """Share of finished tests that passed, in percent"""
+        finished = self.passed_tests + self.failed_tests
+        return round(100 * self.passed_tests / finished, 1) if finished else None
+
+    @property
+    def progress(self):
+        """Share of the batch's units tested at least once, in percent"""
+        return min(round(100 * self.units_tested / self.batch.quantity), 100) if self.batch.quantity else 0
+
+
 class TechnicalOutputChoice(models.Model):
     value = models.CharField(max_length=50, unique=True, help_text="e.g., 200W, 1700W, 300A")
     is_active = models.BooleanField(default=True)
@@ -294,17 +443,51 @@ class ServiceCase(models.Model):
         return f"{self.case_id} - {self.barcode.sequence_number if self.barcode else 'No Barcode'}"
 
     def save(self, *args, **kwargs):
-        # Auto-generate case ID if not provided
+        # Auto-generate case ID if not provided. The sequence row is bumped in the
+        # same transaction as the insert, so IDs never collide or get reused.
         if not self.case_id:
-            # Get current year and count of cases this year
-            from django.utils import timezone
-            import datetime
-            current_year = datetime.datetime.now().year
-            year_count = ServiceCase.objects.filter(case_id__startswith=f'SVC-{current_year}-').count()
-            self.case_id = f'SVC-{current_year}-{year_count + 1:04d}'
+            with transaction.atomic():
+                current_year = timezone.localdate().year
+                self.case_id = f'SVC-{current_year}-{ServiceCaseSequence.next_value(current_year):04d}'
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
 
 
+class ServiceCaseSequence(models.Model):
+    """Per-year counter backing ServiceCase.case_id generation"""
+    year = models.PositiveIntegerField(primary_key=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Service Case Sequence"
+        verbose_name_plural = "Service Case Sequences"
+
+    def __str__(self):
+        return f"SVC-{self.year}: {self.last_value}"
+
+    @classmethod
+    def next_value(cls, year):
+        """
+        Atomically increment and return the counter for `year`.
+
+        Must be called inside a transaction: the UPDATE takes the row (or on
+        SQLite the database) write lock, which is held until the caller's
+        insert commits, so concurrent desks queue instead of colliding.
+        """
+        return cls.reserve(year, 1)
+
+    @classmethod
+    def reserve(cls, year, count):
+        """
+        Claim `count` consecutive values for `year` and return the last one,
+        e.g. for bulk-created cases. Same transaction rules as next_value().
+        """
+        cls.objects.get_or_create(year=year)
+        cls.objects.filter(year=year).update(last_value=models.F('last_value') + count)
+        return cls.objects.filter(year=year).values_list('last_value', flat=True).get()
+
+
 class SystemLog(models.Model):
     """System event logging for issue analysis and tracking"""
     LOG_LEVEL_CHOICES = [
@@ -350,7 +533,8 @@ class SystemLog(models.Model):
     details = models.JSONField(blank=True, null=True, help_text="Additional technical details as JSON")
 
     # Metadata
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True, help_text="When the event occurred")
+    # Set at log_event() time rather than insert time, since buffered entries are written later
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, db_index=True, help_text="When the event occurred")
     ip_address = models.GenericIPAddressField(null=True, blank=True, help_text="IP address of the user")
     user_agent = models.TextField(blank=True, help_text="Browser/user agent information")
 
@@ -375,6 +559,12 @@ class SystemLog(models.Model):
         """
         Utility method to create log entries
 
+        Entries are written asynchronously through inventory.log_buffer unless
+        the level is configured as synchronous (error/critical by default).
+        High-volume info events may be sampled; kept entries then record the
+        rate in details['sample_rate'] and dropped ones return None. A returned
+        entry may not be saved yet.
+
         Usage:
             SystemLog.log_event(
                 event_type='test_failed',
@@ -386,6 +576,14 @@ class SystemLog(models.Model):
                 request=request
             )
         """
+        from . import log_buffer
+
+        rate = log_buffer.sample_rate(event_type, level)
+        if log_buffer.is_sampled_out(rate):
+            return None
+        if rate < 1.0:
+            details = dict(details or {}, sample_rate=rate)
+
         log_entry = cls(
             event_type=event_type,
             title=title,
@@ -411,6 +609,9 @@ class SystemLog(models.Model):
             # Get user agent
             log_entry.user_agent = request.META.get('HTTP_USER_AGENT', '')[:500]  # Limit to 500 chars
 
-        log_entry.save()
+        if log_buffer.is_buffered(level):
+            log_buffer.get_writer().submit(log_entry)
+        else:
+            log_entry.save()
         return log_entry
 
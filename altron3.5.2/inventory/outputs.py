@@ -0,0 +1,71 @@
+"""
+Numeric technical outputs.
+
+TestAnswer.technical_output is free text such as "200W", "1700W", "230 V" or
+"1.5KVA", mostly taken from TechnicalOutputChoice. Every write also stores it
+parsed into TestAnswer.output_value (a float) and output_unit (upper-cased,
+"" for a bare number), so range filters and per-question statistics are
+indexed SQL:
+
+    TestAnswer.objects.filter(test__batch=batch).with_output('W', lt=1500)
+    TestAnswer.objects.filter(question__template=template).output_stats()
+
+Text that isn't a number followed by an optional unit leaves both columns
+empty. Model saves parse through TestAnswer.save(); bulk writers pass
+`**outputs.fields(text)` to the TestAnswer constructor. Rows written before
+the columns existed, or by raw SQL, are filled in by
+`manage.py backfill_output_values`.
+"""
+import re
+
+from django.apps import apps as django_apps
+from django.db import transaction
+
+UNIT_MAX_LENGTH = 10
+
+# "1700W", "230 V", "-5.5 dB", "1,700 W", "98.5%"; thousands separators only in groups of three
+_OUTPUT = re.compile(r'^\s*([-+]?(?:(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|\.\d+))\s*([^\s\d.,+-][^\s\d]*)?\s*$')
+
+
+def parse(text):
+    """(value, unit) for an output like "1700W", or (None, '') when it isn't numeric"""
+    if not text:
+        return None, ''
+    match = _OUTPUT.match(text)
+    if match is None:
+        return None, ''
+    unit = (match.group(2) or '').upper()
+    if len(unit) > UNIT_MAX_LENGTH:
+        return None, ''
+    return float(match.group(1).replace(',', '')), unit
+
+
+def fields(text):
+    """The parsed columns of `text` as TestAnswer keyword arguments"""
+    value, unit = parse(text)
+    return {'output_value': value, 'output_unit': unit}
+
+
+def backfill(answers=None, batch_size=5000, apps=django_apps):
+    """
+    Parse technical_output into output_value/output_unit for `answers`
+    (default: every answer with an output), one primary-key range at a time.
+    Outputs repeat a lot, so each range is updated with one UPDATE per
+    distinct output in it rather than one per row. Returns the number of
+    answers updated.
+    """
+    TestAnswer_ = apps.get_model('inventory', 'TestAnswer')
+    if answers is None:
+        answers = TestAnswer_.objects.all()
+    answers = answers.exclude(technical_output__isnull=True).exclude(technical_output='').order_by()
+
+    updated, start = 0, 0
+    while True:
+        bounds = list(answers.filter(pk__gt=start).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not bounds:
+            return updated
+        chunk = answers.filter(pk__gt=start, pk__lte=bounds[-1])
+        with transaction.atomic():
+            for text in chunk.values_list('technical_output', flat=True).distinct():
+                updated += chunk.filter(technical_output=text).update(**fields(text))
+        start = bounds[-1]
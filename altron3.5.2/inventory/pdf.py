@@ -0,0 +1,54 @@
+"""
+HTML-to-PDF rendering with WeasyPrint, loaded on first use.
+
+Importing WeasyPrint pulls in Pango, cffi and fontTools, which dominates a
+worker's start-up time, and most processes (management commands, tests,
+workers that only serve forms) never render a PDF. Views check for it and
+render through this module instead of importing it themselves:
+
+    if not pdf.available():
+        return HttpResponse("WeasyPrint is not installed...", status=500)
+    pdf_file = pdf.render(html_content, base_url=request.build_absolute_uri())
+
+WeasyPrint's own log level is left to the LOGGING setting.
+"""
+import logging
+import threading
+
+from . import perf
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_html = None
+_import_error = None
+
+
+def _load():
+    global _html, _import_error
+    if _html is None and _import_error is None:
+        with _lock:
+            if _html is None and _import_error is None:
+                try:
+                    from weasyprint import HTML
+                except (ImportError, OSError) as exc:
+                    _import_error = exc
+                    logger.error("WeasyPrint failed to import: %s", exc)
+                    logger.warning("PDF generation features will be disabled. GTK3 libraries may be missing.")
+                else:
+                    _html = HTML
+    return _html
+
+
+def available():
+    """Whether WeasyPrint can be imported (imports it on the first call)"""
+    return _load() is not None
+
+
+def render(html_content, base_url=None):
+    """PDF bytes for `html_content`; raises ImportError when WeasyPrint is unavailable"""
+    html = _load()
+    if html is None:
+        raise ImportError(f"WeasyPrint is unavailable: {_import_error}")
+    with perf.track('weasyprint'):
+        return html(string=html_content, base_url=base_url).write_pdf()
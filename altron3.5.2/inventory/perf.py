@@ -0,0 +1,104 @@
+"""
+Per-request performance counters.
+
+PerformanceMonitorMiddleware opens a RequestMetrics for every request; code
+that renders something expensive wraps it in `perf.track(name)` so its time is
+reported alongside wall time and database time:
+
+    with perf.track('weasyprint'):
+        pdf_file = HTML(string=html_content, base_url=base_url).write_pdf()
+
+Outside a monitored request `track()` is a no-op.
+"""
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('inventory_request_metrics', default=None)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalise SQL so queries differing only in literal values compare equal"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(values) - 1, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []  # (sql, seconds)
+        self.timers = {}   # name -> seconds
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook timing each query"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def wall_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @property
+    def db_ms(self):
+        return sum(duration for _, duration in self.queries) * 1000
+
+    def timer_ms(self):
+        return {f'{name}_ms': round(seconds * 1000, 1) for name, seconds in self.timers.items()}
+
+    def top_fingerprints(self, limit):
+        """Most expensive query shapes, with how often each ran"""
+        grouped = {}
+        for sql, duration in self.queries:
+            key = fingerprint(sql)
+            count, total = grouped.get(key, (0, 0.0))
+            grouped[key] = (count + 1, total + duration)
+        ranked = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [
+            {'sql': sql, 'count': count, 'total_ms': round(total * 1000, 1)}
+            for sql, (count, total) in ranked
+        ]
+
+
+def start():
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    return metrics, token
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def track(name):
+    """Add the time spent in the block to the current request's `name` timer"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timers[name] = metrics.timers.get(name, 0.0) + time.perf_counter() - start_time
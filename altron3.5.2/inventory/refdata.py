@@ -0,0 +1,141 @@
+"""
+Cached reference data.
+
+SKUs, spec templates, test templates and their questions, technical output
+choices and technicians are read on almost every form render but only change
+when an admin edits them. Lookups here are tagged with the models they read:
+
+    for question in refdata.template_questions(template_id): ...
+
+A post_save, post_delete or m2m_changed signal on any of those models bumps
+the model's generation in the shared cache (see inventory/cache.py), which
+invalidates every lookup tagged with it in every worker process. Between
+edits each process serves lookups from an in-process snapshot, so the only
+cost per call is one read of the generation counters.
+
+bulk_create() and QuerySet.update() send no signals; code that changes
+reference data that way must call invalidate() itself.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from . import cache
+from .models import SKU, BatchSpecTemplate, TechnicalOutputChoice, Technician, TestQuestion, TestTemplate
+
+REFERENCE_MODELS = (SKU, BatchSpecTemplate, TestTemplate, TestQuestion, TechnicalOutputChoice, Technician)
+
+TIMEOUT = 24 * 60 * 60
+
+# What a test form needs from a question, without a model instance
+Question = namedtuple('Question', ['id', 'question_text', 'outputs'])
+
+_snapshot = {}  # key -> (generations, value)
+
+
+def tag(model):
+    return f'ref:{model._meta.label_lower}'
+
+
+def lookup(key, models, compute):
+    """Value of `compute()`, cached until any of `models` changes"""
+    namespaces = tuple(tag(model) for model in models)
+    generations = cache.generations(namespaces)
+    entry = _snapshot.get(key)
+    if entry is not None and entry[0] == generations:
+        return entry[1]
+    value = cache.cached(namespaces, key, compute, timeout=TIMEOUT)
+    _snapshot[key] = (generations, value)
+    return value
+
+
+def invalidate(*models):
+    """Invalidate lookups tagged with `models` (all reference models by default)"""
+    namespaces = [tag(model) for model in models or REFERENCE_MODELS]
+    cache.invalidate(*namespaces)
+    # Bump again once the edit is visible to other connections, or a worker
+    # that read the old rows in the meantime would cache them as current.
+    transaction.on_commit(lambda: cache.invalidate(*namespaces))
+
+
+# Lookups
+
+def model_choices(model, empty_label=None):
+    """(pk, label) choices for a ModelChoiceField over all rows of `model`"""
+    choices = lookup(f'choices:{model._meta.label_lower}', [model],
+                     lambda: [(obj.pk, str(obj)) for obj in model.objects.all()])
+    return [('', empty_label)] + choices if empty_label is not None else list(choices)
+
+
+def all_objects(model):
+    """All rows of `model`, for filter dropdowns. Treat the instances as read-only."""
+    return lookup(f'objects:{model._meta.label_lower}', [model], lambda: list(model.objects.all()))
+
+
+def active_technicians():
+    return lookup('technicians:active', [Technician],
+                  lambda: list(Technician.objects.filter(is_active=True).order_by('name')))
+
+
+def _pk(value):
+    # Ids often come straight from request data; keep junk out of cache keys
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def spec_template_fields(template_id):
+    """fields_json of a BatchSpecTemplate, or None if it doesn't exist"""
+    template_id = _pk(template_id)
+    if template_id is None:
+        return None
+    return lookup(f'spec_fields:{template_id}', [BatchSpecTemplate],
+                  lambda: BatchSpecTemplate.objects.filter(pk=template_id).values_list('fields_json', flat=True).first())
+
+
+def output_choices():
+    """Values of the active technical output choices, in display order"""
+    return lookup('outputs:active', [TechnicalOutputChoice], lambda: list(
+        TechnicalOutputChoice.objects.filter(is_active=True).order_by('order', 'value').values_list('value', flat=True)
+    ))
+
+
+def template_questions(template_id):
+    """A template's questions with their active output values, or None if the template doesn't exist"""
+    template_id = _pk(template_id)
+    if template_id is None:
+        return None
+
+    def compute():
+        if not TestTemplate.objects.filter(pk=template_id).exists():
+            return None
+        active = set(output_choices())
+        questions = TestQuestion.objects.filter(template_id=template_id).order_by('id').prefetch_related('technical_outputs')
+        return [
+            Question(question.id, question.question_text, tuple(
+                output.value for output in sorted(question.technical_outputs.all(), key=lambda o: (o.order, o.value))
+                if output.value in active
+            ))
+            for question in questions
+        ]
+    return lookup(f'questions:{template_id}', [TestTemplate, TestQuestion, TechnicalOutputChoice], compute)
+
+
+# Signals
+
+def _model_changed(sender, **kwargs):
+    invalidate(sender)
+
+
+def _question_outputs_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate(TestQuestion)
+
+
+for _model in REFERENCE_MODELS:
+    post_save.connect(_model_changed, sender=_model, dispatch_uid=f'refdata_save_{_model.__name__}')
+    post_delete.connect(_model_changed, sender=_model, dispatch_uid=f'refdata_delete_{_model.__name__}')
+m2m_changed.connect(_question_outputs_changed, sender=TestQuestion.technical_outputs.through,
+                    dispatch_uid='refdata_question_outputs')
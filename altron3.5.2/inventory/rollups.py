@@ -0,0 +1,164 @@
+"""
+Per-batch test rollups.
+
+BatchYield holds, for every batch, test counts by status, how many of its
+units have been tested, the distinct testers and the first and last test
+time, so batch_list can show and sort production progress without grouping
+over Test:
+
+    batches = Batch.objects.select_related('yield_rollup')
+
+The row is created with the batch and kept current from Test signals inside
+the writing transaction. A new test or a status change is an in-place counter
+update; anything rarer (a test moved to another batch, unit or user, a
+deleted test, a save of an instance that wasn't loaded from the database)
+recomputes the batch's row from its tests.
+
+bulk_create(), bulk_update() and QuerySet.update() send no signals; code that
+writes tests that way must call refresh() or rebuild() for the batches it
+touched.
+"""
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.db.models.signals import post_delete, post_save
+
+from .models import SKU, Batch, BatchYield, Test
+
+# Test.overall_status -> BatchYield counter
+STATUS_COLUMNS = {
+    'draft': 'draft_tests',
+    'pending': 'pending_tests',
+    'passed': 'passed_tests',
+    'failed': 'failed_tests',
+}
+
+# Changing any of these on an existing test means recomputing the rollup
+STRUCTURAL_FIELDS = ('batch_id', 'barcode_id', 'user_id', 'test_date')
+
+
+def _summary():
+    summary = {
+        'tests': Count('pk'),
+        'units_tested': Count('barcode', distinct=True),
+        'first_test_at': Min('test_date'),
+        'last_test_at': Max('test_date'),
+    }
+    for status, column in STATUS_COLUMNS.items():
+        summary[column] = Count('pk', filter=Q(overall_status=status))
+    return summary
+
+
+def refresh(*batch_ids):
+    """Recompute the rollup rows of the given batches from their tests"""
+    for batch_id in {batch_id for batch_id in batch_ids if batch_id is not None}:
+        with transaction.atomic():
+            if not Batch.objects.filter(pk=batch_id).exists():
+                continue
+            tests = Test.objects.filter(batch_id=batch_id).order_by()
+            values = tests.aggregate(**_summary())
+            tester_ids = sorted(tests.values_list('user_id', flat=True).distinct())
+            BatchYield.objects.update_or_create(
+                batch_id=batch_id, defaults=dict(values, tester_ids=tester_ids, testers=len(tester_ids)),
+            )
+
+
+def rebuild(batches=None, apps=django_apps):
+    """
+    Recompute the rollups of every batch in `batches` (default: all) with one
+    grouped query per table. Returns the number of rows written. Migrations
+    pass their historical `apps`.
+    """
+    Batch_ = apps.get_model('inventory', 'Batch')
+    Test_ = apps.get_model('inventory', 'Test')
+    BatchYield_ = apps.get_model('inventory', 'BatchYield')
+    if batches is None:
+        batches = Batch_.objects.all()
+
+    batch_ids = list(batches.values_list('pk', flat=True))
+    tests = Test_.objects.filter(batch_id__in=batch_ids).order_by()
+    stats = {row.pop('batch_id'): row for row in tests.values('batch_id').annotate(**_summary())}
+    testers = {}
+    for batch_id, user_id in tests.values_list('batch_id', 'user_id').distinct():
+        testers.setdefault(batch_id, []).append(user_id)
+
+    rows = []
+    for batch_id in batch_ids:
+        values = stats.get(batch_id, {})
+        tester_ids = sorted(testers.get(batch_id, []))
+        rows.append(BatchYield_(batch_id=batch_id, tester_ids=tester_ids, testers=len(tester_ids), **values))
+    fields = ['tests', 'units_tested', 'first_test_at', 'last_test_at', 'testers', 'tester_ids',
+              *STATUS_COLUMNS.values()]
+    with transaction.atomic():
+        BatchYield_.objects.bulk_create(rows, batch_size=500, update_conflicts=True,
+                                        unique_fields=['batch'], update_fields=fields)
+    return len(rows)
+
+
+def _record_new(test):
+    with transaction.atomic():
+        rollup = BatchYield.objects.select_for_update().filter(batch_id=test.batch_id).first()
+        if rollup is None:
+            refresh(test.batch_id)
+            return
+        when = Value(test.test_date)
+        updates = {
+            'tests': F('tests') + 1,
+            'first_test_at': Least(Coalesce(F('first_test_at'), when), when),
+            'last_test_at': Greatest(Coalesce(F('last_test_at'), when), when),
+        }
+        column = STATUS_COLUMNS.get(test.overall_status)
+        if column:
+            updates[column] = F(column) + 1
+        if test.barcode_id is not None and not (
+            Test.objects.filter(batch_id=test.batch_id, barcode_id=test.barcode_id).exclude(pk=test.pk).exists()
+        ):
+            updates['units_tested'] = F('units_tested') + 1
+        if test.user_id not in rollup.tester_ids:
+            updates['tester_ids'] = sorted(rollup.tester_ids + [test.user_id])
+            updates['testers'] = len(updates['tester_ids'])
+        BatchYield.objects.filter(pk=rollup.pk).update(**updates)
+
+
+def _record_status_change(test, old_status):
+    updates = {}
+    if STATUS_COLUMNS.get(old_status):
+        updates[STATUS_COLUMNS[old_status]] = F(STATUS_COLUMNS[old_status]) - 1
+    if STATUS_COLUMNS.get(test.overall_status):
+        updates[STATUS_COLUMNS[test.overall_status]] = F(STATUS_COLUMNS[test.overall_status]) + 1
+    if updates and not BatchYield.objects.filter(batch_id=test.batch_id).update(**updates):
+        refresh(test.batch_id)
+
+
+# Signals
+
+def _batch_saved(sender, instance, created, **kwargs):
+    if created:
+        BatchYield.objects.get_or_create(batch=instance)
+
+
+def _test_saved(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_values', None)
+    if created:
+        _record_new(instance)
+    elif loaded is None or any(
+        field not in loaded or loaded[field] != getattr(instance, field) for field in STRUCTURAL_FIELDS
+    ):
+        refresh(instance.batch_id, (loaded or {}).get('batch_id'))
+    elif loaded.get('overall_status') != instance.overall_status:
+        _record_status_change(instance, loaded.get('overall_status'))
+    # A later save of this instance compares against what is stored now
+    instance._loaded_values = {field: getattr(instance, field) for field in STRUCTURAL_FIELDS + ('overall_status',)}
+
+
+def _test_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting a SKU or batch removes the rollup row with the batch
+    if isinstance(origin, (SKU, Batch)) or getattr(origin, 'model', None) in (SKU, Batch):
+        return
+    refresh(instance.batch_id)
+
+
+post_save.connect(_batch_saved, sender=Batch, dispatch_uid='rollups_batch_save')
+post_save.connect(_test_saved, sender=Test, dispatch_uid='rollups_test_save')
+post_delete.connect(_test_deleted, sender=Test, dispatch_uid='rollups_test_delete')
@@ -0,0 +1,154 @@
+"""
+Send heavy read-only reporting queries to a replica database.
+
+Views marked with @reporting_view (and admin changelists using
+ReportingChangelistMixin) read from the REPORTING_REPLICA alias. Everything
+else, and every write, stays on `default`:
+
+    @login_required
+    @reporting_view
+    def test_results(request): ...
+
+The replica is either a periodically refreshed SQLite snapshot (see
+`manage.py refresh_reporting_snapshot`) or a PostgreSQL streaming replica.
+Its lag is checked at most every CHECK_INTERVAL seconds. While it is further
+behind than MAX_LAG_SECONDS, or unreachable, reporting reads fall back to the
+primary.
+"""
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ALIAS': 'replica',
+    'MAX_LAG_SECONDS': 600,
+    'CHECK_INTERVAL': 30,
+}
+
+_reporting = ContextVar('inventory_reporting', default=False)
+
+_health_lock = threading.Lock()
+_health = {}  # alias -> (checked_at, usable)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'REPORTING_REPLICA', {}))
+    return config
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary; raises DatabaseError/OSError if it can't be determined"""
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE WHEN NOT pg_is_in_recovery() "
+                "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )
+            return float(cursor.fetchone()[0] or 0)
+    if connection.vendor == 'sqlite':
+        # Snapshots are written to a temp file and renamed into place, so the
+        # file's mtime is when the snapshot was taken.
+        return time.time() - os.path.getmtime(connection.settings_dict['NAME'])
+    return 0.0
+
+
+def replica_usable(alias=None):
+    """Whether reporting reads may go to the replica right now (cached for CHECK_INTERVAL)"""
+    config = get_config()
+    alias = alias or config['ALIAS']
+    if alias not in settings.DATABASES:
+        return False
+
+    now = time.monotonic()
+    checked_at, usable = _health.get(alias, (None, False))
+    if checked_at is not None and now - checked_at < config['CHECK_INTERVAL']:
+        return usable
+
+    with _health_lock:
+        checked_at, usable = _health.get(alias, (None, False))
+        if checked_at is not None and now - checked_at < config['CHECK_INTERVAL']:
+            return usable
+        try:
+            lag = replica_lag(alias)
+        except (DatabaseError, OSError) as exc:
+            logger.warning("Reporting replica %r unavailable, using the primary: %s", alias, exc)
+            usable = False
+        else:
+            usable = lag <= config['MAX_LAG_SECONDS']
+            if not usable:
+                logger.warning("Reporting replica %r is %.0fs behind (limit %ss), using the primary",
+                               alias, lag, config['MAX_LAG_SECONDS'])
+        _health[alias] = (now, usable)
+        return usable
+
+
+def reset_health():
+    """Forget this process's cached replica health (each worker keeps its own)"""
+    _health.clear()
+
+
+@contextmanager
+def reporting():
+    """Route reads in the block to the reporting replica when it is usable"""
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+def reporting_view(view):
+    """Mark a read-only view as a reporting view"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with reporting():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReportingChangelistMixin:
+    """ModelAdmin mixin sending changelist reads to the reporting replica"""
+
+    def changelist_view(self, request, extra_context=None):
+        # Bulk actions and list_editable saves are writes; those go through
+        # db_for_write regardless, but keep their reads on the primary too.
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with reporting():
+            response = super().changelist_view(request, extra_context)
+            # Render inside the block; the template evaluates lazy querysets
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+
+
+class ReportingRouter:
+    def db_for_read(self, model, **hints):
+        if _reporting.get() and replica_usable():
+            return get_config()['ALIAS']
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary; never migrate it directly
+        if db == get_config()['ALIAS']:
+            return False
+        return None
@@ -0,0 +1,94 @@
+"""
+Frozen answer snapshots on finalized tests.
+
+Once a test has passed or failed its answers don't change, so test_detail
+and print_test_report render them from Test.answer_snapshot, a packed JSON
+array stored on the test row, instead of joining TestAnswer to TestQuestion:
+
+    [[question_id, question_text, is_passed, technical_output, remarks], ...]
+
+The snapshot also keeps the question text as it was when the test was
+first finalized, whatever later template edits or corrections do.
+TestAnswer stays the queryable source for filtering and reporting.
+
+Write paths call sync(test) after storing a test's answers; bulk writers
+(ingest, importer, synthetic data) build the snapshot with pack() before
+inserting. A test that goes back to draft or pending loses its snapshot and
+gets a new one when it is finalized again.
+"""
+from collections import namedtuple
+
+from django.apps import apps as django_apps
+from django.db import transaction
+
+FINAL_STATUSES = ('passed', 'failed')
+
+# Attribute names match TestAnswer, so templates render either
+Answer = namedtuple('Answer', ['question_id', 'question_text', 'is_passed', 'technical_output', 'remarks'])
+
+
+def pack(answers):
+    """Snapshot value from (question_id, question_text, is_passed, technical_output, remarks) tuples"""
+    return [list(answer) for answer in answers]
+
+
+def _answer_rows(TestAnswer_, test_ids):
+    return (TestAnswer_.objects.filter(test_id__in=test_ids).order_by('test_id', 'pk')
+            .values_list('test_id', 'question_id', 'question__question_text', 'is_passed', 'technical_output', 'remarks'))
+
+
+def answers(test):
+    """The test's answers as Answer tuples: from the snapshot when there is one, otherwise one query"""
+    if test.answer_snapshot is not None:
+        return [Answer(*entry) for entry in test.answer_snapshot]
+    TestAnswer = django_apps.get_model('inventory', 'TestAnswer')
+    return [Answer(*row[1:]) for row in _answer_rows(TestAnswer, [test.pk])]
+
+
+def sync(test):
+    """
+    Freeze the answers of a finalized test, or drop the snapshot of one that
+    isn't final. Question texts are frozen when the test first becomes final:
+    later syncs (a status change between passed and failed, a corrected
+    answer) keep the texts already in the snapshot and only refresh the
+    answers' values.
+    """
+    Test = django_apps.get_model('inventory', 'Test')
+    if test.overall_status in FINAL_STATUSES:
+        TestAnswer = django_apps.get_model('inventory', 'TestAnswer')
+        frozen = Test.objects.filter(pk=test.pk).values_list('answer_snapshot', flat=True).first()
+        texts = {entry[0]: entry[1] for entry in frozen or ()}
+        test.answer_snapshot = pack(
+            (question_id, texts.get(question_id, text), *values)
+            for _, question_id, text, *values in _answer_rows(TestAnswer, [test.pk])
+        )
+    elif test.answer_snapshot is None:
+        return
+    else:
+        test.answer_snapshot = None
+    Test.objects.filter(pk=test.pk).update(answer_snapshot=test.answer_snapshot)
+
+
+def rebuild(tests=None, batch_size=2000, apps=django_apps):
+    """
+    (Re)write the snapshots of every finalized test in `tests` (default: all),
+    with one answer query per chunk. Returns the number of tests written.
+    Migrations pass their historical `apps`.
+    """
+    Test_ = apps.get_model('inventory', 'Test')
+    TestAnswer_ = apps.get_model('inventory', 'TestAnswer')
+    if tests is None:
+        tests = Test_.objects.all()
+
+    ids = list(tests.filter(overall_status__in=FINAL_STATUSES).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        snapshots = {test_id: [] for test_id in chunk}
+        for row in _answer_rows(TestAnswer_, chunk):
+            snapshots[row[0]].append(list(row[1:]))
+        with transaction.atomic():
+            Test_.objects.bulk_update(
+                [Test_(pk=test_id, answer_snapshot=snapshot) for test_id, snapshot in snapshots.items()],
+                ['answer_snapshot'], batch_size=500,
+            )
+    return len(ids)
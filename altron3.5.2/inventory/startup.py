@@ -0,0 +1,79 @@
+"""
+Worker start-up import budget.
+
+A fresh interpreter sets up Django and imports the URLconf (which pulls in
+every view module), exactly as a gunicorn worker or `manage.py` does, under
+`python -X importtime`. The result is checked against settings.IMPORT_BUDGET:
+
+    IMPORT_BUDGET = {
+        'MILLISECONDS': 1500,  # median total import time
+        'LAZY_MODULES': ['weasyprint', 'barcode', 'PIL', 'openpyxl', 'numpy'],  # must not load at start-up
+    }
+
+Run it with `manage.py check_import_time`.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+
+DEFAULTS = {
+    'MILLISECONDS': 1500,
+    'LAZY_MODULES': ['weasyprint', 'barcode', 'PIL', 'openpyxl', 'numpy'],
+}
+
+_PROBE = (
+    "import json, sys, django; django.setup(); "
+    "import importlib; importlib.import_module({urlconf!r}); "
+    "print(json.dumps(sorted(m for m in {lazy!r} if m in sys.modules)))"
+)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'IMPORT_BUDGET', {}))
+    return config
+
+
+def parse_importtime(stderr):
+    """{top-level module: cumulative microseconds} from `-X importtime` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):  # nested imports are indented by two spaces per level
+            modules[name.strip()] = modules.get(name.strip(), 0) + int(cumulative)
+    return modules
+
+
+def probe():
+    """One cold start: (top-level import times in µs, lazy modules that got imported)"""
+    config = get_config()
+    code = _PROBE.format(urlconf=settings.ROOT_URLCONF, lazy=list(config['LAZY_MODULES']))
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'ups_manufacturing.settings'))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=settings.BASE_DIR, env=env, check=True)
+    return parse_importtime(result.stderr), json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(runs=5):
+    """Median start-up import time over `runs` cold starts, after one untimed run to warm bytecode caches"""
+    probe()
+    totals, loaded, slowest = [], set(), {}
+    for _ in range(runs):
+        modules, lazy_loaded = probe()
+        totals.append(sum(modules.values()) / 1000)
+        loaded.update(lazy_loaded)
+        for name, micros in modules.items():
+            slowest[name] = max(slowest.get(name, 0), micros)
+    return {
+        'median_ms': round(statistics.median(totals), 1),
+        'budget_ms': get_config()['MILLISECONDS'],
+        'lazy_modules_loaded': sorted(loaded),
+        'slowest': sorted(((name, round(micros / 1000, 1)) for name, micros in slowest.items()),
+                          key=lambda item: -item[1]),
+    }
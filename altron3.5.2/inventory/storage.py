@@ -0,0 +1,62 @@
+"""
+Static files storage: manifest-hashed names plus precompressed variants.
+
+collectstatic writes every asset under a content-hashed name (app.3f2a9c1d.css)
+so it can be cached forever, and next to each text asset an `.gz` and, when
+the Brotli package is installed, a `.br` copy compressed at maximum level.
+StaticAssetMiddleware serves whichever variant the browser accepts.
+"""
+import gzip
+import logging
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+# Smaller files don't gain enough to be worth a second request path
+MIN_SIZE = 512
+
+
+def compress_file(path):
+    """Write `path`.gz and `path`.br where they come out smaller; returns the suffixes written"""
+    with open(path, 'rb') as source:
+        data = source.read()
+    if len(data) < MIN_SIZE:
+        return []
+    variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+    written = []
+    for suffix, compress in variants:
+        compressed = compress()
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as target:
+                target.write(compressed)
+            written.append(suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        if brotli is None:
+            logger.warning("Brotli is not installed; writing .gz static variants only")
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                compress_file(self.path(name))
+
+    def stored_name(self, name):
+        # Before the first collectstatic (development, tests) there is no
+        # manifest; serve the plain name rather than failing every page.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
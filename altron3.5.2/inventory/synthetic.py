@@ -0,0 +1,324 @@
+"""
+Production-shaped synthetic data for scaling work and benchmarks.
+
+`generate()` creates SKUs, templates with questions, batches (and their
+barcodes), tests with answers, service cases and system logs with bulk
+inserts. Everything it creates is keyed off SKU codes starting with
+SYNTHETIC_PREFIX, so `clear()` can remove it again without touching real data.
+
+Distributions roughly follow the floor: batch sizes vary around the
+requested mean, most units pass, a few questions account for most
+failures, failed units are far more likely to come back to the service desk,
+and activity is spread over the last `days` days.
+"""
+import random
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import analytics, lifecycle, outputs, refdata, rollups, snapshots
+from .db import bulk_insert
+from .models import (
+    SKU, Barcode, Batch, BatchSpecTemplate, CustomUser, ServiceCase, ServiceCaseSequence, SystemLog,
+    TechnicalOutputChoice, Technician, Test, TestAnswer, TestQuestion, TestTemplate,
+)
+
+SYNTHETIC_PREFIX = 'SYN'
+
+ADMIN_USERNAME = 'synthetic_admin'
+
+# Per-question pass probability; WEAK_QUESTIONS of each template use the lower one
+QUESTION_PASS_RATE = 0.995
+WEAK_QUESTION_PASS_RATE = 0.93
+WEAK_QUESTIONS = 2
+
+DRAFT_RATE = 0.02
+RETEST_RATE = 0.6  # share of failed units tested again
+
+# Chance a unit gets a service case, by its latest test result
+SERVICE_RATE = {'failed': 0.3, 'passed': 0.02}
+CASE_STATUS_WEIGHTS = {'completed': 60, 'open': 15, 'in_progress': 15, 'on_hold': 8, 'cancelled': 2}
+ISSUES = [
+    'No output', 'Battery not charging', 'Fan noise', 'Overload trip', 'Display blank',
+    'Beeping continuously', 'Low backup time', 'Input fuse blown',
+]
+ACTIONS = [
+    'Replaced control board', 'Replaced battery', 'Cleaned and re-tested', 'Replaced fan',
+    'Firmware reflashed', 'Replaced input fuse', 'Re-soldered output relay',
+]
+
+SPEC_TEMPLATES = {
+    'LI-UPS': ['device_name', 'battery', 'capacity', 'input_range', 'output_range'],
+    'SOLAR PCU': ['device_name', 'battery', 'capacity', 'mppt_cap', 'voc_max', 'spv_max'],
+    'BATTERY CHARGER': ['device_name', 'battery', 'current_max'],
+}
+SPEC_VALUES = {
+    'device_name': ['UPS 1KVA', 'UPS 2KVA', 'PCU 3KVA', 'CHARGER 48V'],
+    'battery': ['12V 150AH', '24V 150AH', '48V 100AH'],
+    'capacity': ['1KVA', '2KVA', '3KVA', '5KVA'],
+    'input_range': ['140-280V', '160-260V'],
+    'output_range': ['220V +/- 2%', '230V +/- 5%'],
+    'mppt_cap': ['40A', '60A'],
+    'voc_max': ['120V', '180V'],
+    'spv_max': ['1200W', '2400W'],
+    'current_max': ['20A', '30A'],
+}
+QUESTION_TEXTS = [
+    'Visual inspection', 'Input voltage range', 'Output voltage on mains', 'Output voltage on battery',
+    'Changeover time', 'Battery charging current', 'Overload protection', 'Short circuit protection',
+    'Low battery cut-off', 'Fan operation', 'Display and indicators', 'Buzzer alarms',
+    'No-load current', 'Efficiency at full load', 'Soak test', 'Earthing continuity',
+    'Insulation resistance', 'Firmware version', 'Label and serial check', 'Packing check',
+]
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _random_time(rng, start, end):
+    return start + timedelta(seconds=rng.uniform(0, max((end - start).total_seconds(), 0)))
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _setup_reference_data(rng, sku_count, questions_per_template):
+    outputs = []
+    for i, watts in enumerate(range(100, 3100, 100)):
+        output, _ = TechnicalOutputChoice.objects.get_or_create(value=f'{watts}W', defaults={'order': i})
+        outputs.append(output)
+
+    for i in range(10):
+        Technician.objects.get_or_create(name=f'Synthetic Technician {i + 1}')
+
+    spec_templates = [
+        BatchSpecTemplate.objects.get_or_create(name=f'{SYNTHETIC_PREFIX} {name}', defaults={'fields_json': fields})[0]
+        for name, fields in SPEC_TEMPLATES.items()
+    ]
+
+    skus = []
+    for s in range(sku_count):
+        code = f'{SYNTHETIC_PREFIX}{s + 1:03d}'
+        template, created = TestTemplate.objects.get_or_create(name=f'{SYNTHETIC_PREFIX} Template {code}')
+        if created:
+            questions = TestQuestion.objects.bulk_create([
+                TestQuestion(template=template, question_text=QUESTION_TEXTS[q % len(QUESTION_TEXTS)])
+                for q in range(questions_per_template)
+            ])
+            refdata.invalidate(TestQuestion)  # bulk_create sends no post_save
+            # Measurement questions offer a handful of adjacent output choices
+            for question in questions[1:questions_per_template // 3 + 1]:
+                start = rng.randrange(len(outputs) - 5)
+                question.technical_outputs.set(outputs[start:start + 5])
+        sku, _ = SKU.objects.get_or_create(
+            code=code, defaults={'description': f'Synthetic SKU {s + 1}', 'default_test_template': template},
+        )
+        skus.append((sku, template, rng.choice(spec_templates)))
+    return skus
+
+
+def _users(tester_count):
+    def user(username, role, **extra):
+        obj, created = CustomUser.objects.get_or_create(username=username, defaults={'role': role, **extra})
+        if created:
+            obj.set_unusable_password()
+            obj.save(update_fields=['password'])
+        return obj
+
+    admin = user(ADMIN_USERNAME, 'admin', is_staff=True, is_superuser=True)
+    testers = [user(f'synthetic_tester{i + 1}', 'tester') for i in range(tester_count)]
+    service = user('synthetic_service', 'service')
+    return admin, testers, service
+
+
+def _answers_for(rng, test, questions, weak_ids, partial=False):
+    answers = []
+    for question in questions:
+        if partial and rng.random() < 0.5:
+            continue
+        rate = WEAK_QUESTION_PASS_RATE if question.id in weak_ids else QUESTION_PASS_RATE
+        choices = question.output_values
+        output = rng.choice(choices) if choices else ''
+        answers.append(TestAnswer(
+            test=test, question=question, is_passed=rng.random() < rate, technical_output=output,
+            remarks='' if rng.random() < 0.9 else 'Checked twice', **outputs.fields(output),
+        ))
+    return answers
+
+
+def _generate_batch(rng, batch, template_questions, weak_ids, testers, days_end, log_events):
+    """Tests, answers and test logs for one batch; returns the latest test per barcode"""
+    barcodes = list(Barcode.objects.filter(batch=batch).order_by('sequence_number'))
+    batch_start = _start_of_day(batch.batch_date)
+
+    tests, dates, answers_by_test, latest = [], [], [], {}
+    for barcode in barcodes:
+        tester = rng.choice(testers)
+        when = _random_time(rng, batch_start, days_end)
+        attempts = 1
+        while True:
+            draft = rng.random() < DRAFT_RATE
+            test = Test(sku_id=batch.sku_id, batch=batch, barcode=barcode, user=tester,
+                        template_used_id=template_questions[0].template_id)
+            answers = _answers_for(rng, test, template_questions, weak_ids, partial=draft)
+            if draft:
+                test.overall_status = 'draft'
+            else:
+                test.overall_status = 'passed' if all(a.is_passed for a in answers) else 'failed'
+                test.answer_snapshot = snapshots.pack(
+                    (a.question.id, a.question.question_text, a.is_passed, a.technical_output, a.remarks)
+                    for a in answers
+                )
+            tests.append(test)
+            dates.append(when)
+            answers_by_test.append(answers)
+            latest[barcode.id] = test
+            if test.overall_status != 'failed' or attempts > 1 or rng.random() >= RETEST_RATE:
+                break
+            attempts += 1
+            when = _random_time(rng, when, min(when + timedelta(days=3), days_end))
+
+    Test.objects.bulk_create(tests, batch_size=500)
+    # test_date is auto_now_add, so the spread-out dates are applied afterwards
+    for test, when in zip(tests, dates):
+        test.test_date = test.updated_at = when
+    Test.objects.bulk_update(tests, ['test_date', 'updated_at'], batch_size=500)
+
+    answers = []
+    for test, test_answers in zip(tests, answers_by_test):
+        for answer in test_answers:
+            answer.test = test
+            answers.append(answer)
+    bulk_insert(TestAnswer, answers, batch_size=2000)
+
+    if log_events:
+        bulk_insert(SystemLog, [
+            SystemLog(
+                event_type='test_passed' if test.overall_status == 'passed' else 'test_failed',
+                level='info' if test.overall_status == 'passed' else 'warning',
+                title=f'Test {test.overall_status} for {test.barcode.sequence_number}',
+                user=test.user, barcode_id=test.barcode_id, test=test, batch=batch, timestamp=test.test_date,
+            )
+            for test in tests if test.overall_status in ('passed', 'failed')
+        ], batch_size=1000)
+    return list(latest.values()), len(tests), len(answers)
+
+
+def _generate_service_cases(rng, latest_tests, service_user, technicians, days_end, log_events):
+    candidates = [
+        test for test in latest_tests
+        if rng.random() < SERVICE_RATE.get(test.overall_status, 0)
+    ]
+    if not candidates:
+        return 0
+
+    cases, dates = [], []
+    for test in candidates:
+        service_date = _random_time(rng, test.test_date, days_end + timedelta(seconds=1))
+        cases.append(ServiceCase(
+            test=test, barcode_id=test.barcode_id, service_date=service_date.date(),
+            technician=rng.choice(technicians), issue_description=rng.choice(ISSUES),
+            actions_taken=rng.choice(ACTIONS), status=_weighted(rng, CASE_STATUS_WEIGHTS),
+            created_by=service_user,
+        ))
+        dates.append(service_date)
+
+    # Claim a block of IDs from the live sequence so later cases don't collide
+    year = timezone.localdate().year
+    with transaction.atomic():
+        last = ServiceCaseSequence.reserve(year, len(cases))
+        for n, case in enumerate(cases, start=last - len(cases) + 1):
+            case.case_id = f'SVC-{year}-{n:04d}'
+        ServiceCase.objects.bulk_create(cases, batch_size=500)
+    for case, when in zip(cases, dates):
+        case.created_at = case.updated_at = when
+    ServiceCase.objects.bulk_update(cases, ['created_at', 'updated_at'], batch_size=500)
+
+    if log_events:
+        bulk_insert(SystemLog, [
+            SystemLog(
+                event_type='service_created', level='info', title=f'Service case {case.case_id} created',
+                user=service_user, barcode_id=case.barcode_id, test=case.test, service_case=case,
+                timestamp=case.created_at,
+            )
+            for case in cases
+        ], batch_size=1000)
+    return len(cases)
+
+
+def generate(skus=5, batches_per_sku=4, barcodes_per_batch=250, questions_per_template=15, testers=8,
+             days=180, seed=None, log_events=True, progress=None):
+    """
+    Generate a synthetic dataset and return counts of what was created.
+
+    `progress`, if given, is called with a message after each batch.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    start = now - timedelta(days=days)
+
+    admin, tester_users, service_user = _users(testers)
+    sku_rows = _setup_reference_data(rng, skus, questions_per_template)
+    technicians = [user.username for user in tester_users[:3]] + [service_user.username]
+
+    counts = {'skus': len(sku_rows), 'batches': 0, 'barcodes': 0, 'tests': 0, 'answers': 0, 'service_cases': 0}
+    for sku, template, spec_template in sku_rows:
+        questions = list(TestQuestion.objects.filter(template=template).prefetch_related('technical_outputs'))
+        for question in questions:
+            question.output_values = [output.value for output in question.technical_outputs.all()]
+        weak_ids = {question.id for question in rng.sample(questions, min(WEAK_QUESTIONS, len(questions)))}
+
+        for _ in range(batches_per_sku):
+            batch_date = _random_time(rng, start, now - timedelta(days=1)).date()
+            specs = {field: rng.choice(SPEC_VALUES[field]) for field in spec_template.fields_json}
+            with transaction.atomic():
+                batch = Batch.objects.create(
+                    sku=sku, batch_date=batch_date, spec_template=spec_template,
+                    quantity=max(10, int(rng.gauss(barcodes_per_batch, barcodes_per_batch * 0.3))), **specs,
+                )
+                latest, test_count, answer_count = _generate_batch(
+                    rng, batch, questions, weak_ids, tester_users, now, log_events,
+                )
+            if log_events:
+                SystemLog.objects.create(
+                    event_type='batch_created', title=f'Batch {batch.prefix} Created', user=admin, batch=batch,
+                    timestamp=_start_of_day(batch_date),
+                )
+            counts['service_cases'] += _generate_service_cases(
+                rng, latest, service_user, technicians, now, log_events,
+            )
+            # Tests and cases were bulk-created, which bypasses the lifecycle and rollup signals
+            lifecycle.rebuild(Barcode.objects.filter(batch=batch))
+            rollups.refresh(batch.id)
+            counts['batches'] += 1
+            counts['barcodes'] += batch.quantity
+            counts['tests'] += test_count
+            counts['answers'] += answer_count
+            if progress:
+                progress(f'Batch {counts["batches"]}/{len(sku_rows) * batches_per_sku}: '
+                         f'{batch.quantity} barcodes, {test_count} tests')
+    analytics.invalidate()  # the tests were bulk-created
+    return counts
+
+
+def clear():
+    """Delete everything generate() created; returns Django's deletion summary"""
+    with transaction.atomic():
+        deleted = {}
+        # ServiceCase/SystemLog references are SET_NULL, so remove them explicitly
+        for queryset in (
+            SystemLog.objects.filter(batch__sku__code__startswith=SYNTHETIC_PREFIX),
+            SystemLog.objects.filter(user__username__startswith='synthetic_'),
+            ServiceCase.objects.filter(barcode__sku__code__startswith=SYNTHETIC_PREFIX),
+            SKU.objects.filter(code__startswith=SYNTHETIC_PREFIX),
+            TestTemplate.objects.filter(name__startswith=f'{SYNTHETIC_PREFIX} '),
+            BatchSpecTemplate.objects.filter(name__startswith=f'{SYNTHETIC_PREFIX} '),
+            Technician.objects.filter(name__startswith='Synthetic Technician'),
+            CustomUser.objects.filter(username__startswith='synthetic_'),
+        ):
+            for label, count in queryset.delete()[1].items():
+                deleted[label] = deleted.get(label, 0) + count
+    return deleted
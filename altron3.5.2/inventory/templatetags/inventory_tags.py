@@ -41,4 +41,11 @@ def split(value, arg):
 def dict_get(d, key):
     """Retrieves a value from a dictionary using a key."""
     # We use d.get(key) which is a safe dictionary lookup
-    return d.get(key, '')
\ No newline at end of file
+    return d.get(key, '')
+@register.filter
+def sort_toggle(current, key):
+    """
+    The ?sort= value for a column header: ascending first, then descending.
+    Usage: {% querystring sort=sort|sort_toggle:'passed' %}
+    """
+    return f'-{key}' if current == key else key
@@ -1,3 +1,1406 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib import admin
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    analytics, cache, db, importer, ingest, lifecycle, loadsim, log_archive, log_buffer, outputs, refdata, rollups, routers,
+    snapshots, startup, synthetic, timeline,
+    urls as inventory_urls,
+)
+from .cache_backends import SQLiteCache
+from .middleware import CompressionMiddleware, PerformanceMonitorMiddleware, brotli
+from .paginators import EstimatedCountPaginator
+from .storage import compress_file
+from .models import (
+    SKU, Barcode, Batch, BatchSpecTemplate, BatchYield, CustomUser, ServiceCase, ServiceCaseSequence, SystemLog,
+    TechnicalOutputChoice, Technician, Test, TestAnswer, TestQuestion, TestStation, TestTemplate,
+)
+
+# Dataset shape for the query-budget tests. Large enough that an N+1 shows up
+# as hundreds of extra queries rather than a handful.
+SKU_COUNT = 3
+BATCHES_PER_SKU = 2
+BARCODES_PER_BATCH = 400
+QUESTIONS_PER_TEMPLATE = 12
+TESTED_PER_BATCH = 150
+SERVICE_CASES = 300
+SYSTEM_LOGS = 500
+
+
+def seed_dataset():
+    """Bulk-create a representative production-like dataset and return its key objects"""
+    admin_user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw', role='admin')
+    testers = [
+        CustomUser.objects.create_user(f'tester{i}', f'tester{i}@example.com', 'pw', role='tester')
+        for i in range(3)
+    ]
+    spec_template = BatchSpecTemplate.objects.create(name='LI-UPS', fields_json=['device_name', 'battery', 'capacity'])
+    choices = TechnicalOutputChoice.objects.bulk_create(
+        [TechnicalOutputChoice(value=f'{watts}W', order=i) for i, watts in enumerate(range(100, 2100, 100))]
+    )
+    Technician.objects.bulk_create([Technician(name=f'Technician {i}') for i in range(10)])
+
+    templates = []
+    for s in range(SKU_COUNT):
+        template = TestTemplate.objects.create(name=f'Template {s}')
+        questions = TestQuestion.objects.bulk_create([
+            TestQuestion(template=template, question_text=f'Check {q} for template {s}')
+            for q in range(QUESTIONS_PER_TEMPLATE)
+        ])
+        for question in questions[:4]:
+            question.technical_outputs.set(choices[:5])
+        templates.append((template, questions))
+    refdata.invalidate()  # bulk_create bypasses the invalidation signals
+
+    batches = []
+    for s in range(SKU_COUNT):
+        sku = SKU.objects.create(code=f'SK{s}', default_test_template=templates[s][0])
+        for b in range(BATCHES_PER_SKU):
+            batches.append(Batch.objects.create(
+                sku=sku, quantity=BARCODES_PER_BATCH, spec_template=spec_template,
+                device_name='UPS 1KVA', battery='150AH', capacity='1KVA',
+            ))
+
+    tests = []
+    for index, batch in enumerate(batches):
+        barcodes = Barcode.objects.filter(batch=batch).order_by('sequence_number')[:TESTED_PER_BATCH]
+        template = templates[index // BATCHES_PER_SKU][0]
+        for n, barcode in enumerate(barcodes):
+            tests.append(Test(
+                sku_id=batch.sku_id, batch=batch, barcode=barcode, user=testers[n % len(testers)],
+                template_used=template,
+                overall_status=['passed', 'passed', 'passed', 'failed', 'draft', 'pending'][n % 6],
+            ))
+    tests = Test.objects.bulk_create(tests)
+
+    answers = []
+    question_map = {template.id: questions for template, questions in templates}
+    for n, test in enumerate(tests):
+        for q, question in enumerate(question_map[test.template_used_id]):
+            output = f'{(q + 1) * 100}W'
+            answers.append(TestAnswer(
+                test=test, question=question, is_passed=(n + q) % 9 != 0,
+                technical_output=output, remarks='ok' if q % 4 else '', **outputs.fields(output),
+            ))
+    TestAnswer.objects.bulk_create(answers, batch_size=2000)
+
+    cases = []
+    today = datetime.date.today()
+    for n, test in enumerate(tests[:SERVICE_CASES]):
+        cases.append(ServiceCase(
+            test=test, barcode_id=test.barcode_id, case_id=f'SVC-{today.year}-{n + 1:04d}',
+            service_date=today - datetime.timedelta(days=n % 60), technician=testers[0].username,
+            issue_description=['No output', 'Battery not charging', 'Fan noise'][n % 3],
+            actions_taken='Replaced board', status=['open', 'in_progress', 'completed', 'on_hold'][n % 4],
+            created_by=admin_user,
+        ))
+    cases = ServiceCase.objects.bulk_create(cases)
+    # bulk_create bypasses the lifecycle and rollup signals and the answer snapshots
+    lifecycle.rebuild()
+    rollups.rebuild()
+    snapshots.rebuild()
+
+    SystemLog.objects.bulk_create([
+        SystemLog(
+            event_type='test_failed' if n % 5 == 0 else 'test_passed', level='warning' if n % 5 == 0 else 'info',
+            title=f'Event {n}', barcode_id=tests[n].barcode_id, test=tests[n], batch_id=tests[n].batch_id,
+            service_case=cases[n] if n < len(cases) else None, user=testers[n % len(testers)],
+        )
+        for n in range(SYSTEM_LOGS)
+    ])
+
+    # get_test_draft only serves the requesting user's own drafts
+    draft = next(test for test in tests if test.overall_status == 'draft')
+    Test.objects.filter(id=draft.id).update(user=admin_user)
+
+    return {
+        'admin': admin_user,
+        'batch': batches[0],
+        'barcode': tests[0].barcode,
+        'test': tests[0],
+        'draft': draft,
+        'service_case': cases[0],
+    }
+
+
+class QueryBudgetMixin:
+    """assertQueryBudget fails with the captured SQL when a block runs more than `budget` queries"""
+
+    def assertQueryBudget(self, budget, func, label=''):
+        with CaptureQueriesContext(connection) as captured:
+            result = func()
+        executed = len(captured.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f"{'+' if i >= budget else ' '} {i + 1}. {query['sql']}"
+                for i, query in enumerate(captured.captured_queries)
+            )
+            self.fail(f"{label or 'Block'} ran {executed} queries, budget is {budget} "
+                      f"(queries past the budget are marked +):\n{queries}")
+        return result
+
+
+@override_settings(
+    SYSTEM_LOG_BUFFER={'ENABLED': False},
+    PERFORMANCE_BUDGETS={'ENABLED': False},
+)
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Every URL in inventory/urls.py gets an upper bound on queries against the
+    seeded dataset. Budgets are fixed numbers: they must not grow with the
+    number of rows on the page.
+    """
+
+    PDF_VIEWS = {'print_test_report', 'print_barcodes_pdf', 'print_service_report', 'print_service_case_detail'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset()
+
+    def setUp(self):
+        self.client.force_login(self.data['admin'])
+
+    def url_cases(self):
+        d = self.data
+        batch, barcode, test, case = d['batch'], d['barcode'], d['test'], d['service_case']
+        # url name -> (path, query budget)
+        return {
+            'login': (reverse('login'), 2),
+            'logout': (reverse('logout'), 3),
+            'dashboard': (reverse('dashboard'), 3),
+            'barcode_module': (reverse('barcode_module'), 2),
+            'create_batch': (reverse('create_batch'), 4),
+            'batch_list': (reverse('batch_list'), 3),
+            'barcode_list': (reverse('barcode_list', args=[batch.id]), 5),
+            'print_barcodes': (reverse('print_barcodes', args=[batch.id]), 4),
+            'print_single_barcode': (reverse('print_single_barcode', args=[batch.id, barcode.id]), 4),
+            'testing_module': (reverse('testing_module'), 2),
+            'new_test': (reverse('new_test'), 6),
+            'rapid_test': (reverse('rapid_test') + f'?serial={barcode.sequence_number}', 8),
+            'auto_save_test': (reverse('auto_save_test'), 2),
+            'get_test_draft': (reverse('get_test_draft', args=[d['draft'].id]), 4),
+            'test_results': (reverse('test_results'), 7),
+            'print_barcodes_pdf': (reverse('print_barcodes_pdf', args=[batch.id]), 4),
+            'barcode_image': (reverse('barcode_image', args=[barcode.sequence_number]), 1),
+            'test_detail': (reverse('test_detail', args=[test.id]), 3),
+            'print_test_report': (reverse('print_test_report', args=[test.id]), 3),
+            'session_keep_alive': (reverse('session_keep_alive'), 2),
+            'ingest_tests': (reverse('ingest_tests'), 0),
+            'quality_analytics': (reverse('quality_analytics', args=['pareto']), 3),
+            'service_module': (reverse('service_module'), 2),
+            'create_service_case': (reverse('create_service_case'), 3),
+            'create_service_case_barcode': (reverse('create_service_case_barcode', args=[barcode.id]), 4),
+            'create_service_case_with_test': (reverse('create_service_case_with_test', args=[barcode.id, test.id]), 5),
+            'service_history': (reverse('service_history', args=[barcode.id]), 5),
+            'barcode_timeline': (reverse('barcode_timeline', args=[barcode.sequence_number]), 6),
+            'service_list': (reverse('service_list'), 5),
+            'print_service_report': (reverse('print_service_report'), 5),
+            'service_detail': (reverse('service_detail', args=[case.case_id]), 4),
+            'print_service_case_detail': (reverse('print_service_case_detail', args=[case.case_id]), 3),
+        }
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in inventory_urls.urlpatterns if pattern.name}
+        missing = names - set(self.url_cases())
+        self.assertFalse(missing, f"URLs without a query budget: {sorted(missing)}")
+
+    def test_url_query_budgets(self):
+        for name, (path, budget) in self.url_cases().items():
+            if name == 'logout':
+                continue  # Ends the session; covered separately below
+            with self.subTest(url=name):
+                response = self.assertQueryBudget(budget, lambda: self.client.get(path), label=name)
+                # PDF views return 500 when WeasyPrint is unavailable; the
+                # queries that build the report still count against the budget.
+                if name not in self.PDF_VIEWS:
+                    self.assertLess(response.status_code, 500)
+
+    def test_logout_query_budget(self):
+        path, budget = self.url_cases()['logout']
+        self.assertQueryBudget(budget, lambda: self.client.get(path), label='logout')
+
+    def test_service_list_serial_search_budget(self):
+        path = reverse('service_list') + f"?serial_number={self.data['barcode'].sequence_number}"
+        self.assertQueryBudget(7, lambda: self.client.get(path), label='service_list serial search')
+
+
+@override_settings(
+    SYSTEM_LOG_BUFFER={'ENABLED': False},
+    PERFORMANCE_BUDGETS={'ENABLED': False},
+)
+class AdminChangelistQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every registered inventory model's admin changelist stays within a fixed query budget"""
+
+    BUDGETS = {
+        'customuser': 6,
+        'sku': 6,
+        'batch': 8,
+        'barcode': 7,
+        'batchspectemplate': 6,
+        'testtemplate': 6,
+        'testquestion': 8,
+        'test': 9,
+        'testanswer': 8,
+        'technicaloutputchoice': 6,
+        'technician': 6,
+        'servicecase': 8,
+        'systemlog': 8,
+        'teststation': 7,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset()
+
+    def setUp(self):
+        self.client.force_login(self.data['admin'])
+
+    def test_every_admin_model_has_a_budget(self):
+        registered = {model._meta.model_name for model in admin.site._registry if model._meta.app_label == 'inventory'}
+        missing = registered - set(self.BUDGETS)
+        self.assertFalse(missing, f"Admin changelists without a query budget: {sorted(missing)}")
+
+    def test_changelist_query_budgets(self):
+        for model_name, budget in self.BUDGETS.items():
+            with self.subTest(model=model_name):
+                path = reverse(f'admin:inventory_{model_name}_changelist')
+                response = self.assertQueryBudget(budget, lambda: self.client.get(path), label=f'{model_name} changelist')
+                self.assertEqual(response.status_code, 200)
+
+    def test_large_changelists_use_estimated_counts(self):
+        path = reverse('admin:inventory_systemlog_changelist')
+        with mock.patch.object(EstimatedCountPaginator, 'ESTIMATE_ABOVE', 1), \
+                mock.patch.object(EstimatedCountPaginator, 'COUNT_LIMIT', 50):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(path)
+            self.assertEqual(response.context['cl'].result_count, db.estimated_count(SystemLog))
+            self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql'] and 'inventory_systemlog' in q['sql']])
+
+            response = self.client.get(path, {'level__exact': 'info'})
+            self.assertEqual(response.context['cl'].result_count, 50)
+            self.assertIsNone(response.context['cl'].full_result_count)
+
+    def test_service_case_search_by_technician(self):
+        response = self.client.get(reverse('admin:inventory_servicecase_changelist'), {'q': 'tech'})
+        self.assertEqual(response.status_code, 200)
+
+
+class SyntheticDataTests(TestCase):
+    """generate_synthetic_data's dataset is internally consistent and removable"""
+
+    def test_generate_and_clear(self):
+        counts = synthetic.generate(skus=2, batches_per_sku=2, barcodes_per_batch=40, questions_per_template=6, seed=7)
+
+        self.assertEqual(counts['batches'], 4)
+        self.assertEqual(Barcode.objects.count(), counts['barcodes'])
+        self.assertGreaterEqual(counts['tests'], counts['barcodes'])
+        self.assertFalse(Test.objects.filter(overall_status='failed').exclude(answers__is_passed=False).exists())
+
+        # Bulk-created cases draw from the live sequence, so the next case doesn't collide
+        case = ServiceCase.objects.create(
+            barcode=Barcode.objects.first(), service_date=datetime.date.today(), technician='x',
+            issue_description='x', actions_taken='x',
+        )
+        self.assertEqual(ServiceCase.objects.filter(case_id=case.case_id).count(), 1)
+
+        synthetic.clear()
+        self.assertFalse(SKU.objects.filter(code__startswith=synthetic.SYNTHETIC_PREFIX).exists())
+        self.assertFalse(CustomUser.objects.filter(username__startswith='synthetic_').exists())
+
+
+@override_settings(SYSTEM_LOG_BUFFER={'ENABLED': False}, PERFORMANCE_BUDGETS={'ENABLED': False})
+class LoadSimulationFlowTests(TestCase):
+    """Each simulate_load flow runs cleanly against the in-process app"""
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(skus=1, batches_per_sku=1, barcodes_per_batch=20, questions_per_template=5, testers=2,
+                           seed=3, log_events=False)
+
+    def test_flows(self):
+        pool = loadsim.build_pool(seed=1)
+        roles = list(loadsim.ROLES)
+        submitted = Test.objects.exclude(overall_status='draft')
+        before, cases_before = submitted.count(), ServiceCase.objects.count()
+        for role, user in zip(roles, loadsim.simulation_users(roles)):
+            with self.subTest(role=role):
+                worker = loadsim.Worker(role, lambda user=user: loadsim.ClientTransport(user), pool, seed=1)
+                worker.run(flows=2)
+                self.assertEqual(worker.failures, {})
+                self.assertEqual([s for s in worker.samples if s[0] == f'flow.{role}'][-1][2], 'ok')
+
+        self.assertEqual(submitted.count(), before + 2)
+        self.assertEqual(ServiceCase.objects.count(), cases_before + 2)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite connection profile')
+class SQLiteProfileTests(TestCase):
+    def test_connection_profile_applied(self):
+        status = db.sqlite_status()
+        self.assertEqual(status['busy_timeout'], 20000)
+        self.assertEqual(status['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(status['synchronous'], 1)  # NORMAL
+
+    def test_write_lane_serializes_writers(self):
+        order = []
+
+        def writer(name):
+            with db.write_lane():
+                order.append(f'{name} start')
+                with db.write_lane():  # Re-entrant within a thread
+                    time.sleep(0.05)
+                order.append(f'{name} end')
+
+        threads = [threading.Thread(target=writer, args=(name,)) for name in 'ab']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([entry.split()[1] for entry in order], ['start', 'end', 'start', 'end'])
+
+
+class BulkInsertTests(TestCase):
+    def test_copy_text_format(self):
+        log = SystemLog(event_type='other', title='tab\there', description='line\nbreak \\ slash', details={'a': [1]})
+        fields = {field.name: field for field in SystemLog._meta.concrete_fields}
+        self.assertEqual(db._copy_text(fields['title'], log, connection), 'tab\\there')
+        self.assertEqual(db._copy_text(fields['description'], log, connection), 'line\\nbreak \\\\ slash')
+        self.assertEqual(db._copy_text(fields['details'], log, connection), '{"a": [1]}')
+        self.assertEqual(db._copy_text(fields['user'], log, connection), '\\N')
+
+    def test_batch_barcodes_inserted(self):
+        sku = SKU.objects.create(code='BULK')
+        batch = Batch.objects.create(sku=sku, quantity=db.COPY_THRESHOLD + 5)
+        serials = list(Barcode.objects.filter(batch=batch).order_by('id').values_list('sequence_number', flat=True))
+        self.assertEqual(len(serials), db.COPY_THRESHOLD + 5)
+        self.assertEqual(serials[:2], ['BULKA001', 'BULKA002'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL-only indexes')
+class PostgresIndexTests(TestCase):
+    def test_trigram_and_partial_indexes_exist(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename IN "
+                           "('inventory_barcode', 'inventory_servicecase', 'inventory_test')")
+            names = {row[0] for row in cursor.fetchall()}
+        self.assertLessEqual(
+            {'inventory_barcode_seq_trgm_idx', 'inventory_servicecase_issue_trgm_idx', 'inventory_test_draft_idx'},
+            names,
+        )
+
+
+@override_settings(REPORTING_REPLICA={'ALIAS': 'default', 'MAX_LAG_SECONDS': 60, 'CHECK_INTERVAL': 30})
+class ReportingRouterTests(TestCase):
+    """The router only sends reporting reads to the replica alias while it is fresh enough"""
+
+    def setUp(self):
+        routers.reset_health()
+        self.addCleanup(routers.reset_health)
+        self.router = routers.ReportingRouter()
+
+    def test_reads_outside_reporting_stay_on_primary(self):
+        with mock.patch.object(routers, 'replica_lag', return_value=0):
+            self.assertIsNone(self.router.db_for_read(Test))
+
+    def test_fresh_replica_serves_reporting_reads(self):
+        with mock.patch.object(routers, 'replica_lag', return_value=5), routers.reporting():
+            self.assertEqual(self.router.db_for_read(Test), 'default')
+        self.assertEqual(self.router.db_for_write(Test), 'default')
+
+    def test_lagging_or_unreachable_replica_falls_back(self):
+        with mock.patch.object(routers, 'replica_lag', return_value=3600), routers.reporting():
+            self.assertIsNone(self.router.db_for_read(Test))
+        routers.reset_health()
+        with mock.patch.object(routers, 'replica_lag', side_effect=OSError('gone')), routers.reporting():
+            self.assertIsNone(self.router.db_for_read(Test))
+
+    def test_health_is_cached(self):
+        with mock.patch.object(routers, 'replica_lag', return_value=5) as lag, routers.reporting():
+            self.router.db_for_read(Test)
+            self.router.db_for_read(Test)
+        self.assertEqual(lag.call_count, 1)
+
+
+class SharedCacheTests(TestCase):
+    """The SQLite cache is shared between backend instances (i.e. processes) and evicts LRU entries"""
+
+    def make_cache(self, path, **options):
+        return SQLiteCache(path, {'OPTIONS': options, 'TIMEOUT': 60})
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+
+    def test_entries_shared_between_instances(self):
+        first, second = self.make_cache(self.path), self.make_cache(self.path)
+        first.set('k', {'v': 1})
+        self.assertEqual(second.get('k'), {'v': 1})
+        self.assertFalse(second.add('k', 'other'))
+        self.assertTrue(second.add('n', 1))
+        self.assertEqual(second.incr('n'), 2)
+        self.assertEqual(first.get('n'), 2)
+        second.delete('k')
+        self.assertIsNone(first.get('k'))
+
+    def test_expired_entries_are_misses(self):
+        store = self.make_cache(self.path)
+        store.set('k', 'v', timeout=-1)
+        self.assertIsNone(store.get('k'))
+        self.assertTrue(store.add('k', 'fresh'))
+        self.assertEqual(store.get('k'), 'fresh')
+
+    def test_least_recently_used_evicted(self):
+        store = self.make_cache(self.path, MAX_ENTRIES=3, CULL_FREQUENCY=3, TOUCH_INTERVAL=0)
+        for key in ('a', 'b', 'c'):
+            store.set(key, key)
+            time.sleep(0.01)
+        store.get('a')
+        store.set('d', 'd')
+        self.assertEqual(set(store.get_many(['a', 'b', 'c', 'd'])), {'a', 'c', 'd'})
+
+    def test_namespace_invalidation(self):
+        location = {'BACKEND': 'inventory.cache_backends.SQLiteCache', 'LOCATION': self.path}
+        with self.settings(CACHES={'default': location}):
+            self.check_namespace_invalidation()
+
+    def check_namespace_invalidation(self):
+        calls = []
+        cache.on_invalidate('test-ns', calls.append)
+        self.addCleanup(cache._callbacks.pop, 'test-ns')
+        compute = mock.Mock(side_effect=[1, 2])
+        self.assertEqual(cache.cached('test-ns', 'value', compute), 1)
+        self.assertEqual(cache.cached('test-ns', 'value', compute), 1)
+        cache.invalidate('test-ns')
+        self.assertEqual(cache.cached('test-ns', 'value', compute), 2)
+        self.assertEqual(calls, ['test-ns'])
+
+
+class ReferenceDataCacheTests(TestCase):
+    """Reference lookups are served without queries until a signal invalidates them"""
+
+    def setUp(self):
+        self.template = TestTemplate.objects.create(name='Ref')
+        self.question = TestQuestion.objects.create(template=self.template, question_text='Output voltage')
+        self.output = TechnicalOutputChoice.objects.create(value='230V')
+
+    def test_lookup_cached_until_edit(self):
+        first = refdata.template_questions(self.template.id)
+        self.assertEqual(first, [refdata.Question(self.question.id, 'Output voltage', ())])
+        with self.assertNumQueries(0):
+            self.assertEqual(refdata.template_questions(str(self.template.id)), first)
+
+        self.question.question_text = 'Output voltage (V)'
+        self.question.save()
+        self.assertEqual(refdata.template_questions(self.template.id)[0].question_text, 'Output voltage (V)')
+
+        self.question.technical_outputs.add(self.output)
+        self.assertEqual(refdata.template_questions(self.template.id)[0].outputs, ('230V',))
+
+        self.output.delete()
+        self.assertEqual(refdata.template_questions(self.template.id)[0].outputs, ())
+
+    def test_other_process_sees_invalidation(self):
+        refdata.output_choices()
+        # Another worker bumps the shared generation; this process's snapshot must not be reused
+        TechnicalOutputChoice.objects.filter(pk=self.output.pk).update(value='240V')
+        cache.invalidate(refdata.tag(TechnicalOutputChoice))
+        self.assertEqual(refdata.output_choices(), ['240V'])
+
+    def test_missing_template(self):
+        self.assertIsNone(refdata.template_questions(self.template.id + 100))
+        self.assertIsNone(refdata.template_questions('not-a-number'))
+
+
+class LogBufferTests(TestCase):
+    """Buffered SystemLog writes: bounded batch latency, sampling and no loss at shutdown"""
+
+    def make_writer(self, flush_interval, batch_size=1000):
+        writer = log_buffer.BufferedLogWriter(max_queue_size=1000, batch_size=batch_size, flush_interval=flush_interval)
+        writer.batches = []
+        # Record batches instead of writing them from the worker thread
+        writer._write = lambda batch: writer.batches.append((time.monotonic(), list(batch)))
+        self.addCleanup(writer.shutdown)
+        return writer
+
+    def test_trickle_flushes_within_interval(self):
+        writer = self.make_writer(flush_interval=0.2)
+        started = time.monotonic()
+        for n in range(20):
+            writer._put(n)
+            time.sleep(0.05)
+        writer.shutdown()
+        self.assertEqual([entry for _, batch in writer.batches for entry in batch], list(range(20)))
+        # Every batch is written about FLUSH_INTERVAL after its first entry, not after the last
+        self.assertGreaterEqual(len(writer.batches), 3)
+        self.assertLess(writer.batches[0][0] - started, 0.6)
+
+    def test_shutdown_writes_the_batch_being_collected(self):
+        writer = self.make_writer(flush_interval=30)
+        for n in range(3):
+            writer._put(n)
+        time.sleep(0.1)  # the worker has taken the entries off the queue
+        self.assertEqual(writer.pending(), 0)
+        writer.shutdown(timeout=2)
+        self.assertEqual([batch for _, batch in writer.batches], [[0, 1, 2]])
+        self.assertFalse(writer._thread.is_alive())
+
+    @override_settings(SYSTEM_LOG_BUFFER={'ENABLED': False, 'SAMPLE_RATES': {'test_passed': 0.25}})
+    def test_sampling(self):
+        with mock.patch('inventory.log_buffer.random.random', return_value=0.5):
+            self.assertIsNone(SystemLog.log_event('test_passed', 'Dropped'))
+            self.assertIsNotNone(SystemLog.log_event('test_passed', 'Warning kept', level='warning'))
+        with mock.patch('inventory.log_buffer.random.random', return_value=0.1):
+            kept = SystemLog.log_event('test_passed', 'Kept')
+        self.assertEqual(SystemLog.objects.get(pk=kept.pk).details, {'sample_rate': 0.25})
+        self.assertEqual(SystemLog.objects.count(), 2)
+
+
+class LogArchiveTests(TestCase):
+    """Old SystemLog rows move into monthly gzip'd archives that stay searchable"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive_dir = directory.name
+        now = timezone.now()
+        SystemLog.objects.bulk_create(
+            [SystemLog(event_type='test_failed' if n % 2 else 'test_passed', title=f'Old {n}', level='info',
+                       timestamp=now - datetime.timedelta(days=100 + 20 * n)) for n in range(5)]
+            + [SystemLog(event_type='test_passed', title='Recent', level='info', timestamp=now)]
+        )
+
+    def archive(self):
+        out = io.StringIO()
+        call_command('archive_system_logs', days=90, chunk_size=2, archive_dir=self.archive_dir, stdout=out)
+        return out.getvalue()
+
+    def query(self, *args):
+        out = io.StringIO()
+        call_command('query_log_archive', '--json', '--archive-dir', self.archive_dir, *args, stdout=out)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_round_trip(self):
+        self.assertIn('Archived 5 log entries', self.archive())
+        self.assertEqual(list(SystemLog.objects.values_list('title', flat=True)), ['Recent'])
+        self.assertEqual(sorted(entry['title'] for entry in self.query()), [f'Old {n}' for n in range(5)])
+        self.assertEqual(sorted(entry['title'] for entry in self.query('--event-type', 'test_failed')),
+                         ['Old 1', 'Old 3'])
+
+    def test_rerun_after_interrupted_delete(self):
+        # A run that wrote its chunk but died before deleting the rows
+        rows = list(SystemLog.objects.filter(title__startswith='Old').order_by('id').values(*log_archive.ARCHIVE_FIELDS))
+        log_archive._write_chunk(rows[:3], self.archive_dir)
+        self.assertIn('Archived 5 log entries', self.archive())
+        self.assertIn('Archived 0 log entries', self.archive())
+        titles = [entry['title'] for entry in self.query()]
+        self.assertEqual(sorted(titles), [f'Old {n}' for n in range(5)])
+
+
+class StartupImportTests(TestCase):
+    def test_heavy_modules_load_lazily(self):
+        modules, lazy_loaded = startup.probe()
+        self.assertEqual(lazy_loaded, [])
+        self.assertIn('django', modules)
+        self.assertLess(sum(modules.values()) / 1000, startup.get_config()['MILLISECONDS'])
+
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   json.decoder\n"
+            "import time:       300 |        420 | json\n"
+            "import time:        50 |         50 | inventory.pdf\n"
+        )
+        self.assertEqual(startup.parse_importtime(stderr), {'json': 420, 'inventory.pdf': 50})
+
+
+class StaticAssetTests(TestCase):
+    """Collected assets are served precompressed, with caching by whether the name is hashed"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        os.makedirs(os.path.join(self.root, 'css'))
+        self.path = os.path.join(self.root, 'css', 'app.0123456789ab.css')
+        with open(self.path, 'w') as f:
+            f.write('.btn-primary{color:red}\n' * 200)
+
+    def get(self, path, **headers):
+        with self.settings(STATIC_ROOT=self.root):
+            return Client().get(path, **headers)
+
+    def test_precompressed_variant_negotiated(self):
+        written = compress_file(self.path)
+        self.assertIn('.gz', written)
+        response = self.get('/static/css/app.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip;q=1, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(b''.join(response.streaming_content), open(self.path + '.gz', 'rb').read())
+
+        response = self.get('/static/css/app.0123456789ab.css', HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_cache_control(self):
+        from .middleware import StaticAssetMiddleware
+        with mock.patch.object(StaticAssetMiddleware, 'hashed_names', return_value={'css/app.0123456789ab.css'}):
+            response = self.get('/static/css/app.0123456789ab.css')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.get('/static/css/app.0123456789ab.css')
+        self.assertIn('must-revalidate', response['Cache-Control'])
+        self.assertEqual(self.get('/static/css/missing.css').status_code, 404)
+
+
+@override_settings(
+    PERFORMANCE_BUDGETS={'ENABLED': True, 'DEFAULT': {'wall_ms': 200, 'queries': 5, 'db_ms': 200}, 'VIEWS': {}},
+    SYSTEM_LOG_BUFFER={'ENABLED': False},
+)
+class PerformanceMonitorTests(TestCase):
+    """Requests over their budget leave a performance_issue log entry"""
+
+    def request(self, queries=0, sleep=0):
+        def view(request):
+            for _ in range(queries):
+                SKU.objects.exists()
+            time.sleep(sleep)
+            return HttpResponse('ok')
+        return PerformanceMonitorMiddleware(view)(RequestFactory().get('/perf/'))
+
+    def issues(self):
+        return list(SystemLog.objects.filter(event_type='performance_issue'))
+
+    def test_within_budget(self):
+        self.request(queries=2)
+        self.assertEqual(self.issues(), [])
+
+    def test_query_heavy(self):
+        self.request(queries=8)
+        [issue] = self.issues()
+        self.assertEqual(issue.details['exceeded']['queries'], {'measured': 8, 'budget': 5})
+        self.assertEqual(issue.details['view'], '/perf/')
+        self.assertEqual(issue.details['top_queries'][0]['count'], 8)
+
+    def test_slow(self):
+        self.request(sleep=0.3)
+        [issue] = self.issues()
+        self.assertEqual(list(issue.details['exceeded']), ['wall_ms'])
+
+
+class CompressionMiddlewareTests(TestCase):
+    """Text responses are compressed on the fly; streaming ones without being buffered"""
+
+    html = ('<tr class="bg-white/20 hover:bg-gray-50"><td class="px-4 py-2 text-sm">SN-0001</td></tr>\n' * 500).encode()
+
+    def compress(self, response, accept='gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_gzip_and_brotli(self):
+        response = self.compress(HttpResponse(self.html))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.html)
+        self.assertLess(len(response.content) * 5, len(self.html))
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        if brotli is not None:
+            response = self.compress(HttpResponse(self.html), accept='gzip, deflate, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(brotli.decompress(response.content), self.html)
+
+    def test_skipped_responses(self):
+        self.assertFalse(self.compress(HttpResponse(b'<p>small</p>')).has_header('Content-Encoding'))
+        self.assertFalse(self.compress(HttpResponse(self.html, content_type='application/pdf')).has_header('Content-Encoding'))
+        self.assertFalse(self.compress(HttpResponse(self.html, content_type='image/png')).has_header('Content-Encoding'))
+        self.assertFalse(self.compress(HttpResponse(self.html), accept='identity').has_header('Content-Encoding'))
+
+    def test_streaming_compressed_incrementally(self):
+        produced = []
+
+        def rows():
+            for number in range(20000):
+                produced.append(number)
+                yield f'SN-{number:06d},passed,2026-01-01\n'
+
+        response = self.compress(StreamingHttpResponse(rows(), content_type='text/csv'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        chunks = iter(response.streaming_content)
+        first = next(chunks)
+        self.assertTrue(first)
+        self.assertLess(len(produced), 20000)
+        body = gzip.decompress(first + b''.join(chunks)).decode()
+        self.assertEqual(body.count('\n'), 20000)
+
+
+@override_settings(SYSTEM_LOG_BUFFER={'ENABLED': False})
+class RapidTestTests(TestCase):
+    """Rapid entry saves straight back to the scanner, with the overall status taken from the answers"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw', role='admin')
+        self.template = TestTemplate.objects.create(name='RT')
+        self.questions = [TestQuestion.objects.create(template=self.template, question_text=f'Check {q}') for q in range(3)]
+        self.batch = Batch.objects.create(sku=SKU.objects.create(code='RT', default_test_template=self.template), quantity=1)
+        self.barcode = self.batch.barcode_set.first()
+        self.client.force_login(self.user)
+
+    def submit(self, statuses, overall_status=None):
+        data = {'rapid': '1', 'serial': self.barcode.sequence_number, 'sku': self.batch.sku_id,
+                'batch': self.batch.id, 'barcode': self.barcode.id, 'template': self.template.id}
+        if overall_status:
+            data['overall_status'] = overall_status
+        for question, status in zip(self.questions, statuses):
+            data[f'question_{question.id}_status'] = status
+        return self.client.post(reverse('new_test'), data)
+
+    def test_all_passed(self):
+        response = self.submit(['pass', 'pass', 'pass'])
+        self.assertRedirects(response, reverse('rapid_test'))
+        self.assertEqual(Test.objects.get(barcode=self.barcode).overall_status, 'passed')
+
+    def test_failed_question_fails_test(self):
+        response = self.submit(['pass', 'fail', 'pass'], overall_status='passed')
+        self.assertRedirects(response, reverse('rapid_test'))
+        test = Test.objects.get(barcode=self.barcode)
+        self.assertEqual(test.overall_status, 'failed')
+        self.assertEqual(TestAnswer.objects.filter(test=test, is_passed=False).count(), 1)
+
+    def test_scan_form_has_no_status_picker(self):
+        response = self.client.get(reverse('rapid_test'), {'serial': self.barcode.sequence_number})
+        self.assertContains(response, 'Check 2')
+        self.assertNotContains(response, 'name="overall_status"')
+
+
+class ServiceCaseIdTests(TestCase):
+    """Case ids come from a per-year counter, so they are sequential and never handed out twice"""
+
+    def create(self, day=datetime.date(2025, 6, 1)):
+        with mock.patch('inventory.models.timezone.localdate', return_value=day):
+            return ServiceCase.objects.create(service_date=day, technician='tech',
+                                              issue_description='No output', actions_taken='-')
+
+    def test_sequential(self):
+        self.assertEqual([self.create().case_id for _ in range(3)],
+                         ['SVC-2025-0001', 'SVC-2025-0002', 'SVC-2025-0003'])
+
+    def test_deleted_latest_not_reused(self):
+        self.create()
+        self.create().delete()
+        self.assertEqual(self.create().case_id, 'SVC-2025-0003')
+
+    def test_year_rollover(self):
+        self.create(datetime.date(2025, 12, 31))
+        self.create(datetime.date(2025, 12, 31))
+        self.assertEqual(self.create(datetime.date(2026, 1, 1)).case_id, 'SVC-2026-0001')
+        self.assertEqual(self.create(datetime.date(2025, 12, 31)).case_id, 'SVC-2025-0003')
+
+    def test_continues_after_reserve(self):
+        self.create()
+        with transaction.atomic():
+            self.assertEqual(ServiceCaseSequence.reserve(2025, 10), 11)
+        self.assertEqual(self.create().case_id, 'SVC-2025-0012')
+
+
+class ServiceCaseFilterTests(TestCase):
+    """The service list and its printed report filter on the technician's username"""
+
+    def setUp(self):
+        self.client.force_login(CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw', role='admin'))
+        self.cases = [
+            ServiceCase.objects.create(service_date=datetime.date.today(), technician=name,
+                                       issue_description='No output', actions_taken='-')
+            for name in ('alice', 'bob')
+        ]
+
+    def test_service_list(self):
+        response = self.client.get(reverse('service_list'), {'technician': 'ALI'})
+        self.assertContains(response, self.cases[0].case_id)
+        self.assertNotContains(response, self.cases[1].case_id)
+
+    def test_print_service_report(self):
+        with mock.patch('inventory.pdf.available', return_value=True), \
+                mock.patch('inventory.pdf.render', return_value=b'%PDF') as render:
+            response = self.client.get(reverse('print_service_report'), {'technician': 'ali'})
+        self.assertEqual(response.status_code, 200)
+        html = render.call_args[0][0]
+        self.assertIn(self.cases[0].case_id, html)
+        self.assertNotIn(self.cases[1].case_id, html)
+
+
+@override_settings(SYSTEM_LOG_BUFFER={'ENABLED': False})
+class BarcodeLifecycleTests(TestCase):
+    """Barcode.latest_test and lifecycle_state follow the unit's tests and service cases"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('tester', 'tester@example.com', 'pw', role='tester')
+        sku = SKU.objects.create(code='LC')
+        self.batch = Batch.objects.create(sku=sku, quantity=3)
+        self.barcode = Barcode.objects.filter(batch=self.batch).order_by('sequence_number').first()
+
+    def state(self):
+        self.barcode.refresh_from_db()
+        return self.barcode.lifecycle_state
+
+    def test_transitions(self):
+        self.assertEqual(self.state(), lifecycle.UNTESTED)
+        draft = Test.objects.create(sku_id=self.batch.sku_id, batch=self.batch, barcode=self.barcode,
+                                    user=self.user, overall_status='draft')
+        self.assertEqual(self.state(), lifecycle.DRAFT)
+        self.assertEqual(self.barcode.latest_test, draft)
+
+        draft.overall_status = 'failed'
+        draft.save()
+        self.assertEqual(self.state(), lifecycle.FAILED)
+
+        case = ServiceCase.objects.create(barcode=self.barcode, test=draft, service_date=datetime.date.today(),
+                                          technician='tester', issue_description='No output', actions_taken='-')
+        self.assertEqual(self.state(), lifecycle.IN_SERVICE)
+        case.status = 'completed'
+        case.save()
+        self.assertEqual(self.state(), lifecycle.SERVICED)
+
+        retest = Test.objects.create(sku_id=self.batch.sku_id, batch=self.batch, barcode=self.barcode,
+                                     user=self.user, overall_status='passed')
+        self.assertEqual(self.state(), lifecycle.PASSED)
+        self.assertEqual(self.barcode.latest_test, retest)
+
+        retest.delete()
+        self.assertEqual(self.state(), lifecycle.SERVICED)
+        self.assertEqual(self.barcode.latest_test, draft)
+
+        untested = Barcode.objects.filter(batch=self.batch, lifecycle_state=lifecycle.UNTESTED)
+        self.assertEqual(untested.count(), 2)
+
+    def test_rebuild_repairs_bulk_writes(self):
+        Test.objects.bulk_create([Test(sku_id=self.batch.sku_id, batch=self.batch, barcode=self.barcode,
+                                       user=self.user, overall_status='passed')])
+        self.assertEqual(self.state(), lifecycle.UNTESTED)
+        self.assertEqual(lifecycle.rebuild(), 1)
+        self.assertEqual(self.state(), lifecycle.PASSED)
+        self.assertEqual(lifecycle.rebuild(), 0)
+
+
+@override_settings(SYSTEM_LOG_BUFFER={'ENABLED': False})
+class BatchYieldRollupTests(TestCase):
+    """The incrementally maintained rollup always matches a recompute from Test"""
+
+    FIELDS = ('tests', 'draft_tests', 'pending_tests', 'passed_tests', 'failed_tests', 'units_tested',
+              'testers', 'tester_ids', 'first_test_at', 'last_test_at')
+
+    def assertRollupCurrent(self, batch):
+        maintained = BatchYield.objects.values(*self.FIELDS).get(batch=batch)
+        rollups.refresh(batch.id)
+        self.assertEqual(maintained, BatchYield.objects.values(*self.FIELDS).get(batch=batch))
+        return maintained
+
+    def test_incremental_updates(self):
+        users = [CustomUser.objects.create_user(f'tester{i}', f'tester{i}@example.com', 'pw', role='tester')
+                 for i in range(2)]
+        batch = Batch.objects.create(sku=SKU.objects.create(code='RY'), quantity=4)
+        barcodes = list(Barcode.objects.filter(batch=batch).order_by('sequence_number'))
+        self.assertEqual(self.assertRollupCurrent(batch)['tests'], 0)
+
+        def new_test(barcode, user, status):
+            return Test.objects.create(sku_id=batch.sku_id, batch=batch, barcode=barcode, user=user,
+                                       overall_status=status)
+
+        draft = new_test(barcodes[0], users[0], 'draft')
+        new_test(barcodes[1], users[0], 'failed')
+        new_test(barcodes[1], users[1], 'passed')
+        self.assertRollupCurrent(batch)
+
+        draft = Test.objects.get(pk=draft.pk)
+        draft.overall_status = 'passed'
+        draft.save()
+        rollup = self.assertRollupCurrent(batch)
+        self.assertEqual((rollup['passed_tests'], rollup['failed_tests'], rollup['draft_tests']), (2, 1, 0))
+        self.assertEqual((rollup['units_tested'], rollup['testers']), (2, 2))
+
+        draft.barcode = barcodes[2]
+        draft.save()
+        self.assertEqual(self.assertRollupCurrent(batch)['units_tested'], 2)
+        draft.delete()
+        self.assertRollupCurrent(batch)
+
+    def test_batch_list_sorted_by_rollup(self):
+        admin_user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw', role='admin')
+        sku = SKU.objects.create(code='RS')
+        batches = [Batch.objects.create(sku=sku, quantity=2) for _ in range(2)]
+        barcode = Barcode.objects.filter(batch=batches[0]).first()
+        Test.objects.create(sku=sku, batch=batches[0], barcode=barcode, user=admin_user, overall_status='passed')
+        self.client.force_login(admin_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('batch_list'), {'sort': '-passed'})
+        self.assertEqual([batch.pk for batch in response.context['batches']], [batches[0].pk, batches[1].pk])
+        self.assertFalse([q['sql'] for q in queries if '"inventory_test"' in q['sql']])
+        response = self.client.get(reverse('batch_list'), {'sort': '-untested'})
+        self.assertEqual(response.context['batches'][0].pk, batches[1].pk)
+
+
+
+@override_settings(
+    SYSTEM_LOG_BUFFER={'ENABLED': False},
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'timeline-tests'},
+        'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'timeline-sessions'},
+    },
+)
+class BarcodeTimelineTests(TestCase):
+    """The timeline is a fixed number of queries, cached, and dropped when the unit's history changes"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw', role='admin')
+        template = TestTemplate.objects.create(name='TL')
+        self.questions = TestQuestion.objects.bulk_create(
+            [TestQuestion(template=template, question_text=f'Check {q}') for q in range(5)]
+        )
+        sku = SKU.objects.create(code='TL', default_test_template=template)
+        self.batch = Batch.objects.create(sku=sku, quantity=2)
+        self.barcode = Barcode.objects.select_related('batch').filter(batch=self.batch).order_by('sequence_number').first()
+        self.url = reverse('barcode_timeline', kwargs={'serial': self.barcode.sequence_number})
+        self.client.force_login(self.user)
+
+    def add_test(self, status='passed'):
+        test = Test.objects.create(sku_id=self.batch.sku_id, batch=self.batch, barcode=self.barcode,
+                                   user=self.user, template_used_id=self.questions[0].template_id,
+                                   overall_status=status)
+        TestAnswer.objects.bulk_create([TestAnswer(test=test, question=q, is_passed=True) for q in self.questions])
+        return test
+
+    def test_query_count_independent_of_history(self):
+        self.add_test()
+        with CaptureQueriesContext(connection) as small:
+            timeline.build(self.barcode)
+        for _ in range(5):
+            test = self.add_test('failed')
+            ServiceCase.objects.create(barcode=self.barcode, test=test, service_date=datetime.date.today(),
+                                       technician='tech', issue_description='No output', actions_taken='-')
+        with CaptureQueriesContext(connection) as large:
+            events = timeline.build(self.barcode)
+        self.assertEqual((len(small), len(large)), (4, 4))
+        self.assertEqual([event['kind'] for event in events].count('test'), 6)
+        self.assertEqual(sorted(events, key=lambda event: event['at']), events)
+
+    def test_cached_until_history_changes(self):
+        test = self.add_test('failed')
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'format': 'json'})
+        self.assertFalse([q['sql'] for q in queries if 'FROM "inventory_test"' in q['sql']])
+        self.assertEqual(response.json()['events'][-1]['status'], 'failed')
+
+        case = ServiceCase.objects.create(barcode=self.barcode, test=test, service_date=datetime.date.today(),
+                                          technician='tech', issue_description='No output', actions_taken='-')
+        kinds = [event['kind'] for event in self.client.get(self.url, {'format': 'json'}).json()['events']]
+        self.assertIn('service', kinds)
+
+        case.status = 'completed'
+        case.save()
+        test.overall_status = 'passed'
+        test.save()
+        events = self.client.get(self.url, {'format': 'json'}).json()['events']
+        self.assertIn('service_completed', [event['kind'] for event in events])
+        self.assertEqual([event['status'] for event in events if event['kind'] == 'test'], ['passed'])
+
+    def test_answer_deletes_invalidate(self):
+        test = self.add_test()
+        snapshots.sync(test)
+        self.client.get(self.url, {'format': 'json'})
+        model_admin = admin.site._registry[TestAnswer]
+        request = RequestFactory().post('/')
+        request.user = self.user
+
+        model_admin.delete_model(request, TestAnswer.objects.filter(test=test).first())
+        answers = self.client.get(self.url, {'format': 'json'}).json()['events'][-1]['answers']
+        self.assertEqual(len(answers), 4)
+
+        first_two = list(TestAnswer.objects.filter(test=test).values_list('pk', flat=True)[:2])
+        model_admin.delete_queryset(request, TestAnswer.objects.filter(pk__in=first_two))
+        answers = self.client.get(self.url, {'format': 'json'}).json()['events'][-1]['answers']
+        self.assertEqual(len(answers), 2)
+        self.assertEqual(len(Test.objects.get(pk=test.pk).answer_snapshot), 2)
+
+    def test_html_page(self):
+        self.add_test()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Check 4')
+        self.assertContains(response, f'Batch {self.batch.prefix} created')
+
+
+class AnswerSnapshotTests(TestCase):
+    """Finalized tests render from their frozen answer snapshot without touching TestAnswer"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw', role='admin')
+        template = TestTemplate.objects.create(name='SN')
+        self.questions = [TestQuestion.objects.create(template=template, question_text=f'Check {q}') for q in range(3)]
+        self.batch = Batch.objects.create(sku=SKU.objects.create(code='SN', default_test_template=template), quantity=1)
+        self.test = Test.objects.create(sku_id=self.batch.sku_id, batch=self.batch, barcode=self.batch.barcode_set.first(),
+                                        user=self.user, template_used=template, overall_status='passed')
+        for q in self.questions:
+            TestAnswer.objects.create(test=self.test, question=q, is_passed=True, technical_output='230V')
+        snapshots.sync(self.test)
+        self.client.force_login(self.user)
+
+    def test_detail_reads_snapshot(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('test_detail', args=[self.test.id]))
+        self.assertContains(response, 'Check 2')
+        self.assertFalse([q['sql'] for q in queries if 'inventory_testanswer' in q['sql']])
+
+    def test_question_text_frozen(self):
+        self.questions[0].question_text = 'Renamed check'
+        self.questions[0].save()
+        response = self.client.get(reverse('test_detail', args=[self.test.id]))
+        self.assertContains(response, 'Check 0')
+        self.assertNotContains(response, 'Renamed check')
+
+    def test_question_text_frozen_across_later_writes(self):
+        self.questions[0].question_text = 'Renamed check'
+        self.questions[0].save()
+        self.client.post(reverse('test_detail', args=[self.test.id]), {'overall_status': 'failed'})
+        answer = TestAnswer.objects.get(test=self.test, question=self.questions[0])
+        answer.technical_output = '240V'
+        answer.save()
+        self.test.refresh_from_db()
+        snapshots.sync(self.test)
+        self.test.refresh_from_db()
+        self.assertEqual(self.test.answer_snapshot[0][1:4], ['Check 0', True, '240V'])
+
+    def test_reopened_test_drops_snapshot(self):
+        self.client.post(reverse('test_detail', args=[self.test.id]), {'overall_status': 'draft'})
+        self.test.refresh_from_db()
+        self.assertIsNone(self.test.answer_snapshot)
+        self.assertEqual([answer.question_text for answer in snapshots.answers(self.test)],
+                         ['Check 0', 'Check 1', 'Check 2'])
+
+    def test_rebuild_matches_sync(self):
+        frozen = Test.objects.get(pk=self.test.pk).answer_snapshot
+        Test.objects.update(answer_snapshot=None)
+        self.assertEqual(snapshots.rebuild(), 1)
+        self.assertEqual(Test.objects.get(pk=self.test.pk).answer_snapshot, frozen)
+
+
+class OutputValueTests(TestCase):
+    """Technical outputs are parsed on write so ranges and statistics are plain SQL"""
+
+    def setUp(self):
+        user = CustomUser.objects.create_user('tester', 'tester@example.com', 'pw', role='tester')
+        template = TestTemplate.objects.create(name='OV')
+        self.power, self.current = [TestQuestion.objects.create(template=template, question_text=text)
+                                    for text in ('Power', 'Current')]
+        batch = Batch.objects.create(sku=SKU.objects.create(code='OV'), quantity=1)
+        self.test = Test.objects.create(sku_id=batch.sku_id, batch=batch, barcode=batch.barcode_set.first(),
+                                        user=user, template_used=template)
+
+    def answer(self, question, output):
+        return TestAnswer.objects.create(test=self.test, question=question, is_passed=True, technical_output=output)
+
+    def test_parse(self):
+        cases = {'1700W': (1700.0, 'W'), '230 V': (230.0, 'V'), '1.5kva': (1.5, 'KVA'), '1,200 W': (1200.0, 'W'),
+                 '12': (12.0, ''), 'OK': (None, ''), 'W200': (None, ''), '': (None, ''), None: (None, '')}
+        for text, expected in cases.items():
+            self.assertEqual(outputs.parse(text), expected, text)
+
+    def test_range_and_stats(self):
+        for output in ('200W', '1700W', '900W', 'not measured'):
+            self.answer(self.power, output)
+        self.answer(self.current, '300A')
+        below = TestAnswer.objects.filter(test__batch=self.test.batch).with_output('w', lt=1500)
+        self.assertEqual(sorted(below.values_list('technical_output', flat=True)), ['200W', '900W'])
+        self.assertEqual(list(TestAnswer.objects.output_stats()), [
+            {'question_id': self.power.id, 'output_unit': 'W', 'count': 3, 'min': 200.0, 'max': 1700.0, 'mean': 2800 / 3},
+            {'question_id': self.current.id, 'output_unit': 'A', 'count': 1, 'min': 300.0, 'max': 300.0, 'mean': 300.0},
+        ])
+
+    def test_update_fields_and_backfill(self):
+        answer = self.answer(self.power, '200W')
+        answer.technical_output = '250W'
+        answer.save(update_fields=['technical_output'])
+        answer.refresh_from_db()
+        self.assertEqual((answer.output_value, answer.output_unit), (250.0, 'W'))
+
+        TestAnswer.objects.update(output_value=None, output_unit='')
+        call_command('backfill_output_values', chunk_size=1, stdout=io.StringIO())
+        self.assertEqual(TestAnswer.objects.with_output('W', gte=250).count(), 1)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'analytics-tests'},
+        'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'analytics-sessions'},
+    },
+)
+class QualityAnalyticsTests(TestCase):
+    """Pareto, pass rates and co-failures over finalized tests, with and without NumPy"""
+
+    MATRIX = [[3, 2, 1], [2, 2, 1], [1, 1, 1]]
+
+    def setUp(self):
+        analytics.invalidate()
+        self.alice, self.bob = [CustomUser.objects.create_user(name, f'{name}@example.com', 'pw', role='tester')
+                                for name in ('alice', 'bob')]
+        template = TestTemplate.objects.create(name='QA')
+        self.questions = [TestQuestion.objects.create(template=template, question_text=f'Check {q}') for q in range(3)]
+        batch = Batch.objects.create(sku=SKU.objects.create(code='QA'), quantity=5)
+        barcodes = list(batch.barcode_set.order_by('sequence_number'))
+        # Failed questions per test; the draft is left out of every metric
+        for barcode, user, status, failed in [
+            (barcodes[0], self.alice, 'failed', {0, 1}),
+            (barcodes[1], self.alice, 'failed', {0}),
+            (barcodes[2], self.bob, 'passed', set()),
+            (barcodes[3], self.bob, 'failed', {0, 1, 2}),
+            (barcodes[4], self.bob, 'draft', {2}),
+        ]:
+            test = Test.objects.create(sku_id=batch.sku_id, batch=batch, barcode=barcode, user=user,
+                                       template_used=template, overall_status=status)
+            TestAnswer.objects.bulk_create([TestAnswer(test=test, question=question, is_passed=q not in failed)
+                                            for q, question in enumerate(self.questions)])
+        self.start, self.end = analytics.date_range()
+
+    def test_pareto(self):
+        data = analytics.pareto(self.start, self.end)
+        self.assertEqual(data['failures'], 6)
+        self.assertEqual([(row['text'], row['failures'], row['cumulative_share']) for row in data['questions']],
+                         [('Check 0', 3, 0.5), ('Check 1', 2, 0.8333), ('Check 2', 1, 1.0)])
+
+    def test_pass_rates(self):
+        by_tester = analytics.pass_rates('tester', self.start, self.end)['groups']
+        self.assertEqual([(group['label'], group['total'], group['pass_rate']) for group in by_tester],
+                         [('alice', 2, 0.0), ('bob', 2, 0.5)])
+        by_question = analytics.pass_rates('question', self.start, self.end)['groups']
+        self.assertEqual([(group['label'], group['failed']) for group in by_question],
+                         [('Check 0', 3), ('Check 1', 2), ('Check 2', 1)])
+
+    def test_co_failures_python(self):
+        with self.settings(QUALITY_ANALYTICS={'USE_NUMPY': False}):
+            data = analytics.co_failures(self.start, self.end)
+        self.assertEqual((data['matrix'], data['failed_tests'], data['combinations']), (self.MATRIX, 3, 3))
+
+    @skipUnless(analytics.NUMPY_AVAILABLE, "NumPy is not installed")
+    def test_co_failures_numpy(self):
+        with self.settings(QUALITY_ANALYTICS={'USE_NUMPY': True, 'CHUNK_SIZE': 2}):
+            data = analytics.co_failures(self.start, self.end)
+        self.assertEqual((data['matrix'], data['failed_tests'], data['combinations']), (self.MATRIX, 3, 3))
+
+    def test_final_test_changes_invalidate(self):
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        Test.objects.update(test_date=timezone.now() - datetime.timedelta(days=1))
+        start, end = analytics.date_range(yesterday, yesterday)
+        self.assertEqual(analytics.pareto(start, end)['failures'], 6)
+
+        answer = TestAnswer.objects.filter(test__overall_status='failed', is_passed=False).first()
+        answer.is_passed = True
+        answer.save()
+        self.assertEqual(analytics.pareto(start, end)['failures'], 5)
+
+        draft = Test.objects.get(overall_status='draft')
+        draft.overall_status = 'failed'
+        draft.save()
+        self.assertEqual(analytics.pareto(start, end)['failures'], 6)
+
+        TestAnswer.objects.filter(test=draft).delete()
+        self.assertEqual(analytics.pareto(start, end)['failures'], 5)
+
+    def test_todays_changes_keep_closed_ranges(self):
+        today, yesterday = timezone.localdate(), timezone.localdate() - datetime.timedelta(days=1)
+        old = Test.objects.order_by('pk').first()  # failed Check 0 and Check 1
+        Test.objects.filter(pk=old.pk).update(test_date=timezone.now() - datetime.timedelta(days=1))
+        closed, current = analytics.date_range(yesterday, yesterday), analytics.date_range(today, today)
+        self.assertEqual((analytics.pareto(*closed)['failures'], analytics.pareto(*current)['failures']), (2, 4))
+
+        # Unsignalled, so only a broad invalidation would show it
+        TestAnswer.objects.filter(test=old).update(is_passed=True)
+        answer = TestAnswer.objects.filter(test__overall_status='failed', is_passed=False).exclude(test=old).first()
+        answer.is_passed = True
+        answer.save()
+        self.assertEqual((analytics.pareto(*closed)['failures'], analytics.pareto(*current)['failures']), (2, 3))
+
+        old = Test.objects.get(pk=old.pk)
+        old.save()
+        self.assertEqual(analytics.pareto(*closed)['failures'], 0)
+
+    def test_endpoint_and_command(self):
+        self.client.force_login(self.alice)
+        url = reverse('quality_analytics', args=['pareto'])
+        self.assertEqual(self.client.get(url).json()['failures'], 6)
+        self.assertEqual(self.client.get(url, {'start': '2024-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('quality_analytics', args=['other'])).status_code, 404)
+
+        # Cached per range until invalidated
+        TestAnswer.objects.filter(is_passed=False).update(is_passed=True)
+        self.assertEqual(self.client.get(url).json()['failures'], 6)
+        out = io.StringIO()
+        call_command('quality_report', 'pareto', '--fresh', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['failures'], 0)
+
+
+@override_settings(SYSTEM_LOG_BUFFER={'ENABLED': False})
+class TestIngestTests(TestCase):
+    """Station uploads are validated as a whole, idempotent per key and written with bulk queries"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('rig', 'rig@example.com', 'pw', role='tester')
+        self.station = TestStation(name='Rig 1', user=self.user)
+        self.key = self.station.issue_key()
+        self.station.save()
+        self.template = TestTemplate.objects.create(name='Burn-in')
+        self.questions = TestQuestion.objects.bulk_create(
+            [TestQuestion(template=self.template, question_text=f'Check {q}') for q in range(4)]
+        )
+        refdata.invalidate()  # bulk_create bypasses the invalidation signals
+        self.batch = Batch.objects.create(sku=SKU.objects.create(code='IG'), quantity=60)
+        self.serials = list(Barcode.objects.filter(batch=self.batch).order_by('sequence_number')
+                            .values_list('sequence_number', flat=True))
+
+    def result(self, n, passed=True):
+        return {
+            'key': f'run-{n}', 'serial': self.serials[n], 'template': self.template.name,
+            'answers': [{'question': q.id, 'passed': passed or i > 0, 'output': '230V'} for i, q in enumerate(self.questions)],
+        }
+
+    def post(self, results, key=None):
+        return self.client.post(reverse('ingest_tests'), json.dumps({'results': results}), content_type='application/json',
+                                HTTP_AUTHORIZATION=f'Bearer {key or self.key}')
+
+    def test_upsert_by_key(self):
+        response = self.post([self.result(0), self.result(1, passed=False)])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.json()['created'], response.json()['updated']), (2, 0))
+        self.assertEqual(TestAnswer.objects.count(), 8)
+        self.assertEqual(BatchYield.objects.get(batch=self.batch).failed_tests, 1)
+
+        # A retry with a correction updates the same tests
+        response = self.post([self.result(0), self.result(1, passed=True)])
+        self.assertEqual((response.json()['created'], response.json()['updated']), (0, 2))
+        self.assertEqual(Test.objects.count(), 2)
+        self.assertEqual(TestAnswer.objects.count(), 8)
+        self.assertEqual(BatchYield.objects.get(batch=self.batch).passed_tests, 2)
+        barcode = Barcode.objects.get(sequence_number=self.serials[1])
+        self.assertEqual(barcode.lifecycle_state, lifecycle.PASSED)
+        self.assertEqual(barcode.latest_test.station, self.station)
+        self.assertEqual(barcode.latest_test.answer_snapshot[0][1:3], ['Check 0', True])
+
+    def test_invalid_result_rejects_request(self):
+        bad = dict(self.result(1), serial='NOPE')
+        response = self.post([self.result(0), bad, dict(self.result(2), key='run-0')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2])
+        self.assertFalse(Test.objects.exists())
+
+    def test_requires_active_station_key(self):
+        self.assertEqual(self.post([self.result(0)], key=self.key[:-1] + '_').status_code, 401)
+        TestStation.objects.filter(pk=self.station.pk).update(is_active=False)
+        self.assertEqual(self.post([self.result(0)]).status_code, 401)
+
+    def test_query_count_independent_of_size(self):
+        def write_queries(results):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post(results).status_code, 200)
+            # SystemLog entries are written by the log buffer in production
+            return len([q for q in queries if 'INSERT INTO "inventory_systemlog"' not in q['sql']])
+
+        write_queries([self.result(59)])  # records the station's last_seen_at
+        small = write_queries([self.result(n) for n in range(2)])
+        # Few enough rows that SQLite's parameter limit doesn't split the inserts
+        self.assertEqual(write_queries([self.result(n) for n in range(2, 32)]), small)
+
+
+@override_settings(SYSTEM_LOG_BUFFER={'ENABLED': False})
+class ResultImportTests(TestCase):
+    """CSV/XLSX imports stream rows into bulk inserts and report bad rows without stopping"""
+
+    HEADER = 'serial,template,question,passed,output,remarks,tested_at,key\n'
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw', role='admin')
+        template = TestTemplate.objects.create(name='Final')
+        TestQuestion.objects.bulk_create([TestQuestion(template=template, question_text=f'Check {q}') for q in range(3)])
+        refdata.invalidate()  # bulk_create bypasses the invalidation signals
+        self.batch = Batch.objects.create(sku=SKU.objects.create(code='IM'), quantity=10)
+        self.serials = list(Barcode.objects.filter(batch=self.batch).order_by('sequence_number')
+                            .values_list('sequence_number', flat=True))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def rows_for(self, serial, key, passed=('pass', 'pass', 'pass'), tested_at='2024-03-01 10:15'):
+        return ''.join(f'{serial},Final,Check {q},{result},{q}00W,,{tested_at},{key}\n' for q, result in enumerate(passed))
+
+    def write_csv(self, body):
+        path = os.path.join(self.directory, 'results.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.HEADER + body)
+        return path
+
+    def test_repeated_key_rejected(self):
+        path = self.write_csv(self.rows_for(self.serials[0], 'K1') + self.rows_for(self.serials[1], 'K1'))
+        report = importer.import_results(path, path, self.user)
+        self.assertEqual((report.tests, report.rejected), (1, 1))
+        self.assertEqual(report.errors, [(5, "Key 'K1' is used by an earlier test in this file")])
+        self.assertEqual(importer.import_results(path, path, self.user).skipped, 1)
+        self.assertEqual(Test.objects.filter(ingest_key='K1').count(), 1)
+
+    def test_csv_import_reports_bad_rows_and_resumes(self):
+        body = (self.rows_for(self.serials[0], 'k0')
+                + self.rows_for(self.serials[1], 'k1', passed=('pass', 'maybe', 'fail'))
+                + self.rows_for('NOPE', 'k2')
+                + self.rows_for(self.serials[2], 'k3', passed=('pass', 'fail', 'pass')))
+        path = self.write_csv(body)
+        report = importer.import_results(path, path, self.user, chunk_rows=4)
+        self.assertEqual((report.rows, report.tests, report.answers, report.rejected), (12, 2, 6, 2))
+        self.assertEqual(report.errors, [(6, "'passed' must be pass or fail, not 'maybe'"), (8, "Unknown serial 'NOPE'")])
+
+        failed = Test.objects.get(ingest_key='k3')
+        self.assertEqual((failed.overall_status, failed.test_date.date()), ('failed', datetime.date(2024, 3, 1)))
+        self.assertEqual(Barcode.objects.get(sequence_number=self.serials[2]).lifecycle_state, lifecycle.FAILED)
+        rollup = BatchYield.objects.get(batch=self.batch)
+        self.assertEqual((rollup.passed_tests, rollup.failed_tests), (1, 1))
+
+        # Running the file again only imports what was rejected before
+        report = importer.import_results(path, path, self.user)
+        self.assertEqual((report.tests, report.skipped), (0, 2))
+        self.assertEqual(Test.objects.count(), 2)
+
+    def test_missing_columns(self):
+        path = os.path.join(self.directory, 'results.csv')
+        with open(path, 'w') as f:
+            f.write('serial,question\n')
+        with self.assertRaisesMessage(importer.ImportFileError, 'template, passed'):
+            importer.import_results(path, path, self.user)
+
+    @skipUnless(importer.XLSX_SUPPORTED, "openpyxl is not installed")
+    def test_xlsx_admin_upload(self):
+        import openpyxl
+
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['Serial', 'Template', 'Question', 'Passed', 'Output', 'Tested_at'])
+        for q in range(3):
+            sheet.append([self.serials[0], 'Final', f'Check {q}', True, 230.0, datetime.datetime(2024, 3, 1, 9)])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('results.xlsx', buffer.getvalue())
+        response = self.client.post(reverse('admin:inventory_test_import'), {'file': upload}, follow=True)
+        self.assertContains(response, '1 tests with 3 answers imported')
+        test = Test.objects.get()
+        self.assertEqual((test.overall_status, test.user, test.answers.first().technical_output), ('passed', self.user, '230'))
@@ -0,0 +1,182 @@
+"""
+Per-unit traceability timeline.
+
+Everything that happened to one barcode, oldest first: batch creation, every
+test with its answers, every service case (and its completion) and the
+SystemLog entries that reference the unit, its tests or its cases:
+
+    events = timeline.events(barcode)
+
+A timeline is built from four queries regardless of how much history the unit
+has, and cached under the barcode's own namespace (see inventory/cache.py).
+Saving or deleting any of its tests, answers or service cases, or writing a
+log entry invalidates it, immediately and again when the transaction
+commits. Buffered SystemLog writes invalidate from the log writer once
+flushed.
+"""
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import cache
+from .models import ServiceCase, SystemLog, Test, TestAnswer
+
+TIMEOUT = 24 * 60 * 60
+# Older log entries of very busy units are left to the SystemLog admin
+LOG_LIMIT = 200
+
+
+def namespace(barcode_id):
+    return f'timeline:{barcode_id}'
+
+
+def invalidate(*barcode_ids):
+    namespaces = [namespace(barcode_id) for barcode_id in set(barcode_ids) if barcode_id is not None]
+    if not namespaces:
+        return
+    cache.invalidate(*namespaces)
+    if transaction.get_connection().in_atomic_block:
+        # A reader between now and commit would cache the old rows again
+        transaction.on_commit(lambda: cache.invalidate(*namespaces))
+
+
+def events(barcode):
+    """The unit's events, oldest first, as plain dicts"""
+    return cache.cached(namespace(barcode.pk), 'events', lambda: build(barcode), timeout=TIMEOUT)
+
+
+def build(barcode):
+    tests = list(
+        Test.objects.filter(barcode=barcode)
+        .select_related('user', 'template_used')
+        .prefetch_related(Prefetch('answers', queryset=TestAnswer.objects.select_related('question').order_by('pk')))
+    )
+    cases = list(ServiceCase.objects.filter(barcode=barcode).select_related('created_by'))
+    logs = list(
+        SystemLog.objects.filter(
+            Q(barcode=barcode) | Q(test__in=tests) | Q(service_case__in=cases)
+            | Q(batch_id=barcode.batch_id, event_type='batch_created')
+        ).select_related('user').order_by('-timestamp')[:LOG_LIMIT]
+    )
+
+    batch = barcode.batch
+    timeline = [{
+        'kind': 'batch',
+        'at': batch.created_at,
+        'title': f'Batch {batch.prefix} created',
+        'detail': f'{batch.quantity} units, batch date {batch.batch_date}',
+        'batch_id': batch.pk,
+    }]
+    for test in tests:
+        timeline.append({
+            'kind': 'test',
+            'at': test.test_date,
+            'title': f'Test #{test.pk} {test.get_overall_status_display().lower()}',
+            'status': test.overall_status,
+            'user': test.user.username,
+            'template': test.template_used.name if test.template_used else None,
+            'updated_at': test.updated_at,
+            'test_id': test.pk,
+            'answers': [
+                {
+                    'question': answer.question.question_text,
+                    'passed': answer.is_passed,
+                    'output': answer.technical_output,
+                    'remarks': answer.remarks,
+                }
+                for answer in test.answers.all()
+            ],
+        })
+    for case in cases:
+        timeline.append({
+            'kind': 'service',
+            'at': case.created_at,
+            'title': f'Service case {case.case_id} opened',
+            'status': case.status,
+            'user': case.created_by.username if case.created_by else case.technician,
+            'detail': case.issue_description,
+            'actions': case.actions_taken,
+            'case_id': case.case_id,
+        })
+        if case.status == 'completed':
+            timeline.append({
+                'kind': 'service_completed',
+                'at': case.updated_at,
+                'title': f'Service case {case.case_id} completed',
+                'status': case.status,
+                'user': case.technician,
+                'detail': case.actions_taken,
+                'case_id': case.case_id,
+            })
+    for log in logs:
+        timeline.append({
+            'kind': 'log',
+            'at': log.timestamp,
+            'title': log.title,
+            'event_type': log.event_type,
+            'level': log.level,
+            'user': log.user.username if log.user else None,
+            'detail': log.description,
+        })
+    timeline.sort(key=lambda event: event['at'])
+    return timeline
+
+
+def log_barcode_ids(entries):
+    """Barcodes whose timelines a batch of SystemLog entries touches, without queries"""
+    test_field = SystemLog._meta.get_field('test')
+    case_field = SystemLog._meta.get_field('service_case')
+    barcode_ids = set()
+    for entry in entries:
+        barcode_ids.add(entry.barcode_id)
+        if entry.test_id and test_field.is_cached(entry):
+            barcode_ids.add(entry.test.barcode_id)
+        if entry.service_case_id and case_field.is_cached(entry):
+            barcode_ids.add(entry.service_case.barcode_id)
+    barcode_ids.discard(None)
+    return barcode_ids
+
+
+# Signals
+
+def _test_pre_save(sender, instance, **kwargs):
+    # A test moved to another unit leaves the old unit's timeline too
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if loaded.get('barcode_id') not in (None, instance.barcode_id):
+        invalidate(loaded['barcode_id'])
+
+
+def _test_changed(sender, instance, **kwargs):
+    invalidate(instance.barcode_id)
+
+
+def _answer_changed(sender, instance, origin=None, **kwargs):
+    if instance.test_id is None:
+        return
+    # Answers deleted along with their test are covered by the test's signal
+    if isinstance(origin, Test) or getattr(origin, 'model', None) is Test:
+        return
+    test_field = TestAnswer._meta.get_field('test')
+    if test_field.is_cached(instance):
+        invalidate(instance.test.barcode_id)
+    else:
+        invalidate(Test.objects.filter(pk=instance.test_id).values_list('barcode_id', flat=True).first())
+
+
+def _case_changed(sender, instance, **kwargs):
+    # The previous barcode is recorded by inventory.lifecycle's pre_save handler
+    invalidate(instance.barcode_id, getattr(instance, '_lifecycle_previous_barcode_id', None))
+
+
+def _log_changed(sender, instance, **kwargs):
+    invalidate(*log_barcode_ids([instance]))
+
+
+pre_save.connect(_test_pre_save, sender=Test, dispatch_uid='timeline_test_pre_save')
+post_save.connect(_test_changed, sender=Test, dispatch_uid='timeline_test_save')
+post_delete.connect(_test_changed, sender=Test, dispatch_uid='timeline_test_delete')
+post_save.connect(_answer_changed, sender=TestAnswer, dispatch_uid='timeline_answer_save')
+post_delete.connect(_answer_changed, sender=TestAnswer, dispatch_uid='timeline_answer_delete')
+post_save.connect(_case_changed, sender=ServiceCase, dispatch_uid='timeline_case_save')
+post_delete.connect(_case_changed, sender=ServiceCase, dispatch_uid='timeline_case_delete')
+post_save.connect(_log_changed, sender=SystemLog, dispatch_uid='timeline_log_save')
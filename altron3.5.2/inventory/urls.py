@@ -13,6 +13,7 @@ urlpatterns = [
     path('batch/<int:batch_id>/print/<int:barcode_id>/', views.print_barcodes, name='print_single_barcode'),
     path('testing/', views.testing_module, name='testing_module'),
     path('new_test/', views.new_test, name='new_test'),
+    path('rapid_test/', views.rapid_test, name='rapid_test'),
     path('auto_save_test/', views.auto_save_test, name='auto_save_test'),
     path('api/test_draft/<int:test_id>/', views.get_test_draft, name='get_test_draft'),
     path('test_results/', views.test_results, name='test_results'),
@@ -21,6 +22,8 @@ urlpatterns = [
     path('test/<int:test_id>/', views.test_detail, name='test_detail'),
     path('test/<int:test_id>/print/', views.print_test_report, name='print_test_report'), # <--- THIS IS THE CRUCIAL LINE
     path('keep-alive/', views.session_keep_alive, name='session_keep_alive'),
+    path('api/ingest/tests/', views.ingest_tests, name='ingest_tests'),
+    path('api/analytics/<str:metric>/', views.quality_analytics, name='quality_analytics'),
 
     # Service Module URLs
     path('service/', views.service_module, name='service_module'),
@@ -28,6 +31,7 @@ urlpatterns = [
     path('service/create/<int:barcode_id>/', views.create_service_case, name='create_service_case_barcode'),
     path('service/create/<int:barcode_id>/<int:test_id>/', views.create_service_case, name='create_service_case_with_test'),
     path('service/history/<int:barcode_id>/', views.service_history, name='service_history'),
+    path('service/timeline/<str:serial>/', views.barcode_timeline, name='barcode_timeline'),
     path('service/list/', views.service_list, name='service_list'),
     path('service/list/print/', views.print_service_report, name='print_service_report'),
     path('service/case/<str:case_id>/', views.service_detail, name='service_detail'),
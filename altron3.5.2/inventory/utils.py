@@ -1,18 +1,13 @@
-import barcode
-from barcode.writer import ImageWriter
-from io import BytesIO
 from django.core.files.base import ContentFile
 from django.core.exceptions import ValidationError
 
+from .barcodes import render_png
+
 def generate_barcode(sequence_number):
     try:
-        code128 = barcode.get_barcode_class('code128')
-        barcode_instance = code128(sequence_number, writer=ImageWriter())
-
-        buffer = BytesIO()
-        barcode_instance.write(buffer, options={"write_text": True})
+        image = render_png(sequence_number, options={"write_text": True})
 
         filename = f"{sequence_number}.png"
-        return ContentFile(buffer.getvalue(), name=filename)
+        return ContentFile(image, name=filename)
     except Exception as e:
         raise ValidationError(f"Failed to generate barcode for {sequence_number}: {e}")
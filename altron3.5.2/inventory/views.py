@@ -4,15 +4,24 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Q
+from django.db.models import Count, F, Q
+from django.db.models.functions import Coalesce
 from django.conf import settings # Import settings for MEDIA_URL
 from django.views.decorators.cache import never_cache # Import never_cache decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.core.exceptions import RequestDataTooBig
+from django.db import IntegrityError
 from .forms import  BatchCreateForm, TestForm, TestOverallStatusForm, ServiceCaseForm
 from .models import Batch, Barcode, SKU, Test, TestQuestion, TestAnswer, CustomUser, TestTemplate, ServiceCase, Technician, SystemLog
+from . import analytics, ingest, pdf, perf, refdata, snapshots, timeline
+from .barcodes import render_png as render_barcode_png
+from .db import serialize_writes
+from .routers import reporting_view
+import json
 import logging
 from django.core.paginator import Paginator
 from django.template.loader import get_template
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.template.loader import render_to_string
 from django.utils import timezone
 
@@ -34,21 +43,10 @@ SPEC_FIELD_MAP = {
     'output_range': 'OUTPUT Range',   
 }
 
-# Import HTML from weasyprint
-try:
-    from weasyprint import HTML
-    # Configure WeasyPrint logging to be more verbose
-    logging.getLogger('weasyprint').setLevel(logging.DEBUG) # Set WeasyPrint logger to DEBUG
-except (ImportError, OSError) as e:
-    import logging
-    logging.error("WeasyPrint failed to import: %s", e)
-    logging.warning("PDF generation features will be disabled. GTK3 libraries may be missing.")
-    HTML = None
-
-
 # Setup logging for debugging
 logger = logging.getLogger(__name__)
 
+@serialize_writes
 def user_login(request):
     if request.method == 'POST':
         username = request.POST['username']
@@ -67,6 +65,7 @@ def user_logout(request):
 
 @login_required
 @never_cache # Added never_cache decorator
+@reporting_view
 def dashboard(request):
     # Calculate test statistics in a SINGLE query (performance fix)
     from django.db.models import Count, Q
@@ -96,6 +95,7 @@ def barcode_module(request):
 
 @login_required
 @never_cache
+@serialize_writes
 def create_batch(request):
     # Only Admin and Batch Generation can create batches
     if request.user.role not in ['admin', 'batch']:
@@ -146,6 +146,21 @@ def create_batch(request):
     return render(request, 'inventory/create_batch.html', {'form': form})
 
 
+# batch_list ?sort= keys; prefix with '-' for descending
+BATCH_SORT_FIELDS = {
+    'created': 'created_at',
+    'sku': 'sku__code',
+    'date': 'batch_date',
+    'quantity': 'quantity',
+    'tested': 'yield_rollup__units_tested',
+    'untested': 'untested',
+    'passed': 'yield_rollup__passed_tests',
+    'failed': 'yield_rollup__failed_tests',
+    'testers': 'yield_rollup__testers',
+    'last_test': 'yield_rollup__last_test_at',
+}
+
+
 @login_required
 @never_cache # Added never_cache decorator
 def batch_list(request):
@@ -153,8 +168,11 @@ def batch_list(request):
     if request.user.role not in ['admin', 'batch', 'tester']:
         return redirect('dashboard')
 
-    # Performance fix: Add select_related to prevent N+1 queries
-    batches = Batch.objects.select_related('sku', 'spec_template')
+    # Performance fix: Add select_related to prevent N+1 queries. Progress
+    # columns come from the BatchYield rollup, never from Test.
+    batches = Batch.objects.select_related('sku', 'spec_template', 'yield_rollup').annotate(
+        untested=F('quantity') - Coalesce(F('yield_rollup__units_tested'), 0),
+    )
 
     sku_code = request.GET.get('sku_code')
     from_date = request.GET.get('from_date')
@@ -169,12 +187,21 @@ def batch_list(request):
     if to_date:
         batches = batches.filter(batch_date__lte=to_date)
 
-    #batches = batches.order_by('-batch_date')
-    # Order by 'created_at' in descending order to get latest first
-    batches = batches.order_by('-created_at') # CHANGED THIS LINE
+    # Latest first unless a column header asked otherwise
+    sort = request.GET.get('sort', '-created')
+    if sort.lstrip('-') not in BATCH_SORT_FIELDS:
+        sort = '-created'
+    column = F(BATCH_SORT_FIELDS[sort.lstrip('-')])
+    order = column.desc(nulls_last=True) if sort.startswith('-') else column.asc(nulls_last=True)
+    batches = batches.order_by(order, '-pk')
+
+    paginator = Paginator(batches, 25)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
     context = {
-        'batches': batches,
+        'batches': page_obj,
+        'page_obj': page_obj,
+        'sort': sort,
         'sku_code': sku_code,
         'from_date': from_date,
         'to_date': to_date,
@@ -184,13 +211,17 @@ def batch_list(request):
 @login_required
 @never_cache # Added never_cache decorator
 def barcode_list(request, batch_id):
-    batch = get_object_or_404(Batch, id=batch_id)
-    barcode_queryset = Barcode.objects.filter(batch=batch).order_by('sequence_number')
+    batch = get_object_or_404(Batch.objects.select_related('sku', 'spec_template', 'yield_rollup'), id=batch_id)
+    barcode_queryset = Barcode.objects.filter(batch=batch).select_related('sku').order_by('sequence_number')
 
     barcode_number = request.GET.get('barcode_number')
+    state = request.GET.get('state')
 
     if barcode_number:
         barcode_queryset = barcode_queryset.filter(sequence_number__icontains=barcode_number)
+    if state:
+        # Served by the (batch, lifecycle_state) index
+        barcode_queryset = barcode_queryset.filter(lifecycle_state=state)
 
     paginator = Paginator(barcode_queryset, 10)
     page_number = request.GET.get('page')
@@ -217,6 +248,8 @@ def barcode_list(request, batch_id):
         'batch': batch,
         'page_obj': page_obj,
         'barcode_number': barcode_number,
+        'state': state,
+        'state_choices': Barcode.LIFECYCLE_CHOICES,
         # 💡 NEW: Pass the SPEC_FIELD_MAP
         'spec_field_map': SPEC_FIELD_MAP,
     }
@@ -228,11 +261,13 @@ def print_barcodes(request, batch_id, barcode_id=None):
     # Admin, Batch Generation, and Tester can print barcodes
     if request.user.role not in ['admin', 'batch', 'tester']:
         return redirect('dashboard')
-    batch = get_object_or_404(Batch, id=batch_id)
+    batch = get_object_or_404(Batch.objects.select_related('sku', 'spec_template'), id=batch_id)
+    # Labels read barcode.batch.sku / spec_template; load them with the barcodes
+    barcode_queryset = Barcode.objects.select_related('batch__sku', 'batch__spec_template')
     if barcode_id:
-        barcodes = [get_object_or_404(Barcode, id=barcode_id, batch=batch)]
+        barcodes = [get_object_or_404(barcode_queryset, id=barcode_id, batch=batch)]
     else:
-        barcodes = Barcode.objects.filter(batch=batch)
+        barcodes = barcode_queryset.filter(batch=batch)
         
     context = {
         'batch': batch, 
@@ -253,6 +288,7 @@ def testing_module(request):
 
 @login_required
 @never_cache # Added never_cache decorator
+@serialize_writes
 def new_test(request):
     if request.user.role not in ['admin', 'tester']:
         return redirect('dashboard')
@@ -265,7 +301,17 @@ def new_test(request):
         selected_template_id = request.POST.get('template')
         test_id = request.POST.get('test_id')  # Check for existing draft test_id
 
-        form = TestForm(request.POST,
+        data = request.POST
+        if data.get('rapid'):
+            # Rapid entry has no status picker: the unit fails if any question does
+            data = data.copy()
+            failed = any(
+                value == 'fail' for name, value in data.items()
+                if name.startswith('question_') and name.endswith('_status')
+            )
+            data['overall_status'] = 'failed' if failed else 'passed'
+
+        form = TestForm(data,
                         selected_sku_id=selected_sku_id,
                         selected_batch_id=selected_batch_id,
                         selected_template_id=selected_template_id)
@@ -318,7 +364,7 @@ def new_test(request):
                         overall_status=form.cleaned_data['overall_status']
                     )
                 
-                questions = TestQuestion.objects.filter(template=template_instance)
+                questions = refdata.template_questions(template_instance.id) or []
                 for question in questions:
                     status_field_name = f'question_{question.id}_status'
                     output_field_name = f'question_{question.id}_output' # NEW FIELD NAME
@@ -333,12 +379,13 @@ def new_test(request):
                                  question.id, status, remarks)
                     TestAnswer.objects.create(
                         test=test,
-                        question=question,
+                        question_id=question.id,
                         is_passed=is_passed,
                         # NEW FIELD SAVING
                         technical_output=technical_output,
                         remarks=remarks
                     )
+                snapshots.sync(test)
 
                 # Log test creation
                 barcode_display = barcode_instance.sequence_number if barcode_instance else 'No Barcode'
@@ -375,9 +422,21 @@ def new_test(request):
                         }
                     )
 
+                # Rapid entry returns straight to the scanner for the next unit
+                if request.POST.get('rapid'):
+                    messages.success(request, f'Test saved for {barcode_display} ({test.get_overall_status_display()})')
+                    return redirect('rapid_test')
+
                 return redirect('test_detail', test_id=test.id)
         else:
             logger.error("Form validation failed: %s", form.errors)
+            if request.POST.get('rapid'):
+                return render(request, 'inventory/rapid_test.html', {
+                    'form': form,
+                    'barcode': form.cleaned_data.get('barcode'),
+                    'template': form.cleaned_data.get('template'),
+                    'serial': request.POST.get('serial', ''),
+                })
             return render(request, 'inventory/new_test.html', {'form': form})
 
     else:
@@ -453,7 +512,83 @@ def new_test(request):
 
     return render(request, 'inventory/new_test.html', {'form': form})
 
+def resolve_scanned_serial(serial):
+    """
+    Resolve a scanned serial to its barcode (with batch and SKU) and the test
+    template to preload. Serials are always `sku.code + suffix`, so the barcode
+    row alone determines SKU and batch.
+    """
+    barcode = (
+        Barcode.objects
+        .select_related('batch', 'sku', 'sku__default_test_template')
+        .filter(sequence_number=serial)
+        .first()
+    )
+    if barcode is None:
+        return None, None
+
+    template = barcode.sku.default_test_template
+    if template is None:
+        # Fall back to the template most recently used for this SKU
+        last_test = (
+            Test.objects
+            .select_related('template_used')
+            .filter(sku_id=barcode.sku_id, template_used__isnull=False)
+            .order_by('-test_date')
+            .first()
+        )
+        template = last_test.template_used if last_test else None
+    return barcode, template
+
+
 @login_required
+@never_cache
+def rapid_test(request):
+    """Scanner-driven test entry: one scan resolves SKU, batch, barcode and template"""
+    if request.user.role not in ['admin', 'tester']:
+        return redirect('dashboard')
+
+    serial = request.GET.get('serial', '').strip()
+    barcode = None
+    template = None
+    form = None
+    error = None
+
+    if serial:
+        barcode, template = resolve_scanned_serial(serial)
+        if barcode is None:
+            error = f'Serial {serial} was not found'
+        elif template is None:
+            error = f'No test template configured for SKU {barcode.sku.code}'
+        else:
+            form = TestForm(
+                initial={
+                    'sku': barcode.sku_id,
+                    'batch': barcode.batch_id,
+                    'barcode': barcode.id,
+                    'template': template.id,
+                },
+                selected_sku_id=barcode.sku_id,
+                selected_batch_id=barcode.batch_id,
+                selected_template_id=template.id,
+            )
+            # Default every question to pass; testers only touch the exceptions
+            for field_name in form.fields:
+                if field_name.startswith('question_') and field_name.endswith('_status'):
+                    form.initial[field_name] = 'pass'
+
+    context = {
+        'form': form,
+        'barcode': barcode,
+        'template': template,
+        'serial': serial,
+        'error': error,
+    }
+    return render(request, 'inventory/rapid_test.html', context)
+
+
+@login_required
+@serialize_writes
 def auto_save_test(request):
     """Auto-save test data as draft"""
     if request.user.role not in ['admin', 'tester']:
@@ -505,7 +640,7 @@ def auto_save_test(request):
             )
 
         # Save question answers
-        questions = TestQuestion.objects.filter(template=template_instance)
+        questions = refdata.template_questions(template_instance.id) or []
         answers_count = 0
 
         for question in questions:
@@ -523,12 +658,13 @@ def auto_save_test(request):
 
                 TestAnswer.objects.create(
                     test=test,
-                    question=question,
+                    question_id=question.id,
                     is_passed=is_passed,
                     technical_output=technical_output,
                     remarks=remarks
                 )
                 answers_count += 1
+        snapshots.sync(test)
 
         return JsonResponse({
             'status': 'success',
@@ -559,7 +695,7 @@ def get_test_draft(request, test_id):
 
         # Serialize answers data
         answers_data = []
-        for answer in test.answers.select_related('question').all():
+        for answer in test.answers.all():
             answers_data.append({
                 'question_id': answer.question_id,
                 'is_passed': answer.is_passed,
@@ -585,6 +721,7 @@ def get_test_draft(request, test_id):
 
 @login_required
 @never_cache # Added never_cache decorator
+@reporting_view
 def test_results(request):
     if request.user.role not in ['admin', 'tester']:
         return redirect('dashboard')
@@ -599,7 +736,7 @@ def test_results(request):
 
     # Performance fix: Add select_related to prevent N+1 queries
     # Include all tests (drafts are now shown in results)
-    tests = Test.objects.select_related('sku', 'batch', 'barcode', 'template_used', 'user')
+    tests = Test.objects.select_related('sku', 'batch', 'barcode', 'template_used', 'user').defer('answer_snapshot')
 
     if from_date:
         tests = tests.filter(test_date__gte=from_date)
@@ -629,9 +766,9 @@ def test_results(request):
     context = {
         'tests': tests,
         'counts': counts,
-        'skus': SKU.objects.all(),
+        'skus': refdata.all_objects(SKU),
         'batches': Batch.objects.select_related('sku'),  # Performance fix
-        'templates': TestTemplate.objects.all(),
+        'templates': refdata.all_objects(TestTemplate),
         'from_date': from_date,
         'to_date': to_date,
         'sku': sku,
@@ -645,6 +782,7 @@ def test_results(request):
 
 @login_required
 @never_cache # Added never_cache decorator
+@serialize_writes
 def test_detail(request, test_id):
     if request.user.role not in ['admin', 'tester', 'service']:
         return redirect('dashboard')
@@ -654,14 +792,14 @@ def test_detail(request, test_id):
     if request.method == 'POST':
         form = TestOverallStatusForm(request.POST, instance=test)
         if form.is_valid():
-            form.save()
+            snapshots.sync(form.save())
             return redirect('test_detail', test_id=test.id)
         else:
             logger.error("Overall status form validation failed: %s", form.errors)
     else:
         form = TestOverallStatusForm(instance=test)
     
-    test_answers = test.answers.select_related('question').all() 
+    test_answers = snapshots.answers(test)
 
     context = {
         'test': test,
@@ -679,7 +817,7 @@ def print_test_report(request, test_id):
     
     # Fetch test and related answers
     test = get_object_or_404(Test.objects.select_related('sku', 'batch', 'barcode', 'user', 'template_used'), id=test_id)
-    test_answers = test.answers.select_related('question').all()
+    test_answers = snapshots.answers(test)
 
     # Build absolute URLs for images using settings.MEDIA_URL
     # This is the most reliable way to get absolute URLs for media files
@@ -698,13 +836,13 @@ def print_test_report(request, test_id):
     html_content = template.render(context)
 
     # Convert HTML to PDF using WeasyPrint
-    if HTML: # Check if WeasyPrint was successfully imported
+    if pdf.available(): # Check if WeasyPrint can be imported
         # Log the base_url to help debug if images are not found
         base_url = request.build_absolute_uri() # This is the base URL for relative paths in HTML
         logger.info(f"WeasyPrint base_url for PDF: {base_url}")
         
         try: # Added try-except block for more specific error logging
-            pdf_file = HTML(string=html_content, base_url=base_url).write_pdf()
+            pdf_file = pdf.render(html_content, base_url=base_url)
             response = HttpResponse(pdf_file, content_type='application/pdf')
             response['Content-Disposition'] = f'filename="test_report_{test.barcode.sequence_number}.pdf"'
             return response
@@ -717,13 +855,13 @@ def print_test_report(request, test_id):
 
 @never_cache # Added never_cache decorator
 def print_barcodes_pdf(request, batch_id):
-    if HTML:
+    if pdf.available():
         batch = Batch.objects.get(id=batch_id)
         barcodes = Barcode.objects.filter(batch=batch)
         template = get_template('inventory/print_barcodes_pdf.html')
         html_content = template.render({'barcodes': barcodes, 'batch': batch})
 
-        pdf_file = HTML(string=html_content, base_url=request.build_absolute_uri()).write_pdf()
+        pdf_file = pdf.render(html_content, base_url=request.build_absolute_uri())
 
         response = HttpResponse(pdf_file, content_type='application/pdf')
         response['Content-Disposition'] = f'filename="barcodes_batch_{batch.prefix}.pdf"'
@@ -732,35 +870,10 @@ def print_barcodes_pdf(request, batch_id):
         return HttpResponse("Weasyprint is not installed. Please install it to generate PDF reports.", status=500)
 
 
-import io
-from django.http import HttpResponse, JsonResponse
-from django.views.decorators.cache import never_cache
-import barcode
-from barcode.writer import ImageWriter
-
 @never_cache
 def barcode_image_view(request, sequence_number):
-    buffer = io.BytesIO()
-    code128 = barcode.get_barcode_class('code128')
-
-    # Improved writer options for better scanning
-    writer = ImageWriter()
-    writer.format = 'PNG'  # Ensure high-quality PNG output
-
-    options = {
-        'module_width': 0.5,    # slightly thicker bars
-        'module_height': 22.0,  # taller bars
-        'quiet_zone': 6.5,      # extra whitespace for scanners
-        'font_size': 10,        # text size (not used here)
-        'text_distance': 2.0,   
-        'dpi': 300,             # high print quality
-        'write_text': False,    # we'll display text in template
-        'background': 'white',
-        'foreground': 'black'
-    }
+    return HttpResponse(render_barcode_png(sequence_number), content_type='image/png')
 
-    code128(sequence_number, writer=writer).write(buffer, options)
-    return HttpResponse(buffer.getvalue(), content_type='image/png')
 
 @login_required
 def session_keep_alive(request):
@@ -770,6 +883,69 @@ def session_keep_alive(request):
     return JsonResponse({'status': 'ok'})
 
 
+@csrf_exempt
+@never_cache
+@serialize_writes
+def ingest_tests(request):
+    """Bulk result upload for automated test stations; see inventory/ingest.py for the format"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+
+    # Stations authenticate with their API key, not a session
+    scheme, _, key = request.headers.get('Authorization', '').partition(' ')
+    station = ingest.authenticate(key.strip()) if scheme.lower() == 'bearer' else None
+    if station is None:
+        return JsonResponse({'status': 'error', 'message': 'Invalid or inactive station key'}, status=401)
+
+    try:
+        payload = json.loads(request.body)
+    except RequestDataTooBig:
+        return JsonResponse({'status': 'error', 'message': 'Request too large; send fewer results per request'}, status=413)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+
+    try:
+        summary = ingest.ingest(payload.get('results') if isinstance(payload, dict) else None, station, request=request)
+    except ingest.IngestError as e:
+        return JsonResponse({'status': 'error', 'message': str(e), 'errors': e.errors}, status=400)
+    except IntegrityError:
+        # Another request stored one of these keys first; retrying updates it
+        return JsonResponse({'status': 'error', 'message': 'Conflicting concurrent upload, retry'}, status=409)
+    return JsonResponse({'status': 'ok', **summary})
+
+
+def _int_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a whole number")
+
+
+@login_required
+@never_cache
+def quality_analytics(request, metric):
+    """Failure Pareto, pass rates and co-failures of a date range as JSON; see inventory/analytics.py"""
+    if request.user.role not in ['admin', 'tester']:
+        return JsonResponse({'status': 'error', 'message': 'Permission denied'}, status=403)
+
+    # Not a reporting_view: a lagging replica would put stale numbers in the cache for up to a day
+    if metric not in analytics.METRICS:
+        return JsonResponse({'status': 'error', 'message': f'Unknown metric {metric!r}'}, status=404)
+
+    try:
+        data = analytics.report(
+            metric, start=request.GET.get('start'), end=request.GET.get('end'),
+            by=request.GET.get('by', 'question'), limit=_int_param(request, 'limit') or 20,
+            size=_int_param(request, 'size'), template=_int_param(request, 'template'),
+        )
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'ok', **data})
+
+
 # ==================== SERVICE MODULE VIEWS ====================
 
 @login_required
@@ -795,13 +971,13 @@ def search_serial_number(request):
         serial_number = request.POST.get('serial_number', '').strip()
         if serial_number:
             # Try to find barcode by sequence number
-            barcode = Barcode.objects.filter(sequence_number__icontains=serial_number).first()
+            barcode = Barcode.objects.select_related(
+                'latest_test__sku', 'latest_test__user'
+            ).filter(sequence_number__icontains=serial_number).first()
 
             if barcode:
-                # Get the most recent test for this barcode
-                test_sheet = Test.objects.filter(
-                    barcode=barcode
-                ).order_by('-test_date').first()
+                # Most recent test, maintained on the barcode
+                test_sheet = barcode.latest_test
 
     context = {
         'test_sheet': test_sheet,
@@ -813,6 +989,7 @@ def search_serial_number(request):
 
 @login_required
 @never_cache
+@serialize_writes
 def create_service_case(request, barcode_id=None, test_id=None):
     """Create a new service case"""
     if request.user.role not in ['admin', 'service']:
@@ -879,7 +1056,7 @@ def create_service_case(request, barcode_id=None, test_id=None):
     context = {
         'barcode': barcode,
         'test': test,
-        'technicians': Technician.objects.filter(is_active=True).order_by('name'),
+        'technicians': refdata.active_technicians(),
     }
     return render(request, 'inventory/create_service_case.html', context)
 
@@ -891,15 +1068,13 @@ def service_history(request, barcode_id):
     if request.user.role not in ['admin', 'service']:
         return redirect('dashboard')
 
-    barcode = get_object_or_404(Barcode, id=barcode_id)
+    barcode = get_object_or_404(Barcode.objects.select_related('sku', 'batch', 'latest_test'), id=barcode_id)
     service_cases = ServiceCase.objects.filter(
         barcode=barcode
     ).order_by('-created_at')
 
-    # Get most recent test for reference
-    recent_test = Test.objects.filter(
-        barcode=barcode
-    ).order_by('-test_date').first()
+    # Most recent test for reference
+    recent_test = barcode.latest_test
 
     context = {
         'barcode': barcode,
@@ -911,6 +1086,34 @@ def service_history(request, barcode_id):
 
 @login_required
 @never_cache
+def barcode_timeline(request, serial):
+    """Everything that happened to one unit, oldest first; ?format=json for the raw events"""
+    if request.user.role not in ['admin', 'service']:
+        return redirect('dashboard')
+
+    # Not a reporting_view: a lagging replica would put stale history in the cache
+    barcode = get_object_or_404(Barcode.objects.select_related('sku', 'batch', 'latest_test'), sequence_number=serial)
+    events = timeline.events(barcode)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'serial': barcode.sequence_number,
+            'sku': barcode.sku.code,
+            'batch': barcode.batch.prefix,
+            'lifecycle_state': barcode.lifecycle_state,
+            'events': events,
+        })
+
+    context = {
+        'barcode': barcode,
+        'events': events,
+    }
+    return render(request, 'inventory/barcode_timeline.html', context)
+
+
+@login_required
+@never_cache
+@reporting_view
 def service_list(request):
     """List all service cases with filtering options"""
     if request.user.role not in ['admin', 'service']:
@@ -945,19 +1148,14 @@ def service_list(request):
 
     if serial_number:
         # Try to find the barcode
-        searched_barcode = Barcode.objects.filter(
+        searched_barcode = Barcode.objects.select_related('sku', 'batch', 'latest_test').filter(
             sequence_number__icontains=serial_number
         ).first()
 
         if searched_barcode:
-            # Get the most recent test for this barcode
-            recent_test = Test.objects.filter(
-                barcode=searched_barcode
-            ).order_by('-test_date').first()
-
             barcode_info = {
                 'barcode': searched_barcode,
-                'recent_test': recent_test,
+                'recent_test': searched_barcode.latest_test,
                 'service_case_count': service_cases.filter(barcode=searched_barcode).count()
             }
 
@@ -972,7 +1170,7 @@ def service_list(request):
         if case_id:
             service_cases = service_cases.filter(case_id__icontains=case_id)
         if technician:
-            service_cases = service_cases.filter(technician__name__icontains=technician)
+            service_cases = service_cases.filter(technician__icontains=technician)
         if status:
             service_cases = service_cases.filter(status=status)
         if from_date:
@@ -1006,6 +1204,7 @@ def service_list(request):
 
 @login_required
 @never_cache
+@reporting_view
 def print_service_report(request):
     """Print service cases report as PDF"""
     if request.user.role not in ['admin', 'service']:
@@ -1036,7 +1235,7 @@ def print_service_report(request):
         if case_id:
             service_cases = service_cases.filter(case_id__icontains=case_id)
         if technician:
-            service_cases = service_cases.filter(technician__name__icontains=technician)
+            service_cases = service_cases.filter(technician__icontains=technician)
         if status:
             service_cases = service_cases.filter(status=status)
         if from_date:
@@ -1093,13 +1292,13 @@ def print_service_report(request):
     html_content = template.render(context)
 
     # Convert HTML to PDF using WeasyPrint
-    if HTML:
+    if pdf.available():
         base_url = request.build_absolute_uri()
 
         try:
-            pdf_file = HTML(string=html_content, base_url=base_url).write_pdf()
+            pdf_file = pdf.render(html_content, base_url=base_url)
             response = HttpResponse(pdf_file, content_type='application/pdf')
-            response['Content-Disposition'] = f'filename="service_report_{timezone.now:Y-m-d_H-i}.pdf"'
+            response['Content-Disposition'] = f'filename="service_report_{timezone.localtime():%Y-%m-%d_%H-%M}.pdf"'
             return response
         except Exception as e:
             logger.error(f"WeasyPrint PDF generation failed: {e}", exc_info=True)
@@ -1110,13 +1309,14 @@ def print_service_report(request):
 
 @login_required
 @never_cache
+@serialize_writes
 def service_detail(request, case_id):
     """View and edit details of a specific service case"""
     if request.user.role not in ['admin', 'service']:
         return redirect('dashboard')
 
     service_case = get_object_or_404(
-        ServiceCase.objects.select_related('barcode', 'test', 'created_by'),
+        ServiceCase.objects.select_related('barcode', 'barcode__sku', 'barcode__batch', 'test', 'created_by'),
         case_id=case_id
     )
 
@@ -1177,9 +1377,8 @@ def print_service_case_detail(request, case_id):
     html_content = template.render(context)
 
     try:
-        from weasyprint import HTML
         base_url = request.build_absolute_uri()
-        pdf_file = HTML(string=html_content, base_url=base_url).write_pdf()
+        pdf_file = pdf.render(html_content, base_url=base_url)
         response = HttpResponse(pdf_file, content_type='application/pdf')
         response['Content-Disposition'] = f'filename="service_case_{service_case.case_id}.pdf"'
         return response
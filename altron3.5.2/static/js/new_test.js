@@ -0,0 +1,383 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const testForm = document.getElementById('test-form');
+    const getElement = (id) => document.getElementById(id);
+
+    let tomSelectInstance = null;
+    let eventListeners = new Map();
+    let autoSaveTimeout = null;
+    let currentTestId = testForm.dataset.resumeTestId ? Number(testForm.dataset.resumeTestId) : null;  // Initialize with resume_test_id if present
+    let isResumingDraft = false; // Flag to prevent auto-save during draft resume
+
+    function initializeTomSelect(elementId, placeholderText) {
+        const element = getElement(elementId);
+        // Without Tom Select (e.g. its CDN is unreachable) the plain <select> still works
+        if (element && typeof TomSelect !== 'undefined') {
+            // Destroy existing instance if it exists
+            if (element.tomselect) {
+                element.tomselect.destroy();
+            }
+            const instance = new TomSelect(element, {
+                create: false,
+                sortField: { field: 'text', direction: 'asc' },
+                placeholder: placeholderText,
+                render: {
+                    no_results: (data, escape) => `<div class="no-results py-2 text-center text-gray-500">No results found for "${escape(data.input)}"</div>`
+                }
+            });
+            // Store instance on the element itself for easy access
+            element.tomselect = instance;
+            return instance;
+        }
+        return null;
+    }
+
+    // Update status dropdown colors based on selection
+    function updateStatusColor(selectElement) {
+        if (!selectElement) return;
+
+        // Remove existing color classes from select element
+        selectElement.classList.remove('bg-green-100', 'bg-red-100', 'border-green-500', 'border-red-500', 'text-green-800', 'text-red-800');
+
+        const value = selectElement.value;
+        if (value === 'pass') {
+            selectElement.classList.add('bg-green-100', 'border-green-500', 'text-green-800');
+        } else if (value === 'fail') {
+            selectElement.classList.add('bg-red-100', 'border-red-500', 'text-red-800');
+        }
+    }
+
+    // Apply initial colors to all status dropdowns
+    function applyStatusColors() {
+        document.querySelectorAll('select[name$="_status"]').forEach(select => {
+            updateStatusColor(select);
+            // Add change listener for color updates
+            select.addEventListener('change', function() {
+                updateStatusColor(this);
+                // Trigger auto-save when status changes
+                triggerAutoSave();
+            });
+        });
+    }
+
+    // Auto-save with debouncing
+    function triggerAutoSave() {
+        // Don't auto-save during draft resume
+        if (isResumingDraft) {
+            return;
+        }
+
+        // Clear existing timeout
+        if (autoSaveTimeout) {
+            clearTimeout(autoSaveTimeout);
+        }
+
+        // Check if we have the required fields for auto-save
+        const sku = getElement('id_sku')?.value;
+        const batch = getElement('id_batch')?.value;
+        const template = getElement('id_template')?.value;
+
+        if (!sku || !batch || !template) {
+            return; // Don't auto-save if required fields are missing
+        }
+
+        // Show saving indicator
+        const savingIndicator = getElement('auto-save-indicator');
+        const successIndicator = getElement('save-success-indicator');
+
+        // Set timeout for auto-save (2 seconds after last change)
+        autoSaveTimeout = setTimeout(() => {
+            if (savingIndicator) savingIndicator.classList.remove('hidden');
+            if (successIndicator) successIndicator.classList.add('hidden');
+
+            const formData = new FormData(testForm);
+            formData.append('test_id', currentTestId || '');
+
+            fetch(testForm.dataset.autoSaveUrl, {
+                method: 'POST',
+                body: formData,
+                headers: {
+                    'X-Requested-With': 'XMLHttpRequest'
+                }
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.status === 'success') {
+                    currentTestId = data.test_id;
+                    // Hide saving indicator and show success
+                    if (savingIndicator) savingIndicator.classList.add('hidden');
+                    if (successIndicator) {
+                        successIndicator.classList.remove('hidden');
+                        // Hide success indicator after 2 seconds
+                        setTimeout(() => {
+                            successIndicator.classList.add('hidden');
+                        }, 2000);
+                    }
+                    console.log('Auto-saved:', data.message);
+                } else {
+                    console.error('Auto-save error:', data.message);
+                    if (savingIndicator) savingIndicator.classList.add('hidden');
+                }
+            })
+            .catch(error => {
+                console.error('Auto-save failed:', error);
+                if (savingIndicator) savingIndicator.classList.add('hidden');
+            });
+        }, 2000); // 2 second debounce
+    }
+
+    // Attach auto-save listeners to all question fields
+    function attachAutoSaveListeners() {
+        // Listen for changes on all question-related fields
+        testForm.querySelectorAll('select[name^="question_"], textarea[name^="question_"]').forEach(field => {
+            // Remove existing listener if any (to avoid duplicates)
+            field.removeEventListener('change', triggerAutoSave);
+            field.removeEventListener('input', triggerAutoSave);
+
+            // Add new listeners
+            field.addEventListener('change', triggerAutoSave);
+            if (field.tagName === 'TEXTAREA') {
+                field.addEventListener('input', triggerAutoSave);
+            }
+        });
+    }
+
+    function reattachListeners() {
+        // Remove old listeners
+        eventListeners.forEach((handler, element) => {
+            element.removeEventListener('change', handler);
+        });
+        eventListeners.clear();
+
+        // Add new listeners
+        const newSkuSelect = getElement('id_sku');
+        const newBatchSelect = getElement('id_batch');
+        const newTemplateSelect = getElement('id_template');
+
+        const handler = updateFormContent;
+
+        if (newSkuSelect) {
+            newSkuSelect.addEventListener('change', handler);
+            eventListeners.set(newSkuSelect, handler);
+        }
+        if (newBatchSelect) {
+            newBatchSelect.addEventListener('change', handler);
+            eventListeners.set(newBatchSelect, handler);
+        }
+        if (newTemplateSelect) {
+            newTemplateSelect.addEventListener('change', handler);
+            eventListeners.set(newTemplateSelect, handler);
+        }
+    }
+
+    function updateFormContent() {
+        let data = new FormData(testForm);
+        let url = testForm.dataset.newTestUrl;
+
+        return fetch(url, {
+            method: 'POST',
+            body: data,
+            headers: { 'X-Requested-With': 'XMLHttpRequest' }
+        }).then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.text();
+        }).then(html => {
+            let parser = new DOMParser();
+            let doc = parser.parseFromString(html, 'text/html');
+            let newForm = doc.getElementById('test-form');
+            if (newForm) {
+                // Preserve existing values before replacing the form content
+                let currentValues = {
+                    sku: getElement('id_sku')?.value || '',
+                    batch: getElement('id_batch')?.value || '',
+                    template: getElement('id_template')?.value || '',
+                    overallStatus: getElement('id_overall_status')?.value || '',
+                    barcode: getElement('id_barcode')?.value || '',
+                    // This line now saves ALL dynamic fields (status, output, and remarks)
+                    qFields: [...testForm.querySelectorAll('select[name^="question_"], textarea[name^="question_"]')].reduce((acc, field) => {
+                        acc[field.name] = field.value;
+                        return acc;
+                    }, {})
+                };
+
+                // Destroy old Tom Select instance if it exists
+                if (tomSelectInstance) {
+                    tomSelectInstance.destroy();
+                    tomSelectInstance = null;
+                }
+
+                // Replace the form's content
+                testForm.innerHTML = newForm.innerHTML;
+                testForm.dataset.newTestUrl = url;
+
+                // Re-initialize and restore values on the new form content
+                getElement('id_sku').value = currentValues.sku;
+                getElement('id_batch').value = currentValues.batch;
+                getElement('id_template').value = currentValues.template;
+                getElement('id_overall_status').value = currentValues.overallStatus;
+
+                // Restore ALL dynamic fields
+                Object.entries(currentValues.qFields).forEach(([name, value]) => {
+                    const field = testForm.querySelector(`[name="${name}"]`);
+                    if (field) field.value = value;
+                });
+
+                // Re-initialize Tom Select for the new barcode dropdown
+                tomSelectInstance = initializeTomSelect('id_barcode', 'Select or type a Barcode...');
+                if (tomSelectInstance) {
+                    tomSelectInstance.setValue(currentValues.barcode);
+                }
+
+                // Re-attach event listeners to the new elements
+                reattachListeners();
+
+                // Apply status colors and auto-save listeners to new elements
+                applyStatusColors();
+                attachAutoSaveListeners();
+
+                // Re-attach field highlight clearing listeners
+                ['id_sku', 'id_batch', 'id_template'].forEach(fieldId => {
+                    const field = document.getElementById(fieldId);
+                    if (field) {
+                        const clearHighlight = () => {
+                            field.classList.remove('border-red-500');
+                            field.classList.add('border-gray-200');
+                        };
+                        field.addEventListener('change', clearHighlight);
+                        field.addEventListener('focus', clearHighlight);
+                    }
+                });
+
+            } else {
+                console.error('New form not found in response');
+            }
+        }).catch(error => {
+            console.error('Error updating form:', error);
+        });
+    }
+
+    // Validate form before submission
+    function validateForm(event) {
+        const sku = getElement('id_sku')?.value;
+        const batch = getElement('id_batch')?.value;
+        const template = getElement('id_template')?.value;
+
+        const errorDiv = getElement('validation-error');
+        const errorMessage = getElement('validation-error-message');
+
+        let missingFields = [];
+        let fieldsToHighlight = [];
+
+        // Clear previous highlights
+        document.querySelectorAll('.border-red-500').forEach(el => {
+            el.classList.remove('border-red-500');
+            el.classList.add('border-gray-200');
+        });
+
+        if (!sku) {
+            missingFields.push('SKU');
+            fieldsToHighlight.push('id_sku');
+        }
+        if (!batch) {
+            missingFields.push('Batch');
+            fieldsToHighlight.push('id_batch');
+        }
+        if (!template) {
+            missingFields.push('Test Template');
+            fieldsToHighlight.push('id_template');
+        }
+
+        if (missingFields.length > 0) {
+            event.preventDefault();
+
+            // Highlight missing fields
+            fieldsToHighlight.forEach(fieldId => {
+                const field = document.getElementById(fieldId);
+                if (field) {
+                    field.classList.remove('border-gray-200');
+                    field.classList.add('border-red-500');
+                }
+            });
+
+            if (errorDiv && errorMessage) {
+                errorMessage.textContent = `Please select the following required fields: ${missingFields.join(', ')}`;
+                errorDiv.classList.remove('hidden');
+
+                // Scroll to error message
+                errorDiv.scrollIntoView({ behavior: 'smooth', block: 'center' });
+
+                // Auto-hide after 5 seconds and remove highlights
+                setTimeout(() => {
+                    errorDiv.classList.add('hidden');
+                    fieldsToHighlight.forEach(fieldId => {
+                        const field = document.getElementById(fieldId);
+                        if (field) {
+                            field.classList.remove('border-red-500');
+                            field.classList.add('border-gray-200');
+                        }
+                    });
+                }, 5000);
+            }
+            return false;
+        }
+
+        // Check if at least one question has a status
+        const statusFields = document.querySelectorAll('select[name$="_status"]');
+        let hasAnswer = false;
+        statusFields.forEach(field => {
+            if (field.value === 'pass' || field.value === 'fail') {
+                hasAnswer = true;
+            }
+        });
+
+        if (!hasAnswer) {
+            event.preventDefault();
+            if (errorDiv && errorMessage) {
+                errorMessage.textContent = 'Please provide at least one test question result (Pass/Fail) before submitting.';
+                errorDiv.classList.remove('hidden');
+
+                // Scroll to error message
+                errorDiv.scrollIntoView({ behavior: 'smooth', block: 'center' });
+
+                // Auto-hide after 5 seconds
+                setTimeout(() => {
+                    errorDiv.classList.add('hidden');
+                }, 5000);
+            }
+            return false;
+        }
+
+        // Hide error if validation passes
+        if (errorDiv) {
+            errorDiv.classList.add('hidden');
+        }
+
+        return true;
+    }
+
+    // Initial setup on page load
+    initializeTomSelect('id_barcode', 'Select a Barcode...');
+    reattachListeners();
+    applyStatusColors();
+    attachAutoSaveListeners();
+
+    // Add form validation listener
+    const submitBtn = getElement('submit-test-btn');
+    if (submitBtn) {
+        testForm.addEventListener('submit', validateForm);
+    }
+
+    // Clear error highlights when user interacts with fields
+    ['id_sku', 'id_batch', 'id_template'].forEach(fieldId => {
+        const field = document.getElementById(fieldId);
+        if (field) {
+            const clearHighlight = () => {
+                field.classList.remove('border-red-500');
+                field.classList.add('border-gray-200');
+            };
+            field.addEventListener('change', clearHighlight);
+            field.addEventListener('focus', clearHighlight);
+        }
+    });
+});
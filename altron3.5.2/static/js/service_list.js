@@ -0,0 +1,84 @@
+function exportToExcel() {
+    // Get the table
+    const table = document.getElementById('serviceTable');
+    if (!table) {
+        alert('Table not found!');
+        return;
+    }
+
+    // Get all rows
+    const rows = table.querySelectorAll('tr');
+
+    // Build CSV content
+    let csvContent = [];
+
+    // Add headers
+    const headers = [];
+    rows[0].querySelectorAll('th').forEach(th => {
+        // Only include visible columns
+        if (!th.classList.contains('hidden') && !th.classList.contains('hidden-sm') &&
+            !th.classList.contains('hidden-md') && !th.classList.contains('hidden-lg')) {
+            headers.push('"' + th.textContent.trim() + '"');
+        }
+    });
+    csvContent.push(headers.join(','));
+
+    // Add data rows
+    for (let i = 1; i < rows.length; i++) {
+        const row = rows[i];
+        const cells = row.querySelectorAll('td');
+
+        const rowData = [];
+        cells.forEach((cell, index) => {
+            // Get the corresponding header to check if column is visible
+            const headersArr = rows[0].querySelectorAll('th');
+            if (headersArr[index] && !headersArr[index].offsetParent) {
+                return; // Skip hidden columns
+            }
+
+            // Get text content and clean it
+            let text = cell.textContent.trim();
+
+            // Handle status badges
+            const statusBadge = cell.querySelector('span');
+            if (statusBadge) {
+                text = statusBadge.textContent.trim();
+            }
+
+            // Handle links
+            const link = cell.querySelector('a');
+            if (link && cell.textContent.trim() === 'View') {
+                text = ''; // Skip action column
+            }
+
+            // Escape quotes and wrap in quotes
+            text = text.replace(/"/g, '""');
+            rowData.push('"' + text + '"');
+        });
+
+        // Skip empty rows (like action column)
+        if (rowData.filter(cell => cell !== '""').length > 0) {
+            csvContent.push(rowData.join(','));
+        }
+    }
+
+    // Create CSV file
+    const csvString = csvContent.join('\n');
+    const blob = new Blob([csvString], { type: 'text/csv;charset=utf-8;' });
+
+    // Create download link
+    const link = document.createElement('a');
+    const url = URL.createObjectURL(blob);
+
+    // Generate filename with timestamp
+    const date = new Date();
+    const timestamp = date.toISOString().slice(0, 10);
+    link.setAttribute('href', url);
+    link.setAttribute('download', `service_cases_${timestamp}.csv`);
+    link.style.visibility = 'hidden';
+
+    // Trigger download
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+}
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "inventory.middleware.CompressionMiddleware",
+    "inventory.middleware.StaticAssetMiddleware",
+    "inventory.middleware.PerformanceMonitorMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -77,27 +81,150 @@ WSGI_APPLICATION = "ups_manufacturing.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite production profile (set SQLITE_PROFILE=0 for a bare connection, e.g. to
+# compare with `manage.py simulate_load`). WAL lets readers run alongside the
+# single writer, the timeout makes a blocked writer wait instead of raising
+# "database is locked", and BEGIN IMMEDIATE takes the write lock up front so a
+# transaction can't fail when it upgrades from reading to writing.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', '1') == '1'
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',      # Durable across app crashes; WAL fsyncs at checkpoints
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,     # Negative = KiB, i.e. 64 MiB per connection
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "timeout": 20,  # seconds; sets SQLite's busy_timeout
+            "transaction_mode": "IMMEDIATE",
+            "init_command": "; ".join(f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()),
+        } if SQLITE_PROFILE else {},
     }
 }
 
-# Performance optimization: Caching configuration
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000,
+# PostgreSQL profile for the larger plants: DB_ENGINE=postgres plus the
+# POSTGRES_* variables below. The test suite runs against it the same way:
+#   DB_ENGINE=postgres POSTGRES_DB=altron POSTGRES_USER=altron python manage.py test inventory
+# Connections are persistent (DB_CONN_MAX_AGE seconds, health-checked before
+# reuse). DB_POOL=1 uses psycopg 3's connection pool instead, which needs
+# `pip install "psycopg[binary,pool]"` in place of psycopg2-binary.
+if os.environ.get('DB_ENGINE', 'sqlite') == 'postgres':
+    DB_POOL = os.environ.get('DB_POOL', '0') == '1'
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get('POSTGRES_DB', 'altron'),
+            "USER": os.environ.get('POSTGRES_USER', 'altron'),
+            "PASSWORD": os.environ.get('POSTGRES_PASSWORD', ''),
+            "HOST": os.environ.get('POSTGRES_HOST', 'localhost'),
+            "PORT": os.environ.get('POSTGRES_PORT', '5432'),
+            # Pooled connections are returned to the pool, so they must not persist
+            "CONN_MAX_AGE": 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                "pool": {
+                    "min_size": int(os.environ.get('DB_POOL_MIN', 2)),
+                    "max_size": int(os.environ.get('DB_POOL_MAX', 10)),
+                    "timeout": 10,
+                },
+            } if DB_POOL else {},
+        }
+    }
+
+# Reporting replica: views marked @reporting_view and the big admin changelists
+# read from DATABASES['replica'] when it is configured and no more than
+# MAX_LAG_SECONDS behind, and from the primary otherwise. See inventory/routers.py.
+#   SQLite:     REPORTING_REPLICA_SQLITE=/path/to/snapshot.sqlite3, refreshed
+#               by `manage.py refresh_reporting_snapshot --interval 300`
+#   PostgreSQL: POSTGRES_REPLICA_HOST (and optionally POSTGRES_REPLICA_PORT)
+#               pointing at a streaming replica
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+            'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
         }
+elif os.environ.get('REPORTING_REPLICA_SQLITE'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['REPORTING_REPLICA_SQLITE'],
+        'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['inventory.routers.ReportingRouter']
+
+REPORTING_REPLICA = {
+    'ALIAS': 'replica',
+    'MAX_LAG_SECONDS': int(os.environ.get('REPORTING_MAX_LAG', 600)),
+    'CHECK_INTERVAL': 30,  # seconds between lag checks
+}
+
+# Writers in one process queue on a lock instead of contending inside SQLite.
+# See inventory/db.py.
+SQLITE_WRITE_LANE = {
+    'ENABLED': SQLITE_PROFILE,
+    'TIMEOUT': 30,  # seconds before a writer proceeds without the lane
 }
 
-# Cache session backend for better performance
+# Shared cache tier. Every gunicorn worker on the host sees the same entries,
+# so logins survive across workers and invalidation (inventory/cache.py) is
+# global. CACHE_BACKEND=redis with REDIS_URL uses Redis instead; locmem keeps
+# a per-process cache for one-off scripts, and for `manage.py test`, which
+# must never read or write the cache the running app uses.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+CACHE_BACKEND = 'locmem' if TESTING else os.environ.get('CACHE_BACKEND', 'sqlite')
+CACHE_DIR = os.environ.get('CACHE_DIR', BASE_DIR / 'cache')
+
+if CACHE_BACKEND == 'redis':
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379')
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'{REDIS_URL}/0',
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'{REDIS_URL}/1',
+        },
+    }
+elif CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 1000},
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sessions',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'inventory.cache_backends.SQLiteCache',
+            'LOCATION': os.path.join(CACHE_DIR, 'default.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': 20000, 'CULL_FREQUENCY': 10},
+        },
+        # Sessions get their own file so churn in the data cache never evicts
+        # a logged-in user
+        'sessions': {
+            'BACKEND': 'inventory.cache_backends.SQLiteCache',
+            'LOCATION': os.path.join(CACHE_DIR, 'sessions.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        },
+    }
+
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
-SESSION_CACHE_ALIAS = 'default'
+SESSION_CACHE_ALIAS = 'sessions'
 
 
 # Password validation
@@ -136,6 +263,14 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# collectstatic writes content-hashed names plus .gz/.br variants, which
+# StaticAssetMiddleware serves with far-future caching. static/css/app.css is
+# built from assets/css/app.css by `manage.py build_assets`.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'inventory.storage.CompressedManifestStaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -151,6 +286,76 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Buffered SystemLog writer: events are bulk-inserted from a background thread
+# instead of saved on the request path. See inventory/log_buffer.py.
+SYSTEM_LOG_BUFFER = {
+    'ENABLED': os.environ.get('SYSTEM_LOG_BUFFER', '1') == '1',
+    'MAX_QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,  # seconds
+    'SYNC_LEVELS': ['error', 'critical'],
+    # Keep only a fraction of high-volume info events, e.g. {'test_passed': 0.1}
+    'SAMPLE_RATES': {},
+}
+
+# SystemLog retention: `manage.py archive_system_logs` moves entries older than
+# DAYS into monthly gzip'd JSONL files; `manage.py query_log_archive` searches them.
+SYSTEM_LOG_RETENTION = {
+    'DAYS': int(os.environ.get('SYSTEM_LOG_RETENTION_DAYS', 90)),
+    'CHUNK_SIZE': 1000,
+    'ARCHIVE_DIR': os.path.join(BASE_DIR, 'log_archive'),
+}
+
+# Test-station ingestion API (inventory/ingest.py). Stations are registered in
+# the admin or with `manage.py issue_station_key`.
+TEST_INGEST = {
+    'MAX_RESULTS': 500,
+    'TOUCH_INTERVAL': 60,  # seconds between last_seen_at writes per station
+}
+
+# Quality analytics endpoints (/api/analytics/<metric>/) and
+# `manage.py quality_report`, see inventory/analytics.py
+QUALITY_ANALYTICS = {
+    'DEFAULT_DAYS': 30,
+    'MAX_DAYS': 366,
+    'CACHE_TIMEOUT': 600,
+    'CLOSED_CACHE_TIMEOUT': 24 * 60 * 60,  # ranges that ended before today
+}
+
+# Per-view performance budgets checked by PerformanceMonitorMiddleware. Requests
+# over budget are recorded as `performance_issue` SystemLog entries with the
+# most expensive SQL fingerprints. Views are keyed by URL name; tracked render
+# timers are budgeted as `<name>_ms` (weasyprint_ms, barcode_ms).
+PERFORMANCE_BUDGETS = {
+    'ENABLED': os.environ.get('PERFORMANCE_MONITOR', '1') == '1',
+    'DEFAULT': {'wall_ms': 1500, 'queries': 60, 'db_ms': 500},
+    'VIEWS': {
+        'print_test_report': {'wall_ms': 5000, 'weasyprint_ms': 4000},
+        'print_service_report': {'wall_ms': 8000, 'weasyprint_ms': 6000},
+        'print_service_case_detail': {'wall_ms': 5000, 'weasyprint_ms': 4000},
+        'print_barcodes_pdf': {'wall_ms': 10000, 'weasyprint_ms': 8000},
+        'barcode_image': {'wall_ms': 500, 'barcode_ms': 300},
+        'ingest_tests': {'wall_ms': 5000},
+        'quality_analytics': {'wall_ms': 10000},
+    },
+    'TOP_QUERIES': 5,
+}
+
+# Worker start-up budget checked by `manage.py check_import_time`. WeasyPrint
+# and python-barcode load on first use (inventory/pdf.py, inventory/barcodes.py)
+# and must stay out of start-up.
+IMPORT_BUDGET = {
+    'MILLISECONDS': int(os.environ.get('IMPORT_BUDGET_MS', 1500)),
+    'LAZY_MODULES': ['weasyprint', 'barcode', 'PIL', 'openpyxl', 'numpy'],
+}
+
+# On-the-fly Brotli/gzip for HTML, JSON and CSV responses, streaming ones
+# included (CompressionMiddleware). Static files are precompressed instead.
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'BROTLI_QUALITY': 5,
+}
+
 SESSION_COOKIE_AGE = 900  # 15 minutes in seconds (15 * 60 = 900)
 SESSION_SAVE_EVERY_REQUEST = False  # Performance fix: Only save session when it changes
 PRODUCT_NAME = "CoreInspect" # <--- CHANGE THIS TO YOUR DESIRED PRODUCT NAME